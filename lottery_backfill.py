@@ -0,0 +1,240 @@
+import argparse
+import logging
+import json
+import os
+import queue
+import threading
+from lottery_store import LotteryStore
+from lottery_waits import StepTimer
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT = 'backfill_checkpoint.json'
+
+
+class BackfillCheckpoint:
+    def __init__(self, path=DEFAULT_CHECKPOINT):
+        # {game type: [completed issues]}, rewritten after every finished issue
+        self.path = path
+        self.lock = threading.Lock()
+        self.completed = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.completed = {game: set(issues) for game, issues in json.load(f).items()}
+
+    def is_done(self, lottery_type, issue):
+        with self.lock:
+            return str(issue) in self.completed.get(lottery_type, ())
+
+    def mark_done(self, lottery_type, issue):
+        with self.lock:
+            self.completed.setdefault(lottery_type, set()).add(str(issue))
+            data = {game: sorted(issues) for game, issues in self.completed.items()}
+
+            # Write to a temporary file and rename it so an interrupted run
+            # never leaves a truncated checkpoint behind
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+
+
+def parse_issue_range(text):
+    # "胜负游戏=24001-24167" or "6场半全场=24214"
+    lottery_type, _, issues = text.partition('=')
+    start, _, end = issues.partition('-')
+    return lottery_type.strip(), int(start), int(end or start)
+
+
+def in_range(issue, issue_range):
+    try:
+        return issue_range[0] <= int(issue) <= issue_range[1]
+    except (TypeError, ValueError):
+        return False
+
+
+class LotteryBackfill:
+    def __init__(self, issue_ranges, workers=4, checkpoint_path=DEFAULT_CHECKPOINT,
+                 backend='browser', base_url=None, time_budget=None, store_path=None, issue_budget=None,
+                 breaker_misses=3, metrics=None):
+        # issue_ranges maps a game type to an inclusive (first, last) issue range
+        self.issue_ranges = issue_ranges
+        self.workers = max(1, workers)
+        self.checkpoint = BackfillCheckpoint(checkpoint_path)
+        self.backend = backend
+        self.base_url = base_url
+        # issue_budget is the time each issue may take
+        self.timer = StepTimer(time_budget, metrics, issue_budget, breaker_misses)
+        self.store = LotteryStore(store_path) if store_path else None
+        self.lock = threading.Lock()
+        self.scrapers = []
+        self.counts = {'done': 0, 'skipped': 0, 'failed': 0}
+
+    def create_scraper(self):
+        if self.backend == 'http':
+            from lottery_http import HttpLotteryResultsScraper, API_BASE_URL
+            scraper = HttpLotteryResultsScraper(self.base_url or API_BASE_URL, store=self.store)
+        else:
+            from lottery_browser import create_driver
+            from lottery_result import LotteryResultsScraper
+            scraper = LotteryResultsScraper(driver=create_driver(self.timer, page='kjgg'), timer=self.timer, store=self.store)
+            scraper.load_page()
+        with self.lock:
+            self.scrapers.append(scraper)
+        return scraper
+
+    def list_issues(self, scraper, lottery_type):
+        issue_range = self.issue_ranges[lottery_type]
+        if self.backend == 'http':
+            # The draw feed lists the issues it knows; fall back to every
+            # number in the range when it does not
+            issues = scraper.client.get_draw(lottery_type).get('issueList') or []
+            if not issues:
+                issues = [str(issue) for issue in range(issue_range[1], issue_range[0] - 1, -1)]
+        else:
+            if not scraper.select_lottery_type(lottery_type):
+                return []
+            issues = scraper.list_issues(lottery_type)
+        return [str(issue) for issue in issues if in_range(issue, issue_range)]
+
+    def list_work_items(self, scraper):
+        work_items = []
+        for lottery_type in self.issue_ranges:
+            try:
+                for issue in self.list_issues(scraper, lottery_type):
+                    if self.checkpoint.is_done(lottery_type, issue):
+                        self.counts['skipped'] += 1
+                    else:
+                        work_items.append((lottery_type, issue))
+            except Exception as e:
+                log.error("Error listing issues for %s: %s", lottery_type, e)
+                self.timer.count('exceptions', where='list_issues', game=lottery_type)
+                continue
+        return work_items
+
+    def scrape_issue(self, scraper, state, lottery_type, issue):
+        if self.backend == 'http':
+            return scraper.scrape_type_results(lottery_type, issue)
+
+        if state.get('lottery_type') != lottery_type:
+            state.clear()
+            if not scraper.select_lottery_type(lottery_type):
+                return []
+            state['lottery_type'] = lottery_type
+        return scraper.scrape_tab_results(lottery_type, issue)
+
+    def worker(self, scraper, work_queue):
+        state = {}
+        try:
+            if scraper is None:
+                scraper = self.create_scraper()
+        except Exception as e:
+            log.error("Error starting worker: %s", e)
+            return
+
+        while True:
+            try:
+                lottery_type, issue = work_queue.get_nowait()
+            except queue.Empty:
+                return
+            if self.timer.expired():
+                # Left for the next run by the checkpoint
+                self.timer.skip(f"{lottery_type} {issue}", self.timer.exhausted(), game=lottery_type)
+                continue
+
+            try:
+                with self.timer.step('issue'), self.timer.scope(f"{lottery_type} {issue}"):
+                    results = self.scrape_issue(scraper, state, lottery_type, issue)
+                if results:
+                    self.checkpoint.mark_done(lottery_type, issue)
+                    outcome = 'done'
+                else:
+                    log.warning("No results for %s %s", lottery_type, issue)
+                    outcome = 'failed'
+            except Exception as e:
+                log.error("Error processing %s %s: %s", lottery_type, issue, e)
+                self.timer.count('exceptions', where='backfill_issue', game=lottery_type)
+                state.clear()
+                outcome = 'failed'
+
+            with self.lock:
+                self.counts[outcome] += 1
+
+    def run(self):
+        log.info("Starting backfill with %d workers...", self.workers)
+        try:
+            first_scraper = self.create_scraper()
+            work_items = self.list_work_items(first_scraper)
+            log.info("%d issues to scrape, %d already in %s", len(work_items), self.counts['skipped'], self.checkpoint.path)
+
+            work_queue = queue.Queue()
+            for item in work_items:
+                work_queue.put(item)
+
+            threads = [threading.Thread(target=self.worker, args=(first_scraper, work_queue))]
+            for _ in range(min(self.workers, len(work_items)) - 1):
+                threads.append(threading.Thread(target=self.worker, args=(None, work_queue)))
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        except Exception as e:
+            log.error("Error occurred: %s", e)
+            self.timer.count('exceptions', where='backfill')
+
+        finally:
+            log.info("Backfill finished: %d done, %d skipped, %d failed",
+                     self.counts['done'], self.counts['skipped'], self.counts['failed'])
+            if self.backend != 'http':
+                from lottery_browser import network_report
+                for scraper in self.scrapers:
+                    network_report(scraper.driver, self.timer)
+            self.timer.report()
+            for scraper in self.scrapers:
+                try:
+                    if self.backend == 'http':
+                        scraper.client.close()
+                    else:
+                        scraper.driver.quit()
+                except Exception as e:
+                    log.warning("Error closing scraper: %s", e)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill historical results issue by issue")
+    parser.add_argument('--range', action='append', required=True, dest='ranges',
+                        help="Game type and issue range, e.g. 胜负游戏=24001-24167 (repeatable)")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT)
+    parser.add_argument('--backend', choices=['browser', 'http'], default='browser')
+    parser.add_argument('--base-url', help="Feed URL for the http backend, e.g. lottery_fixture_server.py")
+    parser.add_argument('--time-budget', type=float, help="Total seconds the run may take")
+    parser.add_argument('--issue-budget', type=float, help="Seconds each issue may take")
+    parser.add_argument('--breaker-misses', type=int, default=3,
+                        help="Timeouts in a row after which a selector is no longer waited for")
+    parser.add_argument('--store', help="SQLite store to upsert into instead of writing CSV files")
+    parser.add_argument('--log-level', default='INFO', help="DEBUG also logs every parsed row")
+    parser.add_argument('--metrics-prom', help="Prometheus textfile to write step timings and counts to")
+    parser.add_argument('--metrics-jsonl', help="File to append every step span and count to as JSON lines")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(message)s')
+    metrics = None
+    if args.metrics_prom or args.metrics_jsonl:
+        from lottery_metrics import RunMetrics
+        metrics = RunMetrics('backfill', args.metrics_prom, args.metrics_jsonl)
+
+    issue_ranges = {}
+    for text in args.ranges:
+        lottery_type, start, end = parse_issue_range(text)
+        issue_ranges[lottery_type] = (start, end)
+
+    backfill = LotteryBackfill(issue_ranges, workers=args.workers, checkpoint_path=args.checkpoint,
+                               backend=args.backend, base_url=args.base_url, time_budget=args.time_budget,
+                               store_path=args.store, issue_budget=args.issue_budget,
+                               breaker_misses=args.breaker_misses, metrics=metrics)
+    backfill.run()
+
+    if metrics is not None:
+        metrics.close([scraper.driver for scraper in backfill.scrapers if hasattr(scraper, 'driver')])
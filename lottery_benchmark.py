@@ -0,0 +1,312 @@
+from contextlib import redirect_stdout, nullcontext
+from datetime import datetime
+import argparse
+import csv
+import glob
+import io
+import json
+import logging
+import os
+import resource
+import statistics
+import tempfile
+import time
+from lottery_fixture_server import start_fixture_server, FIXTURE_DIR
+
+DEFAULT_OUTPUT_DIR = 'benchmark_results'
+
+# Output files of each extractor, used to count the rows a stage produced
+STAGE_FILES = {
+    'selling': 'lottery_selling_*.csv',
+    'results': 'lottery_results_*.csv',
+    'prizes': 'lottery_prizes_*.csv'
+}
+
+
+def peak_rss_kb(pid='self'):
+    # VmHWM: peak resident set size since start or the last reset_peak_rss()
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    if pid == 'self':
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return None
+
+
+def reset_peak_rss():
+    # Linux resets VmHWM when 5 is written to clear_refs, so each stage
+    # reports its own peak instead of the process lifetime one
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def child_pids(pid):
+    children = []
+    for task in glob.glob(f'/proc/{pid}/task/*/children'):
+        try:
+            with open(task) as f:
+                children.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return children
+
+
+def browser_peak_rss_kb():
+    # Sum of the peaks of chromedriver and every Chrome process under it
+    total = 0
+    pending = child_pids(os.getpid())
+    while pending:
+        pid = pending.pop()
+        total += peak_rss_kb(pid) or 0
+        pending.extend(child_pids(pid))
+    return total or None
+
+
+def count_rows(directory, pattern):
+    rows = 0
+    for path in glob.glob(os.path.join(directory, pattern)):
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            rows += sum(1 for _ in csv.DictReader(f))
+    return rows
+
+
+class LotteryBenchmark:
+    def __init__(self, backends=('browser', 'http', 'replay'), repeat=1, fixture_dir=FIXTURE_DIR,
+                 replay_dir=None, verbose=False, block_profile=None):
+        # replay_dir: existing snapshot archive for the replay stage instead of
+        # the one the browser stages record
+        self.backends = backends
+        self.repeat = max(1, repeat)
+        self.fixture_dir = fixture_dir
+        self.verbose = verbose
+        # lottery_browser.BLOCK_PROFILES name for the browser stages
+        self.block_profile = block_profile
+        self.base_url = None
+        self.archive_dir = None
+        # Stages run in temporary working directories
+        self.replay_dir = os.path.abspath(replay_dir) if replay_dir else None
+        self.results = []
+
+    def run_stage(self, backend, stage, function):
+        # Runs function(work_dir) repeat times in fresh directories. function
+        # returns the WebDriver command count and step timings of its run.
+        runs = []
+        for _ in range(self.repeat):
+            with tempfile.TemporaryDirectory() as work_dir:
+                reset_peak_rss()
+                previous_dir = os.getcwd()
+                os.chdir(work_dir)
+                started = time.perf_counter()
+                try:
+                    with nullcontext() if self.verbose else redirect_stdout(io.StringIO()):
+                        measured = function(work_dir) or {}
+                    error = None
+                except Exception as e:
+                    measured = {}
+                    error = str(e)
+                finally:
+                    wall_time = time.perf_counter() - started
+                    os.chdir(previous_dir)
+
+                rows = count_rows(work_dir, STAGE_FILES[stage]) if stage in STAGE_FILES else measured.get('rows', 0)
+                runs.append({
+                    'wall_time': wall_time,
+                    'rows': rows,
+                    'rows_per_second': rows / wall_time if wall_time > 0 else None,
+                    'webdriver_commands': measured.get('commands'),
+                    'peak_rss_kb': peak_rss_kb(),
+                    'browser_peak_rss_kb': measured.get('browser_peak_rss_kb'),
+                    'network_bytes': measured.get('network_bytes'),
+                    'blocked_requests': measured.get('blocked_requests'),
+                    'blocked_bytes_saved': measured.get('blocked_bytes_saved'),
+                    'steps': measured.get('steps', {}),
+                    'error': error
+                })
+            if runs[-1]['error']:
+                break
+
+        wall_times = [run['wall_time'] for run in runs]
+        result = dict(runs[-1])
+        result.update({
+            'backend': backend,
+            'stage': stage,
+            'runs': len(runs),
+            'wall_time': statistics.median(wall_times),
+            'wall_time_min': min(wall_times)
+        })
+        if result['rows'] and result['wall_time'] > 0:
+            result['rows_per_second'] = result['rows'] / result['wall_time']
+        self.results.append(result)
+        self.print_result(result)
+        return result
+
+    def browser_stage(self, stage):
+        def run(work_dir):
+            from lottery_browser import create_driver, network_report
+            from lottery_snapshots import SnapshotArchive
+            from lottery_waits import StepTimer
+
+            timer = StepTimer()
+            driver = create_driver(timer, block_profile=self.block_profile)
+            archive = SnapshotArchive(self.archive_dir) if self.archive_dir else None
+            try:
+                if stage == 'selling':
+                    from lottery_selling import LotteryScraper
+                    scraper = LotteryScraper(driver=driver, timer=timer, archive=archive)
+                    scraper.base_url = f"{self.base_url}/ctzc/jsq/index.html"
+                    scraper.scrape_match_data()
+                elif stage == 'results':
+                    from lottery_result import LotteryResultsScraper
+                    scraper = LotteryResultsScraper(driver=driver, timer=timer, archive=archive)
+                    scraper.base_url = f"{self.base_url}/ctzc/kjgg/index.html"
+                    scraper.scrape_lottery_results()
+                else:
+                    from lottery_prize_scraper import LotteryPrizeScraper
+                    scraper = LotteryPrizeScraper(driver=driver, timer=timer)
+                    scraper.base_url = f"{self.base_url}/ctzc/kjgg/index.html"
+                    scraper.scrape_prizes()
+                network = network_report(driver) or {}
+                return {
+                    'commands': driver.command_count,
+                    'network_bytes': network.get('bytes'),
+                    'blocked_requests': network.get('blocked'),
+                    'blocked_bytes_saved': network.get('saved'),
+                    'browser_peak_rss_kb': browser_peak_rss_kb(),
+                    'steps': {name: {'count': count, 'total': total, 'max': longest}
+                              for name, (count, total, longest) in timer.steps.items()}
+                }
+            finally:
+                driver.quit()
+        return run
+
+    def http_stage(self, stage):
+        def run(work_dir):
+            from lottery_http import HttpLotteryScraper, HttpLotteryResultsScraper, HttpLotteryPrizeScraper
+            scraper_class = {
+                'selling': HttpLotteryScraper,
+                'results': HttpLotteryResultsScraper,
+                'prizes': HttpLotteryPrizeScraper
+            }[stage]
+            scraper_class(self.base_url).run()
+        return run
+
+    def replay_stage(self, work_dir):
+        from lottery_snapshots import SnapshotArchive, SnapshotReplay
+        replay = SnapshotReplay(SnapshotArchive(self.replay_dir or self.archive_dir))
+        replay.run()
+        return {'rows': replay.stats['rows']}
+
+    def run(self):
+        server, self.base_url = start_fixture_server(fixture_dir=self.fixture_dir)
+        snapshot_dir = tempfile.TemporaryDirectory()
+        try:
+            if 'browser' in self.backends:
+                # The browser stages archive what they see for the replay stage
+                self.archive_dir = os.path.join(snapshot_dir.name, 'snapshots')
+                for stage in ('selling', 'results', 'prizes'):
+                    result = self.run_stage('browser', stage, self.browser_stage(stage))
+                    if result['error'] and stage == 'selling':
+                        print("Browser unavailable, skipping the remaining browser stages")
+                        break
+            if 'http' in self.backends:
+                for stage in ('selling', 'results', 'prizes'):
+                    self.run_stage('http', stage, self.http_stage(stage))
+            if 'replay' in self.backends:
+                replay_dir = self.replay_dir or self.archive_dir
+                if replay_dir and os.path.exists(os.path.join(replay_dir, 'index.jsonl')):
+                    self.run_stage('replay', 'snapshots', self.replay_stage)
+                else:
+                    print("No snapshots recorded by the browser stages, skipping replay")
+        finally:
+            server.shutdown()
+            snapshot_dir.cleanup()
+        return self.results
+
+    def print_result(self, result):
+        label = f"{result['backend']}/{result['stage']}"
+        if result['error']:
+            print(f"{label}: failed: {result['error']}")
+            return
+        line = f"{label}: {result['wall_time']:.3f}s, {result['rows']} rows"
+        if result['rows_per_second']:
+            line += f" ({result['rows_per_second']:,.0f} rows/s)"
+        if result['webdriver_commands'] is not None:
+            line += f", {result['webdriver_commands']} WebDriver commands"
+        line += f", peak RSS {result['peak_rss_kb'] / 1024:.1f} MB"
+        if result['browser_peak_rss_kb']:
+            line += f" (browser {result['browser_peak_rss_kb'] / 1024:.1f} MB)"
+        if result.get('network_bytes') is not None:
+            line += f", {result['network_bytes'] / 1024:.1f} KB transferred, {result['blocked_requests']} requests blocked"
+            if result.get('blocked_bytes_saved'):
+                line += f" (about {result['blocked_bytes_saved'] / 1024:.1f} KB saved)"
+        print(line)
+
+    def save(self, path):
+        report = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'repeat': self.repeat,
+            'results': self.results
+        }
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+        print(f"Benchmark results saved to {path}")
+
+
+def compare(baseline_path, results, threshold=0.1):
+    # Prints the change of each stage against an earlier report and returns
+    # the stages whose wall time grew by more than threshold
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {(r['backend'], r['stage']): r for r in json.load(f)['results']}
+
+    regressions = []
+    print(f"\nCompared with {baseline_path}:")
+    for result in results:
+        before = baseline.get((result['backend'], result['stage']))
+        if not before or before['error'] or result['error']:
+            continue
+        change = (result['wall_time'] - before['wall_time']) / before['wall_time'] if before['wall_time'] else 0.0
+        line = f"  {result['backend']}/{result['stage']}: {before['wall_time']:.3f}s -> {result['wall_time']:.3f}s ({change:+.1%})"
+        if result['webdriver_commands'] is not None and before.get('webdriver_commands') is not None:
+            line += f", WebDriver commands {before['webdriver_commands']} -> {result['webdriver_commands']}"
+        if result.get('network_bytes') is not None and before.get('network_bytes') is not None:
+            line += f", transferred {before['network_bytes'] / 1024:.1f} KB -> {result['network_bytes'] / 1024:.1f} KB"
+        if change > threshold:
+            line += "  REGRESSION"
+            regressions.append(result)
+        print(line)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the extractors against the recorded page fixtures")
+    parser.add_argument('--backend', action='append', choices=['browser', 'http', 'replay'], dest='backends',
+                        help="Backend to benchmark (repeatable, default all)")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per stage; the median wall time is reported")
+    parser.add_argument('--fixture-dir', default=FIXTURE_DIR)
+    parser.add_argument('--snapshots', help="Snapshot archive to replay instead of the browser stages' own")
+    parser.add_argument('--output', help="JSON report path (default benchmark_results/benchmark_<time>.json)")
+    parser.add_argument('--compare', help="Earlier JSON report to compare against")
+    parser.add_argument('--threshold', type=float, default=0.1, help="Wall time growth reported as a regression")
+    parser.add_argument('--verbose', action='store_true', help="Show the scrapers' own output")
+    parser.add_argument('--block-profile', help="Request blocking profile of the browser stages (off, lean, strict)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format='%(message)s')
+
+    benchmark = LotteryBenchmark(backends=args.backends or ('browser', 'http', 'replay'), repeat=args.repeat,
+                                 fixture_dir=args.fixture_dir, replay_dir=args.snapshots, verbose=args.verbose,
+                                 block_profile=args.block_profile)
+    results = benchmark.run()
+    benchmark.save(args.output or os.path.join(
+        DEFAULT_OUTPUT_DIR, f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"))
+
+    if args.compare and compare(args.compare, results, args.threshold):
+        raise SystemExit(1)
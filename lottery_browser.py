@@ -0,0 +1,393 @@
+from contextlib import nullcontext
+import atexit
+import fnmatch
+import json
+import logging
+import os
+import re
+import subprocess
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+# Resolved chromedriver binary and the Chrome version it was resolved for.
+# ChromeDriverManager().install() asks the driver-version endpoint on every
+# call; the cached path is reused until it is older than
+# DRIVER_REVALIDATE_SECONDS or Chrome is updated.
+DRIVER_CACHE_PATH = os.environ.get('LOTTERY_DRIVER_CACHE',
+                                   os.path.join(os.path.expanduser('~'), '.cache', 'lottery_scraper', 'chromedriver.json'))
+DRIVER_REVALIDATE_SECONDS = float(os.environ.get('LOTTERY_DRIVER_REVALIDATE_SECONDS', 7 * 24 * 3600))
+
+CHROME_BINARIES = ('google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser')
+
+# URL patterns handed to Network.setBlockedURLs, by group. The tables are
+# rendered by the page's own scripts from XHR data, so documents, scripts and
+# XHR/fetch are never blocked; stylesheets decide which blocks are visible
+# and are only blocked by the strict profile.
+BLOCK_PATTERNS = {
+    'image': ['*.png*', '*.jpg*', '*.jpeg*', '*.gif*', '*.webp*', '*.svg*', '*.ico*', '*.bmp*'],
+    'font': ['*.woff*', '*.ttf*', '*.otf*', '*.eot*'],
+    'media': ['*.mp4*', '*.webm*', '*.mp3*', '*.m3u8*', '*.flv*'],
+    'tracker': ['*hm.baidu.com*', '*cnzz.com*', '*google-analytics.com*', '*googletagmanager.com*',
+                '*doubleclick.net*', '*umeng.com*', '*growingio.com*'],
+    'stylesheet': ['*.css*']
+}
+
+BLOCK_PROFILES = {
+    'off': (),
+    'lean': ('image', 'font', 'media', 'tracker'),
+    'strict': ('image', 'font', 'media', 'tracker', 'stylesheet')
+}
+
+DEFAULT_BLOCK_PROFILE = os.environ.get('LOTTERY_BLOCK_PROFILE', 'lean')
+
+# Requests and encoded bytes loaded per BLOCK_PATTERNS group by runs that did
+# not block the group (e.g. LOTTERY_BLOCK_PROFILE=off). Blocked requests never
+# transfer anything, so the bytes blocking saves are estimated from these
+# averages.
+NETWORK_BASELINE_PATH = os.environ.get('LOTTERY_NETWORK_BASELINE',
+                                       os.path.join(os.path.expanduser('~'), '.cache', 'lottery_scraper',
+                                                    'network_baseline.json'))
+baseline_lock = threading.Lock()
+
+# The window only has to be wide enough for the tables' layout
+WINDOW_SIZE = os.environ.get('LOTTERY_WINDOW_SIZE', '1280,900')
+
+# Added to every Chrome command line, so lottery_daemon.py can tell the
+# scrapers' browsers from others when it reaps orphaned processes
+MARKER_SWITCH = '--lottery-scraper'
+
+# lottery_daemon.py address; when set, create_driver() leases one of its warm
+# sessions instead of launching Chrome
+DAEMON_URL = os.environ.get('LOTTERY_BROWSER_DAEMON')
+
+
+def browser_version():
+    # Installed Chrome version from `--version`, None when no binary answers
+    for binary in CHROME_BINARIES:
+        try:
+            output = subprocess.run([binary, '--version'], capture_output=True, text=True, timeout=5).stdout
+        except (OSError, subprocess.SubprocessError):
+            continue
+        match = re.search(r'\d+(\.\d+)+', output)
+        if match:
+            return match.group(0)
+    return None
+
+
+def read_driver_cache(path=DRIVER_CACHE_PATH):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_driver_cache(entry, path=DRIVER_CACHE_PATH):
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        log.warning("Could not write driver cache %s: %s", path, e)
+
+
+def resolve_driver_path(cache_path=DRIVER_CACHE_PATH, revalidate_seconds=DRIVER_REVALIDATE_SECONDS):
+    # chromedriver path for the installed Chrome. Returns None when nothing
+    # could be resolved, leaving it to Selenium Manager.
+    cached = read_driver_cache(cache_path)
+    version = browser_version()
+    fresh = time.time() - cached.get('resolved', 0) < revalidate_seconds
+    if cached.get('path') and os.path.exists(cached['path']) and fresh and cached.get('browser_version') == version:
+        return cached['path']
+
+    try:
+        from webdriver_manager.chrome import ChromeDriverManager
+        path = ChromeDriverManager().install()
+    except Exception as e:
+        # A slow or failing version endpoint should not stop the run when a
+        # driver was resolved before
+        if cached.get('path') and os.path.exists(cached['path']):
+            log.warning("Driver resolution failed (%s), using cached %s", e, cached['path'])
+            return cached['path']
+        log.warning("Driver resolution failed: %s", e)
+        return None
+
+    write_driver_cache({'path': path, 'browser_version': version, 'resolved': time.time()}, cache_path)
+    return path
+
+
+def block_patterns(profile):
+    if profile not in BLOCK_PROFILES:
+        raise ValueError(f"Unknown block profile {profile!r}, expected one of {', '.join(BLOCK_PROFILES)}")
+    return [pattern for group in BLOCK_PROFILES[profile] for pattern in BLOCK_PATTERNS[group]]
+
+
+def create_driver(timer=None, block_profile=None, page=None, daemon_url=None):
+    # Headless Chrome configured for all three scrapers, so one session can be
+    # shared between them. With a StepTimer, each startup phase is recorded
+    # as its own step. block_profile is a BLOCK_PROFILES name, by default
+    # LOTTERY_BLOCK_PROFILE or 'lean'. With a daemon (daemon_url or
+    # LOTTERY_BROWSER_DAEMON) a warm session is leased instead, preferably
+    # one showing page ('jsq' or 'kjgg'); Chrome is only launched here when
+    # the daemon cannot be reached or has no session free. daemon_url=''
+    # always launches Chrome, as the daemon does for its own sessions.
+    patterns = block_patterns(block_profile or DEFAULT_BLOCK_PROFILE)
+
+    def step(name):
+        return timer.step(name) if timer is not None else nullcontext()
+
+    if daemon_url is None:
+        daemon_url = DAEMON_URL
+    if daemon_url:
+        with step('startup_lease'):
+            driver = lease_driver(daemon_url, page)
+        if driver is not None:
+            return driver
+        log.warning("No session from the browser daemon at %s, launching Chrome", daemon_url)
+
+    with step('startup_import'):
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service
+
+    options = webdriver.ChromeOptions()
+    options.add_argument('--headless')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--disable-gpu')
+    options.add_argument(f'--window-size={WINDOW_SIZE}')
+    options.add_argument('--enable-javascript')
+    options.add_argument('--disable-blink-features=AutomationControlled')
+    options.add_experimental_option('excludeSwitches', ['enable-automation'])
+    options.add_experimental_option('useAutomationExtension', False)
+    options.add_argument(f'user-agent={USER_AGENT}')
+    options.add_argument(MARKER_SWITCH)
+    # Network events for network_report()
+    options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+    with step('startup_driver_resolve'):
+        driver_path = resolve_driver_path()
+    with step('startup_browser_launch'):
+        service = Service(driver_path) if driver_path else Service()
+        driver = webdriver.Chrome(service=service, options=options)
+    driver.network_stats = new_network_stats()
+    if patterns:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+    return count_commands(driver)
+
+
+def lease_driver(daemon_url, page=None, wait=10):
+    # A session leased from lottery_daemon.py, None when the daemon is not
+    # reachable or has no session free within wait seconds
+    import requests
+    try:
+        response = requests.post(f"{daemon_url.rstrip('/')}/lease", json={'page': page, 'wait': wait},
+                                 timeout=wait + 5)
+    except requests.RequestException as e:
+        log.warning("Browser daemon not reachable: %s", e)
+        return None
+    if response.status_code != 200:
+        log.warning("Browser daemon has no session: %s", response.text.strip())
+        return None
+    return attach_driver(daemon_url, response.json())
+
+
+def release_lease(daemon_url, lease_id):
+    # Hands the session back; releasing twice (quit() and then exit) is harmless
+    import requests
+    try:
+        requests.post(f"{daemon_url.rstrip('/')}/release", json={'lease': lease_id}, timeout=5)
+    except requests.RequestException as e:
+        log.warning("Could not release session %s: %s", lease_id, e)
+
+
+def attach_driver(daemon_url, lease):
+    # webdriver.Chrome on the daemon's chromedriver and an existing session.
+    # quit() releases the lease instead of ending the session, so the
+    # scrapers' finally blocks hand the session back unchanged; a run that
+    # dies without quit() releases it at exit, and the daemon takes back
+    # leases that are never released.
+    from selenium import webdriver
+    from selenium.webdriver.chromium.remote_connection import ChromiumRemoteConnection
+    from selenium.webdriver.remote.webdriver import WebDriver as RemoteWebDriver
+
+    class LeasedChrome(webdriver.Chrome):
+        def __init__(self):
+            self.vendor_prefix = 'goog'
+            self.service = None
+            RemoteWebDriver.__init__(self, command_executor=ChromiumRemoteConnection(
+                remote_server_addr=lease['executor'], vendor_prefix='goog', browser_name='chrome'
+            ), options=webdriver.ChromeOptions())
+
+        def start_session(self, capabilities, browser_profile=None):
+            self.session_id = lease['session_id']
+            self.caps = lease.get('capabilities') or {}
+
+        def quit(self):
+            release_lease(daemon_url, lease['lease'])
+
+    driver = LeasedChrome()
+    driver.lease = lease['lease']
+    driver.warm_url = lease.get('url')
+    driver.network_stats = new_network_stats()
+    atexit.register(release_lease, daemon_url, lease['lease'])
+    log.info("Leased browser session %s from %s", lease['lease'], daemon_url)
+    return count_commands(driver)
+
+
+def open_page(driver, url):
+    # Loads url, unless the driver is a leased session that the daemon has
+    # just loaded it in
+    warm_url = getattr(driver, 'warm_url', None)
+    driver.warm_url = None
+    if warm_url == url:
+        log.info("Using the page preloaded by the browser daemon")
+        return
+    driver.get(url)
+
+
+def new_network_stats():
+    return {'requests': 0, 'bytes': 0, 'blocked': 0, 'blocked_types': {}, 'blocked_groups': {},
+            'saved_bytes': {}, 'saved': 0}
+
+
+def block_group(url):
+    # The BLOCK_PATTERNS group a URL belongs to, None for documents, scripts
+    # and XHR. Trackers come first: hm.baidu.com/hm.gif is not an image.
+    for group in sorted(BLOCK_PATTERNS, key=lambda group: group != 'tracker'):
+        if any(fnmatch.fnmatchcase(url, pattern) for pattern in BLOCK_PATTERNS[group]):
+            return group
+    return None
+
+
+def read_network_baseline(path=NETWORK_BASELINE_PATH):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def update_network_baseline(loaded, path=NETWORK_BASELINE_PATH):
+    # Adds {group: [requests, bytes]} loaded by this session to the baseline
+    with baseline_lock:
+        baseline = read_network_baseline(path)
+        for group, (count, size) in loaded.items():
+            total = baseline.get(group, [0, 0])
+            baseline[group] = [total[0] + count, total[1] + size]
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(baseline, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            log.warning("Could not write network baseline %s: %s", path, e)
+    return baseline
+
+
+def network_report(driver, timer=None, baseline_path=NETWORK_BASELINE_PATH):
+    # Drains Chrome's performance log into driver.network_stats: requests
+    # loaded, bytes transferred, requests blocked by type and by BLOCK_PATTERNS
+    # group, and the bytes blocking saved per group. Logs the totals and adds
+    # them to the timer's counts.
+    stats = getattr(driver, 'network_stats', None)
+    if stats is None:
+        return None
+    try:
+        entries = driver.get_log('performance')
+    except Exception as e:
+        log.debug("No performance log: %s", e)
+        entries = []
+
+    requests = transferred = 0
+    urls = {}
+    blocked = {}
+    blocked_groups = {}
+    loaded_groups = {}
+    for entry in entries:
+        try:
+            message = json.loads(entry['message'])['message']
+        except (KeyError, ValueError):
+            continue
+        params = message.get('params', {})
+        if message.get('method') == 'Network.requestWillBeSent':
+            urls[params.get('requestId')] = params.get('request', {}).get('url', '')
+        elif message.get('method') == 'Network.loadingFinished':
+            requests += 1
+            size = int(params.get('encodedDataLength', 0))
+            transferred += size
+            group = block_group(urls.get(params.get('requestId'), ''))
+            if group:
+                count, total = loaded_groups.get(group, (0, 0))
+                loaded_groups[group] = (count + 1, total + size)
+        elif message.get('method') == 'Network.loadingFailed' and params.get('blockedReason'):
+            kind = params.get('type', 'Other')
+            blocked[kind] = blocked.get(kind, 0) + 1
+            group = block_group(urls.get(params.get('requestId'), '')) or 'other'
+            blocked_groups[group] = blocked_groups.get(group, 0) + 1
+
+    if loaded_groups:
+        baseline = update_network_baseline(loaded_groups, baseline_path)
+    else:
+        baseline = read_network_baseline(baseline_path)
+    saved = {}
+    for group, count in blocked_groups.items():
+        if baseline.get(group, [0])[0]:
+            saved[group] = round(count * baseline[group][1] / baseline[group][0])
+
+    stats['requests'] += requests
+    stats['bytes'] += transferred
+    stats['blocked'] += sum(blocked.values())
+    for kind, value in blocked.items():
+        stats['blocked_types'][kind] = stats['blocked_types'].get(kind, 0) + value
+    for group, value in blocked_groups.items():
+        stats['blocked_groups'][group] = stats['blocked_groups'].get(group, 0) + value
+    for group, value in saved.items():
+        stats['saved_bytes'][group] = stats['saved_bytes'].get(group, 0) + value
+    stats['saved'] += sum(saved.values())
+
+    if timer is not None:
+        timer.count('network_requests', requests)
+        timer.count('network_bytes', transferred)
+        for kind, value in blocked.items():
+            timer.count('blocked_requests', value, type=kind)
+        for group, value in saved.items():
+            timer.count('blocked_bytes_saved', value, group=group)
+    log.info("Network: %d requests, %.1f KB transferred, %d blocked (%s)", stats['requests'],
+             stats['bytes'] / 1024, stats['blocked'],
+             ', '.join(f"{kind} {value}" for kind, value in sorted(stats['blocked_types'].items())) or 'none')
+    if stats['blocked_groups']:
+        log.info("Blocking saved about %.1f KB (%s)", stats['saved'] / 1024,
+                 ', '.join(f"{group} {value / 1024:.1f} KB" for group, value in sorted(stats['saved_bytes'].items()))
+                 or 'none measured')
+        unknown = sorted(set(stats['blocked_groups']) - set(stats['saved_bytes']))
+        if unknown:
+            log.info("No network baseline for %s yet; a run with LOTTERY_BLOCK_PROFILE=off records one",
+                     ', '.join(unknown))
+    return stats
+
+
+def count_commands(driver):
+    # Every WebDriver command, including WebElement calls, goes through
+    # driver.execute; count them on driver.command_count and per command
+    # name on driver.command_counts
+    if hasattr(driver, 'command_count'):
+        return driver
+    driver.command_count = 0
+    driver.command_counts = {}
+    execute = driver.execute
+
+    def counted_execute(driver_command, params=None):
+        driver.command_count += 1
+        driver.command_counts[driver_command] = driver.command_counts.get(driver_command, 0) + 1
+        return execute(driver_command, params)
+
+    driver.execute = counted_execute
+    return driver
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+import hashlib
+import json
+import os
+import threading
+
+DEFAULT_CACHE_PATH = 'fingerprint_cache.json'
+
+# Raw markup of everything a table extraction reads, so any change to the
+# rows, odds or deadline produces a different fingerprint
+MARKUP_SCRIPT = """
+var html = '';
+for (var i = 0; i < arguments.length; i++) {
+    var nodes = document.querySelectorAll(arguments[i]);
+    for (var j = 0; j < nodes.length; j++) { html += nodes[j].outerHTML; }
+}
+return html;
+"""
+
+
+def markup_fingerprint(driver, *selectors):
+    markup = driver.execute_script(MARKUP_SCRIPT, *selectors)
+    return hashlib.sha1(markup.encode('utf-8')).hexdigest()
+
+
+class FingerprintCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_age_days=30):
+        # key -> {'hash': markup sha1, 'rows': extracted rows, 'seen': last run that saw it}
+        self.path = path
+        self.max_age = timedelta(days=max_age_days)
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.seen_keys = set()
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    def key(self, page, lottery_type, *parts):
+        # (page, game type, sale status, period) for jsq, (page, game type, issue) for kjgg
+        return '|'.join(str(part) for part in (page, lottery_type) + parts)
+
+    def lookup(self, key, fingerprint):
+        # Cached rows when the markup is unchanged since the last extraction
+        with self.lock:
+            self.seen_keys.add(key)
+            entry = self.entries.get(key)
+            if entry and entry['hash'] == fingerprint:
+                entry['seen'] = datetime.now().isoformat()
+                return entry['rows']
+            return None
+
+    def store(self, key, fingerprint, rows):
+        with self.lock:
+            self.seen_keys.add(key)
+            self.entries[key] = {
+                'hash': fingerprint,
+                'rows': rows,
+                'seen': datetime.now().isoformat()
+            }
+
+    def evict(self, page=None):
+        # Drops entries of `page` that this run did not see (expired periods)
+        # and every entry not seen within max_age
+        cutoff = (datetime.now() - self.max_age).isoformat()
+        with self.lock:
+            for key in list(self.entries):
+                expired = self.entries[key]['seen'] < cutoff
+                missing = page is not None and key.startswith(f"{page}|") and key not in self.seen_keys
+                if expired or missing:
+                    del self.entries[key]
+
+    def save(self):
+        with self.lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
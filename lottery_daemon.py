@@ -0,0 +1,415 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import itertools
+import json
+import logging
+import os
+import signal
+import threading
+import time
+
+from lottery_browser import MARKER_SWITCH, create_driver
+from lottery_waits import wait_for_document_ready
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8790
+
+PAGE_URLS = {
+    'jsq': 'https://www.sporttery.cn/ctzc/jsq/index.html',
+    'kjgg': 'https://www.sporttery.cn/ctzc/kjgg/index.html'
+}
+
+PAGE_PATHS = {'jsq': '/ctzc/jsq/index.html', 'kjgg': '/ctzc/kjgg/index.html'}
+
+
+def process_table():
+    # pid -> (parent pid, command line) from /proc; empty where there is no /proc
+    table = {}
+    for name in os.listdir('/proc') if os.path.isdir('/proc') else []:
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat', encoding='utf-8', errors='replace') as f:
+                # The command name may contain spaces; the fields after it do not
+                parent = int(f.read().rsplit(')', 1)[1].split()[1])
+            with open(f'/proc/{name}/cmdline', 'rb') as f:
+                cmdline = f.read().replace(b'\0', b' ').decode('utf-8', errors='replace').strip()
+        except (OSError, IndexError, ValueError):
+            continue
+        table[int(name)] = (parent, cmdline)
+    return table
+
+
+def process_tree(root, table):
+    pids, pending = [], [root]
+    while pending:
+        pid = pending.pop()
+        pids.append(pid)
+        pending.extend(child for child, (parent, _) in table.items() if parent == pid)
+    return pids
+
+
+def tree_rss_mb(root, table=None):
+    # Resident memory of a process and its children (Chrome's renderers)
+    total = 0
+    for pid in process_tree(root, table or process_table()):
+        try:
+            with open(f'/proc/{pid}/status', encoding='utf-8') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+                        break
+        except (OSError, ValueError):
+            continue
+    return total / 1024
+
+
+def orphaned_processes(keep=(), table=None):
+    # Chrome browsers started by the scrapers (MARKER_SWITCH on their command
+    # line) whose chromedriver is gone, and orphaned chromedrivers still
+    # owning such a browser. Processes in keep (the daemon's own sessions)
+    # are left alone.
+    table = table or process_table()
+    keep = set(keep)
+    orphans = []
+    for pid, (parent, cmdline) in table.items():
+        if pid in keep:
+            continue
+        if MARKER_SWITCH in cmdline.split():
+            parent_cmdline = table.get(parent, (0, ''))[1]
+            if 'chromedriver' not in parent_cmdline:
+                orphans.append(pid)
+        elif 'chromedriver' in cmdline.split(' ', 1)[0] and parent == 1:
+            children = [table[child][1] for child in process_tree(pid, table)[1:] if child in table]
+            if any(MARKER_SWITCH in child.split() for child in children):
+                orphans.append(pid)
+    return orphans
+
+
+def reap_orphans(keep=(), grace=5):
+    # Terminates orphaned browsers and chromedrivers, killing what is still
+    # running after grace seconds; returns the pids found
+    orphans = orphaned_processes(keep)
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        alive = []
+        for pid in orphans:
+            try:
+                os.kill(pid, sig)
+                alive.append(pid)
+            except ProcessLookupError:
+                continue
+            except PermissionError as e:
+                log.warning("Cannot stop orphaned process %d: %s", pid, e)
+        if not alive or sig == signal.SIGKILL:
+            break
+        deadline = time.monotonic() + grace
+        while time.monotonic() < deadline and any(os.path.exists(f'/proc/{pid}') for pid in alive):
+            time.sleep(0.2)
+    if orphans:
+        log.info("Reaped %d orphaned browser processes: %s", len(orphans), ', '.join(map(str, orphans)))
+    return orphans
+
+
+class BrowserSession:
+    # One warm Chrome session. state is 'idle' (ready to lease), 'leased',
+    # or 'busy' while the pool reloads or replaces it.
+    ids = itertools.count(1)
+
+    def __init__(self, page, url, block_profile=None):
+        self.id = next(self.ids)
+        self.page = page
+        self.url = url
+        self.driver = create_driver(block_profile=block_profile, daemon_url='')
+        self.state = 'busy'
+        self.uses = 0
+        self.lease = None
+        self.leased_at = None
+        self.loaded_at = None
+
+    def pids(self):
+        service = getattr(self.driver, 'service', None)
+        process = getattr(service, 'process', None)
+        return [process.pid] if process is not None else []
+
+    def rss_mb(self, table=None):
+        return sum(tree_rss_mb(pid, table) for pid in self.pids())
+
+    def warm(self, page=None, url=None):
+        # Loads the page fresh and empties the performance log, so the next
+        # lease starts on a ready page with its own network counts
+        if page is not None:
+            self.page, self.url = page, url
+        self.driver.get(self.url)
+        wait_for_document_ready(self.driver, 20)
+        try:
+            self.driver.get_log('performance')
+        except Exception:
+            pass
+        self.loaded_at = time.monotonic()
+
+    def close(self):
+        try:
+            self.driver.quit()
+        except Exception as e:
+            log.warning("Error closing session %d: %s", self.id, e)
+
+
+class BrowserPool:
+    def __init__(self, size=2, pages=('jsq', 'kjgg'), page_urls=PAGE_URLS, max_uses=20, max_rss_mb=1500,
+                 refresh_interval=120, lease_ttl=900, reap_interval=300, block_profile=None):
+        # size warm sessions, spread over pages. A session is replaced after
+        # max_uses leases, when its process tree grows beyond max_rss_mb, or
+        # when a lease is not released within lease_ttl seconds. Idle pages
+        # are reloaded every refresh_interval seconds.
+        self.size = size
+        self.pages = list(pages)
+        self.page_urls = page_urls
+        self.max_uses = max_uses
+        self.max_rss_mb = max_rss_mb
+        self.refresh_interval = refresh_interval
+        self.lease_ttl = lease_ttl
+        self.reap_interval = reap_interval
+        self.block_profile = block_profile
+        self.sessions = []
+        self.condition = threading.Condition()
+        self.leases = itertools.count(1)
+        self.stopping = threading.Event()
+        self.stats = {'leases': 0, 'recycled': 0, 'reaped': 0, 'lease_timeouts': 0}
+
+    def start(self):
+        self.stats['reaped'] += len(reap_orphans())
+        for index in range(self.size):
+            self.add_session(self.pages[index % len(self.pages)])
+        threading.Thread(target=self.maintain, daemon=True).start()
+
+    def add_session(self, page):
+        try:
+            session = BrowserSession(page, self.page_urls[page], self.block_profile)
+            session.warm()
+        except Exception as e:
+            log.error("Could not start a %s session: %s", page, e)
+            return None
+        with self.condition:
+            session.state = 'idle'
+            self.sessions.append(session)
+            self.condition.notify_all()
+        log.info("Session %d ready on %s", session.id, page)
+        return session
+
+    def lease(self, page=None, wait=10):
+        # An idle session, preferably one already showing page; another idle
+        # session is moved to page first. None when none frees up in time.
+        deadline = time.monotonic() + wait
+        with self.condition:
+            while True:
+                idle = [session for session in self.sessions if session.state == 'idle']
+                if idle:
+                    session = next((s for s in idle if s.page == page), idle[0])
+                    session.state = 'leased'
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self.stopping.is_set():
+                    return None
+                self.condition.wait(remaining)
+
+        try:
+            if page in self.page_urls and session.page != page:
+                session.warm(page, self.page_urls[page])
+        except Exception as e:
+            log.warning("Session %d could not load %s: %s", session.id, page, e)
+            self.recycle(session)
+            return None
+
+        with self.condition:
+            session.uses += 1
+            session.lease = f"{session.id}-{next(self.leases)}"
+            session.leased_at = time.monotonic()
+            self.stats['leases'] += 1
+        log.info("Leased session %d (%s, use %d) as %s", session.id, session.page, session.uses, session.lease)
+        return {
+            'lease': session.lease,
+            'executor': session.driver.command_executor._url,
+            'session_id': session.driver.session_id,
+            'capabilities': session.driver.caps,
+            'url': session.url
+        }
+
+    def release(self, lease_id):
+        with self.condition:
+            session = next((s for s in self.sessions if s.lease == lease_id), None)
+            if session is None:
+                return False
+            session.state = 'busy'
+            session.lease = None
+        log.info("Released %s", lease_id)
+        # Reloading or replacing takes seconds; the client does not wait for it
+        threading.Thread(target=self.restore, args=(session,), daemon=True).start()
+        return True
+
+    def restore(self, session):
+        # A released session is reloaded for the next lease, or replaced when
+        # it has been used enough or has grown too large
+        rss = session.rss_mb()
+        if session.uses >= self.max_uses or (self.max_rss_mb and rss > self.max_rss_mb):
+            log.info("Replacing session %d after %d uses, %.0f MB", session.id, session.uses, rss)
+            self.recycle(session)
+            return
+        try:
+            session.warm()
+        except Exception as e:
+            log.warning("Session %d failed to reload: %s", session.id, e)
+            self.recycle(session)
+            return
+        with self.condition:
+            session.state = 'idle'
+            self.condition.notify_all()
+
+    def recycle(self, session):
+        with self.condition:
+            if session in self.sessions:
+                self.sessions.remove(session)
+            self.stats['recycled'] += 1
+        session.close()
+        if not self.stopping.is_set():
+            self.add_session(session.page)
+
+    def maintain(self):
+        # Takes back expired leases, keeps idle pages fresh and reaps orphans
+        last_reap = time.monotonic()
+        while not self.stopping.wait(5):
+            now = time.monotonic()
+            with self.condition:
+                expired = [s for s in self.sessions if s.state == 'leased' and now - s.leased_at > self.lease_ttl]
+                stale = [s for s in self.sessions
+                         if s.state == 'idle' and now - (s.loaded_at or 0) > self.refresh_interval]
+                for session in expired + stale:
+                    session.state = 'busy'
+            for session in expired:
+                # The client is gone or stuck; the page state is unknown
+                log.warning("Lease %s expired, replacing session %d", session.lease, session.id)
+                self.stats['lease_timeouts'] += 1
+                self.recycle(session)
+            for session in stale:
+                self.restore(session)
+            if len(self.sessions) < self.size and not any(s.state == 'busy' for s in self.sessions):
+                self.add_session(self.pages[len(self.sessions) % len(self.pages)])
+            if now - last_reap >= self.reap_interval:
+                with self.condition:
+                    keep = [pid for session in self.sessions for pid in session.pids()]
+                table = process_table()
+                keep = [child for pid in keep for child in process_tree(pid, table)]
+                self.stats['reaped'] += len(reap_orphans(keep))
+                last_reap = now
+
+    def status(self):
+        table = process_table()
+        with self.condition:
+            sessions = [{'id': s.id, 'page': s.page, 'state': s.state, 'uses': s.uses, 'lease': s.lease,
+                         'rss_mb': round(s.rss_mb(table), 1)} for s in self.sessions]
+        return dict(self.stats, sessions=sessions)
+
+    def stop(self):
+        self.stopping.set()
+        with self.condition:
+            sessions, self.sessions = self.sessions, []
+            self.condition.notify_all()
+        for session in sessions:
+            session.close()
+
+
+class DaemonRequestHandler(BaseHTTPRequestHandler):
+    # POST /lease {"page", "wait"}, POST /release {"lease"}, GET /status
+    protocol_version = 'HTTP/1.1'
+    pool = None
+
+    def do_GET(self):
+        if self.path == '/status':
+            self.send_json(200, self.pool.status())
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        except ValueError:
+            self.send_json(400, {'error': 'invalid JSON'})
+            return
+        if self.path == '/lease':
+            lease = self.pool.lease(body.get('page'), float(body.get('wait', 10)))
+            if lease is None:
+                self.send_json(503, {'error': 'no session free'})
+            else:
+                self.send_json(200, lease)
+        elif self.path == '/release':
+            self.send_json(200, {'released': self.pool.release(body.get('lease'))})
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(pool, port=DEFAULT_PORT):
+    # Listens on localhost only: leased sessions are driven through the
+    # local chromedriver, so clients run on the same machine anyway
+    handler = type('BoundDaemonRequestHandler', (DaemonRequestHandler,), {'pool': pool})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep warm browser sessions for short scraper runs to lease")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    serve_parser = subparsers.add_parser('serve', help="Run the browser daemon")
+    serve_parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument('--size', type=int, default=2, help="Warm sessions to keep")
+    serve_parser.add_argument('--pages', default='jsq,kjgg', help="Pages the sessions are spread over")
+    serve_parser.add_argument('--max-uses', type=int, default=20, help="Leases after which a session is replaced")
+    serve_parser.add_argument('--max-rss-mb', type=float, default=1500,
+                              help="Memory of a session's processes above which it is replaced")
+    serve_parser.add_argument('--refresh-interval', type=float, default=120, help="Seconds between reloads of idle pages")
+    serve_parser.add_argument('--lease-ttl', type=float, default=900, help="Seconds after which an unreleased lease expires")
+    serve_parser.add_argument('--reap-interval', type=float, default=300, help="Seconds between orphan process sweeps")
+    serve_parser.add_argument('--block-profile', help="Request blocking profile of the sessions")
+    serve_parser.add_argument('--base-url', help="Site to preload instead of sporttery.cn, e.g. lottery_fixture_server.py")
+    subparsers.add_parser('reap', help="Stop orphaned scraper browsers and chromedrivers, then exit")
+    status_parser = subparsers.add_parser('status', help="Print the daemon's sessions")
+    status_parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--log-level', default='INFO')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s %(message)s')
+
+    if args.command == 'reap':
+        print(f"Reaped {len(reap_orphans())} orphaned processes")
+    elif args.command == 'status':
+        import requests
+        print(json.dumps(requests.get(f"http://127.0.0.1:{args.port}/status", timeout=5).json(), indent=2))
+    else:
+        page_urls = dict(PAGE_URLS)
+        if args.base_url:
+            page_urls = {page: args.base_url.rstrip('/') + path for page, path in PAGE_PATHS.items()}
+        pool = BrowserPool(args.size, args.pages.split(','), page_urls, args.max_uses, args.max_rss_mb,
+                           args.refresh_interval, args.lease_ttl, args.reap_interval, args.block_profile)
+        pool.start()
+        server, url = serve(pool, args.port)
+        log.info("Browser daemon with %d sessions at %s; set LOTTERY_BROWSER_DAEMON=%s", len(pool.sessions), url, url)
+        signal.signal(signal.SIGTERM, lambda signum, frame: pool.stopping.set())
+        try:
+            while not pool.stopping.wait(1):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.shutdown()
+            pool.stop()
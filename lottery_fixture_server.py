@@ -0,0 +1,129 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from email.utils import formatdate
+import argparse
+import hashlib
+import os
+import threading
+
+from lottery_http import FEED_PATHS
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+FEED_NAMES = {path: feed for feed, path in FEED_PATHS.items()}
+
+# Recorded stand-ins for the jsq and kjgg pages; their scripts load the
+# feed fixtures above, so the browser scrapers can run against this server
+PAGE_NAMES = {
+    '/ctzc/jsq/index.html': 'jsq.html',
+    '/ctzc/kjgg/index.html': 'kjgg.html'
+}
+
+
+def fixture_name(path, params):
+    # /…/getFootBallMatchV1.qry?gameType=sfc&sellStatus=1 -> selling_sfc_1.json
+    # /…/getFootBallDrawInfoV1.qry?gameType=sfc[&issue=24167] -> draw_sfc[_24167].json
+    feed = FEED_NAMES.get(path)
+    if not feed:
+        return None
+
+    parts = [feed, params.get('gameType', [''])[0]]
+    if feed == 'selling':
+        parts.append(params.get('sellStatus', ['1'])[0])
+    elif params.get('issue'):
+        parts.append(params['issue'][0])
+    return '_'.join(parts) + '.json'
+
+
+class FixtureRequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep connections alive like they do against the site
+    protocol_version = 'HTTP/1.1'
+    fixture_dir = FIXTURE_DIR
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if parsed.path in PAGE_NAMES:
+            self.send_file(os.path.join(self.fixture_dir, 'pages', PAGE_NAMES[parsed.path]), 'text/html')
+            return
+
+        # Notice PDFs are served like pdf.sporttery.cn: /<code>/<issue>/<issue>[XL].pdf
+        if parsed.path.endswith('.pdf'):
+            self.send_notice(os.path.join(self.fixture_dir, 'notices', *parsed.path.strip('/').split('/')))
+            return
+
+        name = fixture_name(parsed.path, parse_qs(parsed.query))
+        self.send_file(os.path.join(self.fixture_dir, name) if name else None, 'application/json')
+
+    def send_file(self, path, content_type):
+        if path and os.path.isfile(path):
+            with open(path, 'rb') as f:
+                body = f.read()
+            self.send_response(200)
+        elif content_type == 'text/html':
+            body = b'<html><body>page fixture not found</body></html>'
+            self.send_response(404)
+        else:
+            body = b'{"success": false, "errorMessage": "fixture not found"}'
+            self.send_response(404)
+
+        self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_notice(self, path):
+        # With an ETag and Last-Modified, and 304 for a conditional request
+        # that still matches, so cached downloads can be revalidated
+        if '..' in path.split(os.sep) or not os.path.isfile(path):
+            self.send_file(None, 'application/pdf')
+            return
+        with open(path, 'rb') as f:
+            body = f.read()
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        last_modified = formatdate(int(os.path.getmtime(path)), usegmt=True)
+
+        if self.headers.get('If-None-Match') == etag or (
+                not self.headers.get('If-None-Match') and self.headers.get('If-Modified-Since') == last_modified):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/pdf')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', last_modified)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fixture_server(port=0, fixture_dir=FIXTURE_DIR, background=True):
+    # With background=False the server is only bound; the caller runs
+    # serve_forever() itself
+    handler = type('BoundFixtureRequestHandler', (FixtureRequestHandler,), {'fixture_dir': fixture_dir})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    if background:
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the bundled sporttery.cn fixtures locally")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--fixture-dir', default=FIXTURE_DIR)
+    args = parser.parse_args()
+
+    server, url = start_fixture_server(args.port, args.fixture_dir, background=False)
+    print(f"Serving fixtures from {args.fixture_dir} at {url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
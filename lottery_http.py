@@ -0,0 +1,337 @@
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from datetime import datetime
+from lottery_browser import USER_AGENT
+from lottery_selection import ScrapeSelection
+from lottery_sink import (CsvSink, PRIZE_COLUMNS, PRIZE_KEY_COLUMNS, RESULT_KEY_COLUMNS, SELLING_KEY_COLUMNS,
+                          prize_pool, result_columns, selling_columns)
+
+log = logging.getLogger(__name__)
+
+API_BASE_URL = "https://webapi.sporttery.cn"
+
+# Data feeds behind ctzc/jsq/index.html (selling) and ctzc/kjgg/index.html
+# (results and prizes). Point base_url at lottery_fixture_server.py to run
+# against the bundled fixtures instead of sporttery.cn. The payload field names
+# read below (issues, matches, options, prizeLevels, poolAmount, ...) are those
+# of the bundled fixtures; they have not been checked against a recorded
+# sporttery.cn response.
+FEED_PATHS = {
+    'selling': '/gateway/lottery/getFootBallMatchV1.qry',
+    'draw': '/gateway/lottery/getFootBallDrawInfoV1.qry'
+}
+
+GAME_CODE_MAP = {
+    '胜负游戏': 'sfc',
+    '任选9场': 'rj',
+    '6场半全场': 'bqc',
+    '4场进球': 'jq'
+}
+
+SALE_STATUS_MAP = {
+    '在售奖期': '1',
+    '即将开售': '0'
+}
+
+
+class LotteryHttpClient:
+    def __init__(self, base_url=API_BASE_URL, pool_size=4, timeout=10):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+        # One keep-alive session shared by every feed request of a run
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=2)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'User-Agent': USER_AGENT,
+            'Referer': 'https://www.sporttery.cn/'
+        })
+
+    def get_feed(self, feed, **params):
+        response = self.session.get(self.base_url + FEED_PATHS[feed], params=params, timeout=self.timeout)
+        response.raise_for_status()
+        payload = response.json()
+        if not payload.get('success', True):
+            raise ValueError(f"Feed {feed} returned an error: {payload.get('errorMessage')}")
+        return payload.get('value') or {}
+
+    def get_selling(self, lottery_type, sale_status):
+        return self.get_feed('selling', gameType=GAME_CODE_MAP[lottery_type],
+                             sellStatus=SALE_STATUS_MAP[sale_status])
+
+    def get_draw(self, lottery_type, issue=None):
+        params = {'gameType': GAME_CODE_MAP[lottery_type]}
+        if issue:
+            params['issue'] = issue
+        return self.get_feed('draw', **params)
+
+    def close(self):
+        self.session.close()
+
+
+def clean_team_name(text):
+    return ''.join((text or '').split())
+
+
+def betting_columns(game_type, options):
+    # options holds one list of bet choices per .tdDiv cell on the jsq page
+    columns = {}
+    if game_type in ['胜负游戏', '任选9场']:
+        if options and len(options[0]) >= 3:
+            columns.update({
+                'bet_win': options[0][0],
+                'bet_draw': options[0][1],
+                'bet_lose': options[0][2]
+            })
+
+    elif game_type == '6场半全场':
+        if len(options) == 2:
+            half_time, full_time = options
+            if len(half_time) >= 3:
+                columns.update({
+                    'half_win': half_time[0],
+                    'half_draw': half_time[1],
+                    'half_lose': half_time[2]
+                })
+            if len(full_time) >= 3:
+                columns.update({
+                    'full_win': full_time[0],
+                    'full_draw': full_time[1],
+                    'full_lose': full_time[2]
+                })
+
+    elif game_type == '4场进球':
+        if len(options) == 2:
+            home_goals, away_goals = options
+            for i, val in enumerate(['0', '1', '2', '3+']):
+                if i < len(home_goals):
+                    columns[f'home_goals_{val}'] = home_goals[i]
+                if i < len(away_goals):
+                    columns[f'away_goals_{val}'] = away_goals[i]
+
+    return columns
+
+
+def selling_rows(game_type, sale_status, value):
+    rows = []
+    for issue in value.get('issues', []):
+        period_info = f"{issue.get('issue', '')}期"
+        if sale_status == '即将开售':
+            sale_time = issue.get('saleTime', '')
+            deadline_time = ''
+        else:
+            deadline_time = issue.get('deadlineTime', '')
+            sale_time = ''
+
+        for match in issue.get('matches', []):
+            match_data = {
+                'period': period_info,
+                'sale_status': sale_status,
+                'deadline_time': deadline_time,
+                'sale_time': sale_time,
+                'match_num': str(match.get('matchNum', '')),
+                'league': match.get('league', ''),
+                'start_time': match.get('startTime', ''),
+                'home_team': match.get('homeTeam', ''),
+                'away_team': match.get('awayTeam', '')
+            }
+            match_data.update(betting_columns(game_type, match.get('options', [])))
+            rows.append(match_data)
+    return rows
+
+
+def result_rows(lottery_type, value):
+    rows = []
+    for i, match in enumerate(value.get('matches', [])):
+        match_data = {
+            'Period': value.get('issue'),
+            'Date': value.get('openTime'),
+            'Match_Number': str(i + 1),
+            'Home_Team': clean_team_name(match.get('homeTeam')),
+            'Away_Team': clean_team_name(match.get('awayTeam'))
+        }
+
+        if lottery_type == '6场半全场':
+            match_data.update({
+                'Half_Time_Score': match.get('halfScore'),
+                'Full_Time_Score': match.get('fullScore'),
+                'Half_Time_Result': match.get('halfResult'),
+                'Full_Time_Result': match.get('fullResult')
+            })
+        elif lottery_type == '4场进球':
+            match_data.update({
+                'Score': match.get('score'),
+                'Home_Goals': match.get('homeGoals'),
+                'Away_Goals': match.get('awayGoals')
+            })
+        else:
+            match_data.update({
+                'Score': match.get('score'),
+                'Result': match.get('result')
+            })
+        rows.append(match_data)
+    return rows
+
+
+def prize_row(lottery_type, value):
+    levels = {str(level.get('level')): level for level in value.get('prizeLevels', [])}
+    first = levels.get('1', {})
+    second = levels.get('2', {})
+
+    prize_data = {
+        'Issue_Number': value.get('issue'),
+        'Date': value.get('openTime'),
+        'Game_Type': lottery_type,
+        'First_Prize_Count': first.get('count'),
+        'First_Prize_Amount': first.get('amount'),
+        'Second_Prize_Count': None,
+        'Second_Prize_Amount': None,
+        'Prize_Pool': prize_pool(value.get('poolAmount')),
+        'Prize_Pool_Amount': value.get('poolAmount'),
+        'Prize_Notice_URL': value.get('prizeNoticeUrl'),
+        'Sales_Notice_URL': value.get('salesNoticeUrl')
+    }
+
+    # Only 胜负游戏 has a second prize level
+    if lottery_type == '胜负游戏':
+        prize_data.update({
+            'Second_Prize_Count': second.get('count'),
+            'Second_Prize_Amount': second.get('amount')
+        })
+    return prize_data
+
+
+def selected_issues(client, selection, lottery_type, issue=None):
+    # The issue asked for, the selected issues the draw feed lists, or [None]
+    # for the latest one
+    if issue or selection.periods is None:
+        return [issue]
+    issues = client.get_draw(lottery_type).get('issueList') or []
+    return [str(value) for value in issues if selection.wants_period(value)]
+
+
+class HttpLotteryScraper:
+    def __init__(self, base_url=API_BASE_URL, client=None, store=None, selection=None):
+        self.client = client or LotteryHttpClient(base_url)
+        self.store = store
+        # Feeds of unselected game types and sale statuses are not requested
+        self.selection = selection or ScrapeSelection()
+
+    def scrape_match_data(self):
+        log.info("Starting HTTP scraper (%s)...", self.selection.describe())
+        current_date = datetime.now().strftime("%Y%m%d")
+        matches_by_type = {game_type: [] for game_type in self.selection.select_games(GAME_CODE_MAP)}
+
+        try:
+            for game_type in matches_by_type:
+                log.info("Processing game type: %s", game_type)
+                for status_text in SALE_STATUS_MAP:
+                    if not self.selection.wants_status(status_text):
+                        continue
+                    try:
+                        value = self.client.get_selling(game_type, status_text)
+                        rows = [row for row in selling_rows(game_type, status_text, value)
+                                if self.selection.wants_period(row['period'])]
+                        log.info("Found %d match rows (%s)", len(rows), status_text)
+                        matches_by_type[game_type].extend(rows)
+                    except Exception as e:
+                        log.warning("Error processing sale status %s: %s", status_text, e)
+                        continue
+
+            for game_type, matches in matches_by_type.items():
+                if matches and self.store is not None:
+                    self.store.upsert_selling(game_type, matches, current_date)
+                    log.info("Upserted %d matches for %s into %s", len(matches), game_type, self.store.path)
+                elif matches:
+                    # Written to a .part file and renamed, like the browser
+                    # scrapers' output, so a crash never leaves a truncated file
+                    columns = self.selection.output_columns(selling_columns(game_type), SELLING_KEY_COLUMNS)
+                    with CsvSink(f'lottery_selling_{game_type}_{current_date}.csv', columns) as sink:
+                        sink.write(matches)
+                    log.info("Data saved to %s (%d matches)", sink.path, len(matches))
+                else:
+                    log.info("No matches found for %s", game_type)
+
+        finally:
+            self.client.close()
+
+    def run(self):
+        self.scrape_match_data()
+
+
+class HttpLotteryResultsScraper:
+    def __init__(self, base_url=API_BASE_URL, client=None, store=None, selection=None):
+        self.client = client or LotteryHttpClient(base_url)
+        self.store = store
+        self.selection = selection or ScrapeSelection()
+
+    def scrape_type_results(self, lottery_type, issue=None):
+        value = self.client.get_draw(lottery_type, issue)
+        results = result_rows(lottery_type, value)
+
+        if results and self.store is not None:
+            self.store.upsert_results(lottery_type, results)
+            log.info("Upserted %s results into %s", lottery_type, self.store.path)
+        elif results:
+            columns = self.selection.output_columns(result_columns(lottery_type), RESULT_KEY_COLUMNS)
+            with CsvSink(f'lottery_results_{lottery_type}_{value.get("issue")}.csv', columns) as sink:
+                sink.write(results)
+            log.info("Saved %s results to %s", lottery_type, sink.path)
+        return results
+
+    def scrape_lottery_results(self, issue=None):
+        log.info("Starting HTTP results scraper (%s)...", self.selection.describe())
+        try:
+            for lottery_type in self.selection.select_games(GAME_CODE_MAP):
+                try:
+                    log.info("Processing lottery type: %s", lottery_type)
+                    for selected in selected_issues(self.client, self.selection, lottery_type, issue):
+                        self.scrape_type_results(lottery_type, selected)
+                except Exception as e:
+                    log.error("Error processing lottery type %s: %s", lottery_type, e)
+                    continue
+
+        finally:
+            self.client.close()
+
+    def run(self, issue=None):
+        self.scrape_lottery_results(issue)
+
+
+class HttpLotteryPrizeScraper:
+    def __init__(self, base_url=API_BASE_URL, client=None, store=None, selection=None):
+        self.client = client or LotteryHttpClient(base_url)
+        self.store = store
+        self.selection = selection or ScrapeSelection()
+        self.prize_columns = self.selection.output_columns(PRIZE_COLUMNS, PRIZE_KEY_COLUMNS)
+
+    def scrape_prizes(self):
+        log.info("Starting HTTP prize scraper (%s)...", self.selection.describe())
+        all_prize_data = []
+
+        try:
+            for lottery_type in self.selection.select_games(GAME_CODE_MAP):
+                try:
+                    log.info("Processing %s...", lottery_type)
+                    for issue in selected_issues(self.client, self.selection, lottery_type):
+                        all_prize_data.append(prize_row(lottery_type, self.client.get_draw(lottery_type, issue)))
+                except Exception as e:
+                    log.error("Error extracting prize info for %s: %s", lottery_type, e)
+                    continue
+
+            if all_prize_data and self.store is not None:
+                self.store.upsert_prizes(all_prize_data)
+                log.info("Prize data upserted into %s", self.store.path)
+            elif all_prize_data:
+                with CsvSink(f'lottery_prizes_{datetime.now().strftime("%Y%m%d")}.csv', self.prize_columns) as sink:
+                    sink.write(all_prize_data)
+                log.info("Prize data saved to %s", sink.path)
+
+        finally:
+            self.client.close()
+
+    def run(self):
+        self.scrape_prizes()
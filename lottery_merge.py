@@ -0,0 +1,253 @@
+import argparse
+import glob
+import logging
+import os
+import re
+import time
+
+from lottery_normalize import TEAM_ALIASES, canonical_team, file_kind, load_aliases
+from lottery_sink import CsvSink
+from lottery_store import read_csv_rows, store_column
+
+log = logging.getLogger(__name__)
+
+# Result fields compared when an issue's results are scraped again
+RESULT_FIELDS = ['score', 'result', 'half_time_score', 'full_time_score', 'half_time_result', 'full_time_result',
+                 'home_goals', 'away_goals']
+
+PRIZE_FIELDS = ['first_prize_count', 'first_prize_amount', 'second_prize_count', 'second_prize_amount',
+                'prize_pool_amount']
+
+JOINED_COLUMNS = [
+    'game', 'issue', 'match_number', 'home_team', 'away_team', 'league', 'start_time', 'deadline_time',
+    'bet_win', 'bet_draw', 'bet_lose', 'half_win', 'half_draw', 'half_lose', 'full_win', 'full_draw', 'full_lose',
+    'home_goals_0', 'home_goals_1', 'home_goals_2', 'home_goals_3plus',
+    'away_goals_0', 'away_goals_1', 'away_goals_2', 'away_goals_3plus',
+    'date'] + RESULT_FIELDS + PRIZE_FIELDS + ['prize_notice_url', 'sales_notice_url']
+
+
+def issue_number(value):
+    # "24169期", "24169" and 24169 -> 24169
+    match = re.search(r'\d+', str(value or ''))
+    return int(match.group(0)) if match else None
+
+
+def store_row(row):
+    return {store_column(name): value for name, value in row.items() if value not in ('', None)}
+
+
+class IssueMerger:
+    def __init__(self, aliases=TEAM_ALIASES):
+        # Hash indexes: (game, issue, match number) for selling and result
+        # rows, (game, issue) for prizes. Every add is O(rows added); the
+        # joined rows of the keys it touched are rebuilt on the next read.
+        self.aliases = aliases
+        self.selling = {}
+        self.results = {}
+        self.prizes = {}
+        self.views = {}
+        self.dirty = set()
+        self.conflicts = []
+        # Keys whose selling and result rows name different teams
+        self.mismatches = {}
+
+    def conflict(self, kind, key, before, after):
+        self.conflicts.append({'kind': kind, 'key': key, 'before': before, 'after': after})
+        log.debug("%s at %s: %s -> %s", kind, key, before, after)
+
+    def row_key(self, game, row, issue_field, match_field):
+        issue, match = issue_number(row.get(issue_field)), issue_number(row.get(match_field))
+        if issue is None or match is None:
+            return None
+        return game, issue, match
+
+    def add_selling(self, game, rows, scraped_date=None):
+        # Later snapshots of a period replace earlier ones; only a change of
+        # teams is a conflict, odds are expected to move
+        added = 0
+        for row in rows:
+            row = store_row(row)
+            if 'deadline' in row:
+                # Early selling files
+                row['deadline_time'] = row.pop('deadline')
+            key = self.row_key(game, row, 'period', 'match_num')
+            if key is None:
+                continue
+            row['scraped_date'] = row.get('scraped_date', scraped_date) or ''
+            before = self.selling.get(key)
+            if before is not None:
+                if before['scraped_date'] > row['scraped_date']:
+                    continue
+                if self.teams(before) != self.teams(row):
+                    self.conflict('selling_teams_changed', key, self.teams(before), self.teams(row))
+            self.selling[key] = row
+            self.dirty.add(key)
+            added += 1
+        return added
+
+    def add_results(self, game, rows):
+        added = 0
+        for row in rows:
+            row = store_row(row)
+            key = self.row_key(game, row, 'issue', 'match_number')
+            if key is None:
+                continue
+            before = self.results.get(key)
+            if before is not None:
+                old = {field: before.get(field) for field in RESULT_FIELDS if before.get(field) is not None}
+                new = {field: row.get(field) for field in RESULT_FIELDS if row.get(field) is not None}
+                if old != new:
+                    self.conflict('result_changed', key, old, new)
+            self.results[key] = row
+            self.dirty.add(key)
+            added += 1
+        return added
+
+    def add_prizes(self, rows):
+        added = 0
+        for row in rows:
+            row = store_row(row)
+            issue = issue_number(row.get('issue'))
+            if issue is None or not row.get('game'):
+                continue
+            key = row['game'], issue
+            before = self.prizes.get(key)
+            if before is not None:
+                old = {field: before.get(field) for field in PRIZE_FIELDS}
+                new = {field: row.get(field) for field in PRIZE_FIELDS}
+                if old != new:
+                    self.conflict('prize_changed', key, old, new)
+            self.prizes[key] = row
+            # The prize record goes on every row of the issue
+            self.views.setdefault(key, {})
+            self.dirty.update((key[0], key[1], match) for match in self.views[key])
+            added += 1
+        return added
+
+    def teams(self, row):
+        return canonical_team(row.get('home_team'), self.aliases), canonical_team(row.get('away_team'), self.aliases)
+
+    def refresh(self):
+        # Rebuilds the joined rows of the keys touched since the last read
+        for key in self.dirty:
+            game, issue, match = key
+            view = self.views.setdefault((game, issue), {})
+            selling, result = self.selling.get(key), self.results.get(key)
+            if selling is None and result is None:
+                view.pop(match, None)
+                continue
+
+            joined = {'game': game, 'issue': issue, 'match_number': match}
+            for source in (selling, result):
+                if source is not None:
+                    joined.update((name, value) for name, value in source.items()
+                                  if name not in ('game', 'issue', 'period', 'match_num'))
+            joined.update(self.prizes.get((game, issue), {}))
+            joined['issue'], joined['match_number'] = issue, match
+
+            joined['home_team'], joined['away_team'] = self.teams(result or selling)
+            if selling is not None and result is not None and self.teams(selling) != self.teams(result):
+                self.mismatches[key] = {'kind': 'team_mismatch', 'key': key, 'before': self.teams(selling),
+                                        'after': self.teams(result)}
+            else:
+                self.mismatches.pop(key, None)
+            view[match] = joined
+        self.dirty.clear()
+
+    def issue_view(self, game, issue):
+        # Joined rows of one issue, by match number
+        self.refresh()
+        view = self.views.get((game, issue_number(issue)), {})
+        return [view[match] for match in sorted(view)]
+
+    def joined_rows(self):
+        self.refresh()
+        rows = []
+        for key in sorted(self.views):
+            view = self.views[key]
+            rows.extend(view[match] for match in sorted(view))
+        return rows
+
+    def report(self):
+        # Unmatched rows: results without the selling row they were bet on,
+        # selling rows of drawn issues without a result, prizes of issues
+        # without results and drawn issues without a prize record
+        self.refresh()
+        drawn = {(game, issue) for game, issue, _ in self.results}
+        return {
+            'results_without_selling': sorted(key for key in self.results if key not in self.selling),
+            'selling_without_result': sorted(key for key in self.selling
+                                             if key[:2] in drawn and key not in self.results),
+            'prizes_without_results': sorted(key for key in self.prizes if key not in drawn),
+            'issues_without_prize': sorted(key for key in drawn if key not in self.prizes),
+            'pending_issues': len({key[:2] for key in self.selling} - drawn),
+            'conflicts': self.conflicts + [self.mismatches[key] for key in sorted(self.mismatches)]
+        }
+
+
+def load_files(merger, paths):
+    for path in paths:
+        kind, game_type = file_kind(path)
+        if kind == 'selling':
+            scraped_date = re.search(r'_(\d{8})\.csv$', path).group(1)
+            merger.add_selling(game_type, read_csv_rows(path), scraped_date)
+        elif kind == 'results':
+            merger.add_results(game_type, read_csv_rows(path))
+        elif kind == 'prizes':
+            merger.add_prizes(read_csv_rows(path))
+
+
+def load_store(merger, store):
+    for row in store.query("SELECT * FROM selling"):
+        merger.add_selling(row['game'], [row])
+    for row in store.query("SELECT * FROM results"):
+        merger.add_results(row['game'], [row])
+    merger.add_prizes(store.query("SELECT * FROM prizes"))
+
+
+def print_report(report):
+    print(f"Pending issues (not drawn yet): {report['pending_issues']}")
+    for name in ('results_without_selling', 'selling_without_result', 'prizes_without_results', 'issues_without_prize'):
+        keys = report[name]
+        print(f"{name.replace('_', ' ').capitalize()}: {len(keys)}")
+        for key in keys[:10]:
+            print(f"  {' '.join(str(part) for part in key)}")
+        if len(keys) > 10:
+            print(f"  ... {len(keys) - 10} more")
+    print(f"Conflicts: {len(report['conflicts'])}")
+    for conflict in report['conflicts'][:20]:
+        print(f"  {conflict['kind']} {' '.join(str(part) for part in conflict['key'])}: "
+              f"{conflict['before']} -> {conflict['after']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Join selling rows, results and prizes per issue and match")
+    parser.add_argument('files', nargs='*', help="Scraper CSV files (default all lottery_*.csv in the current directory)")
+    parser.add_argument('--store', help="SQLite store to join instead of CSV files")
+    parser.add_argument('--aliases', action='append', help="Extra team alias CSV file with alias,team rows (repeatable)")
+    parser.add_argument('--output', help="CSV file to write the joined rows to")
+    parser.add_argument('--log-level', default='INFO')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(message)s')
+    merger = IssueMerger(load_aliases(args.aliases))
+    started = time.monotonic()
+
+    if args.store:
+        from lottery_store import LotteryStore
+        store = LotteryStore(args.store)
+        try:
+            load_store(merger, store)
+        finally:
+            store.close()
+    else:
+        load_files(merger, args.files or sorted(glob.glob('lottery_*.csv')))
+
+    rows = merger.joined_rows()
+    log.info("Joined %d rows of %d issues in %.3fs", len(rows), len(merger.views), time.monotonic() - started)
+    print_report(merger.report())
+
+    if args.output:
+        with CsvSink(args.output, JOINED_COLUMNS) as sink:
+            sink.write(rows)
+        log.info("Saved joined rows to %s", os.path.abspath(args.output))
@@ -0,0 +1,114 @@
+from datetime import datetime
+import json
+import os
+import threading
+import time
+
+# Labels kept in the Prometheus textfile; periods and issues change every few
+# days and would grow the series without bound, so they only go to JSON lines
+PROMETHEUS_LABELS = ('job', 'step', 'game', 'status', 'selector', 'where', 'command', 'type', 'reason',
+                     'outcome', 'kind', 'group')
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def label_text(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels) + '}'
+
+
+class RunMetrics:
+    def __init__(self, job, prometheus_path=None, jsonl_path=None):
+        # job names the run in every metric ("selling", "results", "prizes", "runner")
+        self.job = job
+        self.prometheus_path = prometheus_path
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.steps = {}
+        self.counters = {}
+        self.jsonl = open(jsonl_path, 'a', encoding='utf-8') if jsonl_path else None
+
+    def emit(self, record):
+        if self.jsonl is None:
+            return
+        record = dict(record, job=self.job, ts=datetime.now().isoformat(timespec='milliseconds'))
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self.lock:
+            self.jsonl.write(line)
+
+    def prometheus_key(self, labels):
+        return tuple(sorted((name, str(value)) for name, value in labels.items()
+                            if name in PROMETHEUS_LABELS and value is not None))
+
+    def span(self, name, duration, labels):
+        key = (name, self.prometheus_key(labels))
+        with self.lock:
+            count, total, longest = self.steps.get(key, (0, 0.0, 0.0))
+            self.steps[key] = (count + 1, total + duration, max(longest, duration))
+        self.emit({'type': 'span', 'name': name, 'duration': round(duration, 6), 'labels': labels})
+
+    def count(self, name, value, labels):
+        key = (name, self.prometheus_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        self.emit({'type': 'count', 'name': name, 'value': value, 'labels': labels})
+
+    def record_commands(self, driver):
+        # Per-command WebDriver calls counted by lottery_browser.count_commands
+        for command, value in sorted(getattr(driver, 'command_counts', {}).items()):
+            self.count('webdriver_commands', value, {'command': command})
+
+    def prometheus_text(self):
+        job = [('job', self.job)]
+        lines = [
+            '# HELP lottery_step_seconds Time spent in each scrape step',
+            '# TYPE lottery_step_seconds summary'
+        ]
+        with self.lock:
+            steps = sorted(self.steps.items())
+            counters = sorted(self.counters.items())
+        for (name, labels), (count, total, _) in steps:
+            text = label_text(job + [('step', name)] + list(labels))
+            lines.append(f'lottery_step_seconds_count{text} {count}')
+            lines.append(f'lottery_step_seconds_sum{text} {total:.6f}')
+
+        lines += ['# HELP lottery_step_max_seconds Longest single run of each scrape step',
+                  '# TYPE lottery_step_max_seconds gauge']
+        for (name, labels), (_, _, longest) in steps:
+            lines.append(f'lottery_step_max_seconds{label_text(job + [("step", name)] + list(labels))} {longest:.6f}')
+
+        declared = set()
+        for (name, labels), value in counters:
+            if name not in declared:
+                lines.append(f'# TYPE lottery_{name}_total counter')
+                declared.add(name)
+            lines.append(f'lottery_{name}_total{label_text(job + list(labels))} {value}')
+
+        lines += [
+            '# TYPE lottery_run_duration_seconds gauge',
+            f'lottery_run_duration_seconds{label_text(job)} {time.time() - self.started:.3f}',
+            '# TYPE lottery_run_finished_timestamp_seconds gauge',
+            f'lottery_run_finished_timestamp_seconds{label_text(job)} {time.time():.0f}'
+        ]
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        # node_exporter's textfile collector may read at any time; rename a
+        # complete file into place
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+    def close(self, drivers=()):
+        for driver in drivers:
+            self.record_commands(driver)
+        if self.prometheus_path:
+            self.write_prometheus(self.prometheus_path)
+        self.emit({'type': 'run', 'duration': round(time.time() - self.started, 3)})
+        if self.jsonl is not None:
+            self.jsonl.close()
+            self.jsonl = None
@@ -0,0 +1,277 @@
+import argparse
+import csv
+import glob
+import logging
+import os
+import re
+import time
+
+from lottery_store import store_column
+
+log = logging.getLogger(__name__)
+
+DEFAULT_OUTPUT_DIR = 'normalized'
+
+# Full or alternative team names -> the short name sporttery.cn shows on the
+# jsq and kjgg pages, so selling and result rows join. Extended with
+# --aliases files ("alias,team" rows).
+TEAM_ALIASES = {
+    '国际米兰': '国米',
+    '尤文图斯': '尤文',
+    '那不勒斯': '那不勒',
+    '佛罗伦萨': '佛罗伦',
+    '亚特兰大': '亚特兰',
+    '博洛尼亚': '博洛尼',
+    '卡利亚里': '卡利亚',
+    '乌迪内斯': '乌迪内',
+    '皇家马德里': '皇马',
+    '巴塞罗那': '巴萨',
+    '马德里竞技': '马竞技',
+    '马竞': '马竞技',
+    '皇家社会': '社会',
+    '皇家贝蒂斯': '贝蒂斯',
+    '巴伦西亚': '巴伦西',
+    '塞维利亚': '塞维利',
+    '奥萨苏纳': '奥萨苏',
+    '毕尔巴鄂': '毕尔巴',
+    '拜仁慕尼黑': '拜仁',
+    '多特蒙德': '多特',
+    '勒沃库森': '勒沃',
+    '斯图加特': '斯图加',
+    '法兰克福': '法兰克',
+    '门兴格拉德巴赫': '门兴',
+    '沃尔夫斯堡': '沃尔夫',
+    '霍芬海姆': '霍芬海',
+    '奥格斯堡': '奥格斯',
+    '柏林联合': '柏林联',
+    '巴黎圣日耳曼': '日尔曼',
+    '巴黎圣日尔曼': '日尔曼',
+    '圣日尔曼': '日尔曼',
+    '曼彻斯特联': '曼联',
+    '曼彻斯特城': '曼城',
+    '纽卡斯尔': '纽卡斯',
+    '纽卡斯尔联': '纽卡斯',
+    '托特纳姆热刺': '热刺',
+    '托特纳姆': '热刺',
+    '西汉姆联': '西汉姆',
+    '阿斯顿维拉': '维拉',
+    '布莱顿': '布赖顿',
+    '伯恩茅斯': '伯恩茅',
+    '诺丁汉森林': '诺丁汉',
+    '埃因霍温': '埃因霍',
+    '费耶诺德': '费耶诺'
+}
+
+# Columns after store_column(): dates, categories and numbers. A column has
+# the same type in every kind of file it appears in.
+DATETIME_COLUMNS = ['deadline_time', 'sale_time', 'start_time', 'date', 'scraped_date']
+CATEGORY_COLUMNS = ['game', 'league', 'sale_status', 'result', 'half_time_result', 'full_time_result',
+                    'home_goals', 'away_goals', 'home_goals_0', 'home_goals_1', 'home_goals_2', 'home_goals_3plus',
+                    'away_goals_0', 'away_goals_1', 'away_goals_2', 'away_goals_3plus', 'prize_level', 'region']
+ODDS_COLUMNS = ['bet_win', 'bet_draw', 'bet_lose', 'half_win', 'half_draw', 'half_lose',
+                'full_win', 'full_draw', 'full_lose']
+COUNT_COLUMNS = ['first_prize_count', 'second_prize_count', 'winning_count']
+AMOUNT_COLUMNS = ['first_prize_amount', 'second_prize_amount', 'prize_pool', 'prize_pool_amount',
+                  'prize_amount', 'sales_amount']
+
+# "2:1" score columns -> home and away goal columns
+SCORE_COLUMNS = {
+    'score': ('home_score', 'away_score'),
+    'half_time_score': ('half_home_score', 'half_away_score'),
+    'full_time_score': ('full_home_score', 'full_away_score')
+}
+
+# lottery_*.csv file name -> (kind, game type or None)
+FILE_PATTERNS = [
+    (re.compile(r'lottery_selling_(.+)_\d{8}\.csv$'), 'selling'),
+    (re.compile(r'lottery_results_(.+)_\d+\.csv$'), 'results'),
+    (re.compile(r'lottery_prizes_\d{8}\.csv$'), 'prizes'),
+    (re.compile(r'lottery_notice_prizes_\d{8}\.csv$'), 'notice_prizes'),
+    (re.compile(r'lottery_notice_sales_\d{8}\.csv$'), 'notice_sales')
+]
+
+
+def file_kind(path):
+    name = os.path.basename(path)
+    for pattern, kind in FILE_PATTERNS:
+        match = pattern.match(name)
+        if match:
+            return kind, match.group(1) if match.groups() else None
+    return None, None
+
+
+def load_aliases(paths):
+    aliases = dict(TEAM_ALIASES)
+    for path in paths or []:
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            for row in csv.reader(f):
+                if len(row) >= 2 and row[0] and row[0] != 'alias':
+                    aliases[''.join(row[0].split())] = ''.join(row[1].split())
+    return aliases
+
+
+def canonical_team(name, aliases=TEAM_ALIASES):
+    # "卢 顿" -> "卢顿", then through the alias table
+    name = ''.join(str(name or '').split())
+    return aliases.get(name, name) or None
+
+
+def map_unique(series, func):
+    # Applies func once per distinct value instead of once per row; scraped
+    # columns repeat the same few hundred strings over and over
+    import pandas as pd
+    codes, uniques = pd.factorize(series)
+    mapped = pd.Series([func(value) for value in uniques], dtype=object)
+    return pd.Series(mapped.to_numpy()[codes] if len(uniques) else [None] * len(series),
+                     index=series.index, dtype=object).where(codes >= 0)
+
+
+def team_names(frame, aliases=TEAM_ALIASES):
+    # home_team/away_team without the spaces the selling page puts in short
+    # names ("卢 顿"), through the alias table, as categoricals sharing one
+    # set of categories so home and away columns compare and join directly
+    import pandas as pd
+    columns = [column for column in ('home_team', 'away_team') if column in frame]
+    if not columns:
+        return frame
+
+    cleaned = {column: map_unique(frame[column], lambda name: canonical_team(name, aliases)) for column in columns}
+    categories = sorted(set().union(*(set(values.dropna()) for values in cleaned.values())))
+    for column, values in cleaned.items():
+        frame[column] = pd.Categorical(values, categories=categories)
+    return frame
+
+
+def numbers(series, dtype):
+    # "5,000,000" -> 5000000; blanks and text become missing values
+    import pandas as pd
+    text = series.astype('string').str.replace(r'[,\s元]', '', regex=True)
+    return pd.to_numeric(text, errors='coerce').astype(dtype)
+
+
+def normalize_frame(frame, game_type=None, aliases=TEAM_ALIASES):
+    # Typed copy of one kind's rows (CSV or store rows). Columns are renamed
+    # to the store's names; selling periods become 'issue' and match_num
+    # 'match_number' like the results.
+    import pandas as pd
+    frame = frame.rename(columns={column: store_column(column) for column in frame.columns})
+    frame = frame.rename(columns={'deadline': 'deadline_time', 'period': 'issue', 'match_num': 'match_number'})
+    if game_type is not None and 'game' not in frame:
+        frame.insert(0, 'game', game_type)
+    frame = frame.replace({'': None})
+
+    if 'issue' in frame:
+        # "24169期" and 24169 alike
+        frame['issue'] = numbers(frame['issue'].astype('string').str.extract(r'(\d+)', expand=False), 'Int32')
+    if 'match_number' in frame:
+        frame['match_number'] = numbers(frame['match_number'], 'Int8')
+
+    for column in DATETIME_COLUMNS:
+        if column in frame:
+            frame[column] = pd.to_datetime(frame[column], errors='coerce')
+
+    for column, (home, away) in SCORE_COLUMNS.items():
+        if column in frame:
+            goals = frame[column].astype('string').str.extract(r'(\d+)\s*[:：]\s*(\d+)')
+            frame[home] = numbers(goals[0], 'Int8')
+            frame[away] = numbers(goals[1], 'Int8')
+
+    for column in ODDS_COLUMNS:
+        if column in frame:
+            frame[column] = numbers(frame[column], 'float32')
+    for column in COUNT_COLUMNS:
+        if column in frame:
+            frame[column] = numbers(frame[column], 'Int64')
+    for column in AMOUNT_COLUMNS:
+        if column in frame:
+            frame[column] = numbers(frame[column], 'float64')
+
+    for column in CATEGORY_COLUMNS:
+        if column in frame:
+            # The full-width plus of 4场进球 results is the same outcome as 3+
+            values = frame[column].astype('string').str.strip().str.replace('＋', '+', regex=False)
+            frame[column] = values.astype('category')
+
+    return team_names(frame, aliases)
+
+
+def read_frames(paths):
+    # kind -> one DataFrame of every file of that kind, still as strings
+    import pandas as pd
+    frames = {}
+    for path in paths:
+        kind, game_type = file_kind(path)
+        if kind is None:
+            log.warning("Skipping %s: not a scraper output file", path)
+            continue
+        frame = pd.read_csv(path, dtype=str, keep_default_na=False, encoding='utf-8-sig')
+        # Early selling files have 'deadline' for deadline_time
+        frame = frame.rename(columns={'deadline': 'deadline_time'})
+        if game_type is not None:
+            frame.insert(0, 'game', game_type)
+        frames.setdefault(kind, []).append(frame)
+    return {kind: pd.concat(parts, ignore_index=True) for kind, parts in frames.items()}
+
+
+def normalize_files(paths, aliases=TEAM_ALIASES):
+    # kind -> normalized DataFrame. All files of a kind are concatenated and
+    # normalized in one pass, so the categoricals span every file.
+    return {kind: normalize_frame(frame, aliases=aliases) for kind, frame in read_frames(paths).items()}
+
+
+def store_frame(store, kind, aliases=TEAM_ALIASES):
+    # Normalized rows of one store table ('selling', 'results' or 'prizes')
+    import pandas as pd
+    frame = pd.DataFrame(store.query(f"SELECT * FROM {kind}"))
+    return normalize_frame(frame, aliases=aliases)
+
+
+def write_frames(frames, output_dir=DEFAULT_OUTPUT_DIR, file_format='pickle'):
+    # Pickle keeps every dtype (categories included) without extra
+    # dependencies; parquet needs pyarrow
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+    for kind, frame in frames.items():
+        if file_format == 'parquet':
+            path = os.path.join(output_dir, f'{kind}.parquet')
+            frame.to_parquet(path, index=False)
+        elif file_format == 'csv':
+            path = os.path.join(output_dir, f'{kind}.csv')
+            frame.to_csv(path, index=False, encoding='utf-8-sig')
+        else:
+            path = os.path.join(output_dir, f'{kind}.pkl')
+            frame.to_pickle(path)
+        written.append(path)
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Normalize scraped CSV files into typed, compact tables")
+    parser.add_argument('files', nargs='*',
+                        help="lottery_selling/results/prizes/notice CSV files (default all in the current directory)")
+    parser.add_argument('--store', help="Normalize the tables of this SQLite store instead of CSV files")
+    parser.add_argument('--aliases', action='append', help="Extra team alias CSV file with alias,team rows (repeatable)")
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument('--format', choices=['pickle', 'parquet', 'csv'], default='pickle', dest='file_format')
+    parser.add_argument('--log-level', default='INFO')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(message)s')
+    aliases = load_aliases(args.aliases)
+    started = time.monotonic()
+
+    if args.store:
+        from lottery_store import LotteryStore
+        store = LotteryStore(args.store)
+        try:
+            frames = {kind: store_frame(store, kind, aliases) for kind in ('selling', 'results', 'prizes')}
+        finally:
+            store.close()
+    else:
+        paths = args.files or sorted(path for path in glob.glob('lottery_*.csv') if file_kind(path)[0])
+        frames = normalize_files(paths, aliases)
+
+    for path, (kind, frame) in zip(write_frames(frames, args.output_dir, args.file_format), frames.items()):
+        log.info("%s: %d rows, %.1f KB in memory -> %s", kind, len(frame),
+                 frame.memory_usage(deep=True).sum() / 1024, path)
+    log.info("Normalized in %.2fs", time.monotonic() - started)
@@ -0,0 +1,298 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from urllib.parse import urlparse
+import argparse
+import glob
+import json
+import logging
+import os
+import re
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from lottery_browser import USER_AGENT
+from lottery_pdf import pdf_text
+from lottery_sink import CsvSink, prize_pool
+from lottery_store import read_csv_rows
+from lottery_waits import StepTimer
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = 'notices'
+
+# First path segment of pdf.sporttery.cn/<code>/<issue>/<issue>[XL].pdf
+NOTICE_GAME_CODES = {
+    '100': '胜负游戏',
+    '29200': '任选9场',
+    '31300': '6场半全场',
+    '31400': '4场进球'
+}
+
+NOTICE_URL_PATTERN = re.compile(r'/(\d+)/(\d+)/\d+(XL)?\.pdf$', re.I)
+
+NOTICE_PRIZE_COLUMNS = [
+    'Issue_Number', 'Game_Type', 'Date', 'Prize_Level', 'Winning_Count', 'Prize_Amount',
+    'Sales_Amount', 'Prize_Pool_Amount', 'Notice_URL'
+]
+
+NOTICE_SALES_COLUMNS = ['Issue_Number', 'Game_Type', 'Region', 'Sales_Amount', 'Notice_URL']
+
+# Prize notices: one line per tier, "一等奖 2 5,000,000"; the summary phrases
+# are searched anywhere in the text
+PRIZE_LEVEL_PATTERN = re.compile(r'^\s*([一二三四五六七八九十]+等奖)\s+([\d,]+)\s*注?\s+([\d,]+(?:\.\d+)?)', re.M)
+DATE_PATTERN = re.compile(r'开奖(?:日期|时间)\s*[：:]?\s*(\d{4})\s*[-年/.]\s*(\d{1,2})\s*[-月/.]\s*(\d{1,2})')
+SALES_TOTAL_PATTERN = re.compile(r'(?:本期)?销售(?:总)?额\s*[：:]?\s*([\d,]+(?:\.\d+)?)\s*元')
+POOL_PATTERN = re.compile(r'奖池(?:滚存|金额|余额)?\s*[：:]?\s*([\d,]+(?:\.\d+)?)\s*元')
+
+# Sales notices: one line per region, "北京 1,203,456", and a total line that
+# is not a region (the total is the prize notice's Sales_Amount)
+SALES_REGION_PATTERN = re.compile(r'^\s*([一-鿿]{2,8})\s+([\d,]+(?:\.\d+)?)\s*(?:元)?\s*$', re.M)
+SALES_TOTAL_LABELS = ('合计', '总计')
+
+
+def notice_info(url):
+    # (game type, issue, 'prize' or 'sales'), or None for an unknown URL
+    match = NOTICE_URL_PATTERN.search(urlparse(url).path)
+    if not match:
+        return None
+    game_type = NOTICE_GAME_CODES.get(match.group(1), match.group(1))
+    return game_type, match.group(2), 'sales' if match.group(3) else 'prize'
+
+
+def parse_prize_notice(text):
+    # Tier rows of a prize notice; the date, sales and pool go on every row
+    date = DATE_PATTERN.search(text)
+    sales = SALES_TOTAL_PATTERN.search(text)
+    pool = POOL_PATTERN.search(text)
+    # Counts and amounts are written as plain numbers, "5,000,000" -> "5000000"
+    common = {
+        'Date': '-'.join((date.group(1), date.group(2).zfill(2), date.group(3).zfill(2))) if date else None,
+        'Sales_Amount': prize_pool(sales.group(1)) if sales else None,
+        'Prize_Pool_Amount': prize_pool(pool.group(1)) if pool else None
+    }
+    return [dict(common, Prize_Level=level, Winning_Count=prize_pool(count), Prize_Amount=prize_pool(amount))
+            for level, count, amount in PRIZE_LEVEL_PATTERN.findall(text)]
+
+
+def parse_sales_notice(text):
+    return [{'Region': region, 'Sales_Amount': prize_pool(amount)}
+            for region, amount in SALES_REGION_PATTERN.findall(text) if region not in SALES_TOTAL_LABELS]
+
+
+class NoticeDownloader:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, workers=8, timeout=20, revalidate_after=7 * 24 * 3600,
+                 base_url=None, timer=None):
+        # Notices are kept in cache_dir under their URL path, each with a
+        # .json sidecar holding the ETag and Last-Modified they were served
+        # with. A cached notice younger than revalidate_after is used as is;
+        # an older one is revalidated with a conditional request. base_url
+        # replaces the scheme and host of every URL, e.g. to fetch from
+        # lottery_fixture_server.py.
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.timeout = timeout
+        self.revalidate_after = revalidate_after
+        self.base_url = base_url.rstrip('/') if base_url else None
+        self.timer = timer or StepTimer()
+        self.counts = {'cached': 0, 'not_modified': 0, 'downloaded': 0, 'missing': 0, 'failed': 0}
+
+        # One keep-alive connection per worker
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, max_retries=2)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'User-Agent': USER_AGENT, 'Referer': 'https://www.sporttery.cn/'})
+
+    def request_url(self, url):
+        if not self.base_url:
+            return url
+        parsed = urlparse(url)
+        return self.base_url + parsed.path + (f"?{parsed.query}" if parsed.query else '')
+
+    def cache_path(self, url):
+        return os.path.join(self.cache_dir, *urlparse(url).path.strip('/').split('/'))
+
+    def read_meta(self, path):
+        try:
+            with open(f"{path}.json", encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def write_file(self, path, content):
+        # Written to .tmp and renamed, so a cached notice is never truncated
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", 'wb') as f:
+            f.write(content)
+        os.replace(f"{path}.tmp", path)
+
+    def write_meta(self, path, meta):
+        self.write_file(f"{path}.json", json.dumps(meta).encode('utf-8'))
+
+    def fetch(self, url):
+        # (outcome, path): path is the cached PDF, None when there is none
+        path = self.cache_path(url)
+        meta = self.read_meta(path) if os.path.exists(path) else {}
+        if meta and time.time() - meta.get('fetched', 0) < self.revalidate_after:
+            return 'cached', path
+
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+        game_type = (notice_info(url) or ('unknown',))[0]
+        with self.timer.step('notice_download', game=game_type):
+            response = self.session.get(self.request_url(url), headers=headers, timeout=self.timeout)
+
+        if response.status_code == 304:
+            meta['fetched'] = time.time()
+            self.write_meta(path, meta)
+            return 'not_modified', path
+        if response.status_code == 404:
+            # Notices are published a while after the draw
+            return 'missing', path if os.path.exists(path) else None
+        response.raise_for_status()
+
+        self.write_file(path, response.content)
+        self.write_meta(path, {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fetched': time.time()
+        })
+        self.timer.count('notice_bytes', len(response.content), game=game_type)
+        return 'downloaded', path
+
+    def fetch_all(self, urls):
+        # url -> cached path (None when the notice could not be had), fetched
+        # by a pool of self.workers threads
+        paths = {}
+        urls = list(dict.fromkeys(url for url in urls if url))
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as executor:
+            futures = {executor.submit(self.fetch, url): url for url in urls}
+            for future in as_completed(futures):
+                url = futures[future]
+                try:
+                    outcome, paths[url] = future.result()
+                except Exception as e:
+                    # A stale cached copy is better than none
+                    log.warning("Error fetching %s: %s", url, e)
+                    path = self.cache_path(url)
+                    outcome, paths[url] = 'failed', path if os.path.exists(path) else None
+                self.counts[outcome] += 1
+                self.timer.count('notices', outcome=outcome)
+                log.debug("%s: %s", url, outcome)
+        log.info("Notices: %s", ', '.join(f"{count} {outcome}" for outcome, count in self.counts.items()))
+        return paths
+
+    def close(self):
+        self.session.close()
+
+
+def extract_rows(url, path):
+    # (kind, rows) of one cached notice, each row tagged with its issue and game
+    info = notice_info(url)
+    if info is None:
+        return None, []
+    game_type, issue, kind = info
+    with open(path, 'rb') as f:
+        text = pdf_text(f.read())
+    rows = parse_sales_notice(text) if kind == 'sales' else parse_prize_notice(text)
+    if not rows:
+        log.warning("No %s rows found in %s", kind, path)
+    return kind, [dict(row, Issue_Number=issue, Game_Type=game_type, Notice_URL=url) for row in rows]
+
+
+def prize_file_urls(paths):
+    # Notice URLs of the lottery_prizes_*.csv files the prize scraper wrote
+    urls = []
+    for path in paths:
+        for row in read_csv_rows(path):
+            urls += [row.get('Prize_Notice_URL'), row.get('Sales_Notice_URL')]
+    return [url for url in urls if url]
+
+
+def store_urls(store_path):
+    from lottery_store import LotteryStore
+    store = LotteryStore(store_path)
+    try:
+        rows = store.query("SELECT prize_notice_url, sales_notice_url FROM prizes ORDER BY issue")
+    finally:
+        store.close()
+    return [url for row in rows for url in (row['prize_notice_url'], row['sales_notice_url']) if url]
+
+
+def write_notice_rows(urls, paths, output_dir='.', timer=None):
+    # Parses the cached notices into one prize tier file and one regional
+    # sales file; returns the files written
+    timer = timer or StepTimer()
+    date_str = datetime.now().strftime("%Y%m%d")
+    sinks = {
+        'prize': CsvSink(os.path.join(output_dir, f"lottery_notice_prizes_{date_str}.csv"), NOTICE_PRIZE_COLUMNS),
+        'sales': CsvSink(os.path.join(output_dir, f"lottery_notice_sales_{date_str}.csv"), NOTICE_SALES_COLUMNS)
+    }
+    written = []
+    try:
+        for url in urls:
+            if not paths.get(url):
+                continue
+            try:
+                with timer.step('notice_parse'):
+                    kind, rows = extract_rows(url, paths[url])
+            except Exception as e:
+                log.warning("Error parsing %s: %s", paths[url], e)
+                timer.count('exceptions', where='notice_parse')
+                continue
+            if kind:
+                sinks[kind].write(rows)
+                timer.count('rows', len(rows), kind=kind)
+        for kind, sink in sinks.items():
+            if sink.rows:
+                written.append(sink.commit())
+                log.info("Saved %d %s notice rows to %s", sink.rows, kind, sink.path)
+            else:
+                sink.discard()
+    except BaseException:
+        for sink in sinks.values():
+            sink.abort()
+        raise
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download the prize and sales notice PDFs and extract their rows")
+    parser.add_argument('prize_files', nargs='*',
+                        help="lottery_prizes_*.csv files to take notice URLs from (default all in the current directory)")
+    parser.add_argument('--url', action='append', default=[], help="Notice URL to fetch (repeatable)")
+    parser.add_argument('--store', help="SQLite store to take notice URLs from, instead of prize files")
+    parser.add_argument('--workers', type=int, default=8, help="Concurrent downloads")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--revalidate-after', type=float, default=7 * 24 * 3600,
+                        help="Seconds a cached notice is used before it is revalidated")
+    parser.add_argument('--base-url', help="Host to fetch from instead of pdf.sporttery.cn, e.g. lottery_fixture_server.py")
+    parser.add_argument('--output-dir', default='.')
+    parser.add_argument('--log-level', default='INFO')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(message)s')
+
+    urls = list(args.url)
+    if args.store:
+        urls += store_urls(args.store)
+    elif args.prize_files or not urls:
+        urls += prize_file_urls(args.prize_files or sorted(glob.glob('lottery_prizes_*.csv')))
+    urls = list(dict.fromkeys(urls))
+
+    timer = StepTimer()
+    downloader = NoticeDownloader(args.cache_dir, workers=args.workers, revalidate_after=args.revalidate_after,
+                                  base_url=args.base_url, timer=timer)
+    try:
+        paths = downloader.fetch_all(urls)
+        write_notice_rows(urls, paths, args.output_dir, timer)
+    finally:
+        downloader.close()
+        timer.report()
@@ -0,0 +1,192 @@
+import argparse
+import logging
+import queue
+import threading
+import time
+from lottery_browser import create_driver, network_report
+from lottery_cache import FingerprintCache
+from lottery_selection import ScrapeSelection, add_selection_arguments, selection_from_args
+from lottery_store import LotteryStore
+from lottery_waits import StepTimer
+from lottery_selling import LotteryScraper, MATCH_GAME_TYPES
+from lottery_snapshots import SnapshotArchive
+
+log = logging.getLogger(__name__)
+
+
+class ParallelLotteryScraper:
+    def __init__(self, workers=4, time_budget=None, cache_path=None, store_path=None, archive_dir=None,
+                 metrics=None, tab_budget=None, breaker_misses=3, selection=None):
+        # Each worker drives its own Chrome session; a single session only
+        # runs one command at a time, so tabs of one browser cannot overlap
+        self.workers = max(1, workers)
+        # tab_budget applies to each period; selectors missed by one worker
+        # fail fast for all of them
+        self.timer = StepTimer(time_budget, metrics, tab_budget, breaker_misses)
+        self.cache = FingerprintCache(cache_path) if cache_path else None
+        self.store = LotteryStore(store_path) if store_path else None
+        self.archive = SnapshotArchive(archive_dir) if archive_dir else None
+        # Only the selected periods become work items
+        self.selection = selection or ScrapeSelection()
+        self.lock = threading.Lock()
+        self.scrapers = []
+        self.item_timings = []
+        self.active_items = 0
+        self.peak_concurrency = 0
+
+    def create_scraper(self):
+        scraper = LotteryScraper(driver=create_driver(self.timer, page='jsq'), timer=self.timer, cache=self.cache,
+                                 store=self.store, archive=self.archive, selection=self.selection)
+        with self.lock:
+            self.scrapers.append(scraper)
+        if not scraper.load_page():
+            raise RuntimeError("Selling page did not load")
+        return scraper
+
+    def scrape_item(self, scraper, state, item):
+        game_type, status_text, period_info = item
+
+        with self.lock:
+            self.active_items += 1
+            self.peak_concurrency = max(self.peak_concurrency, self.active_items)
+        started = time.monotonic()
+
+        try:
+            # Re-select game type and sale status only when they differ from
+            # what this worker's page is already showing
+            if state.get('game_type') != game_type:
+                state.clear()
+                if not scraper.select_game_type(game_type):
+                    return []
+                state['game_type'] = game_type
+            if state.get('status_text') != status_text:
+                if not scraper.select_sale_status(status_text):
+                    return []
+                state['status_text'] = status_text
+
+            if not scraper.select_period(period_info):
+                return []
+            return scraper.scrape_period(game_type, status_text, period_info)
+
+        finally:
+            duration = time.monotonic() - started
+            with self.lock:
+                self.active_items -= 1
+                self.item_timings.append((item, duration))
+
+    def worker(self, scraper, work_queue, results):
+        state = {}
+        try:
+            if scraper is None:
+                scraper = self.create_scraper()
+        except Exception as e:
+            log.error("Error starting worker: %s", e)
+            return
+
+        while True:
+            try:
+                index, item = work_queue.get_nowait()
+            except queue.Empty:
+                return
+            if self.timer.expired():
+                self.timer.skip(' '.join(item), self.timer.exhausted(), game=item[0])
+                continue
+            try:
+                with self.timer.scope(' '.join(item)):
+                    results[index] = self.scrape_item(scraper, state, item)
+            except Exception as e:
+                log.error("Error processing %s: %s", ' '.join(item), e)
+                self.timer.skip(' '.join(item), 'error', game=item[0])
+                # The page may be in an unknown state, select everything again
+                state.clear()
+
+    def scrape_match_data(self):
+        log.info("Starting parallel scraper with %d workers (%s)...", self.workers, self.selection.describe())
+        try:
+            # The first worker's session lists the work items before it
+            # starts processing them
+            first_scraper = self.create_scraper()
+            game_types = self.selection.select_games(MATCH_GAME_TYPES)
+            work_items = first_scraper.list_work_items(game_types)
+            log.info("Found %d periods to scrape", len(work_items))
+
+            work_queue = queue.Queue()
+            for index, item in enumerate(work_items):
+                work_queue.put((index, item))
+
+            results = {}
+            threads = [threading.Thread(target=self.worker, args=(first_scraper, work_queue, results))]
+            for _ in range(min(self.workers, len(work_items)) - 1):
+                threads.append(threading.Thread(target=self.worker, args=(None, work_queue, results)))
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            # Merge in work item order so the output does not depend on
+            # which worker finished first
+            matches_by_type = {game_type: [] for game_type in game_types}
+            for index, (game_type, _, _) in enumerate(work_items):
+                matches_by_type[game_type].extend(results.get(index, []))
+
+            # Any worker may have seen a changed period of a game type
+            for scraper in self.scrapers:
+                first_scraper.changed_types.update(scraper.changed_types)
+            first_scraper.save_matches(matches_by_type)
+            first_scraper.save_cache()
+
+        except Exception as e:
+            log.error("Error occurred: %s", e)
+            self.timer.count('exceptions', where='scrape_match_data')
+
+        finally:
+            for scraper in self.scrapers:
+                network_report(scraper.driver, self.timer)
+            self.report()
+            log.info("Closing browsers...")
+            for scraper in self.scrapers:
+                try:
+                    scraper.driver.quit()
+                except Exception as e:
+                    log.warning("Error closing browser: %s", e)
+
+    def report(self):
+        log.info("Peak concurrency: %d of %d workers", self.peak_concurrency, self.workers)
+        for item, duration in sorted(self.item_timings):
+            log.info("  %s: %.2fs", ' '.join(item), duration)
+        self.timer.report()
+
+    def run(self):
+        self.scrape_match_data()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape selling periods with a pool of browser workers")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--time-budget', type=float, help="Total seconds the run may take")
+    parser.add_argument('--tab-budget', type=float, help="Seconds each period may take")
+    parser.add_argument('--breaker-misses', type=int, default=3,
+                        help="Timeouts in a row after which a selector is no longer waited for")
+    parser.add_argument('--fingerprint-cache', help="Cache file used to skip periods whose table is unchanged")
+    parser.add_argument('--store', help="SQLite store to upsert into instead of writing CSV files")
+    parser.add_argument('--snapshots', help="Archive directory for the markup of every visited period")
+    add_selection_arguments(parser)
+    parser.add_argument('--log-level', default='INFO', help="DEBUG also logs every parsed row")
+    parser.add_argument('--metrics-prom', help="Prometheus textfile to write step timings and counts to")
+    parser.add_argument('--metrics-jsonl', help="File to append every step span and count to as JSON lines")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(message)s')
+    metrics = None
+    if args.metrics_prom or args.metrics_jsonl:
+        from lottery_metrics import RunMetrics
+        metrics = RunMetrics('selling', args.metrics_prom, args.metrics_jsonl)
+
+    scraper = ParallelLotteryScraper(workers=args.workers, time_budget=args.time_budget,
+                                     cache_path=args.fingerprint_cache, store_path=args.store,
+                                     archive_dir=args.snapshots, metrics=metrics, tab_budget=args.tab_budget,
+                                     breaker_misses=args.breaker_misses, selection=selection_from_args(args))
+    scraper.run()
+
+    if metrics is not None:
+        metrics.close([worker.driver for worker in scraper.scrapers])
@@ -0,0 +1,276 @@
+import re
+import zlib
+
+# Minimal text extraction for the sporttery.cn notice PDFs: objects (plain and
+# in object streams), Flate content streams, Tj/TJ/'/" text operators and
+# ToUnicode CMaps for the CID fonts the Chinese text is set in. Encrypted
+# files and fonts without a ToUnicode map give no usable text.
+
+OBJECT_PATTERN = re.compile(rb'(\d+)\s+(\d+)\s+obj\b(.*?)\bendobj', re.S)
+STREAM_PATTERN = re.compile(rb'stream\r?\n(.*)', re.S)
+REFERENCE_PATTERN = re.compile(rb'(\d+)\s+\d+\s+R')
+FONT_ENTRY_PATTERN = re.compile(rb'/([^\s/<>\[\]()]+)\s+(\d+)\s+\d+\s+R')
+
+# Content stream tokens: strings, arrays, names, numbers and operators
+TOKEN_PATTERN = re.compile(rb'\((?:\\.|[^\\)])*\)|<[0-9A-Fa-f\s]*>|\[|\]|/[^\s/<>\[\]()]+|[-+]?\d*\.?\d+|[A-Za-z\'"*]+', re.S)
+
+LITERAL_ESCAPES = {b'n': b'\n', b'r': b'\r', b't': b'\t', b'b': b'\b', b'f': b'\f',
+                   b'(': b'(', b')': b')', b'\\': b'\\'}
+
+# Kerning (thousandths of an em) in a TJ array wide enough to read as a space
+TJ_SPACE = 200
+
+
+def decode_stream(header, data):
+    length = re.search(rb'/Length\s+(\d+)(?!\s+\d+\s+R)', header)
+    if length:
+        data = data[:int(length.group(1))]
+    else:
+        data = data[:data.rfind(b'endstream')].rstrip(b'\r\n')
+    if b'/FlateDecode' in header:
+        try:
+            return zlib.decompress(data)
+        except zlib.error:
+            return zlib.decompressobj().decompress(data)
+    return data
+
+
+def parse_objects(pdf):
+    # object number -> (dictionary bytes, decoded stream or None)
+    objects = {}
+    for match in OBJECT_PATTERN.finditer(pdf):
+        body = match.group(3)
+        stream = STREAM_PATTERN.search(body)
+        if stream:
+            header = body[:stream.start()]
+            objects[int(match.group(1))] = (header, decode_stream(header, stream.group(1)))
+        else:
+            objects[int(match.group(1))] = (body, None)
+
+    # PDF 1.5 object streams hold further objects: "num offset" pairs, then bodies
+    for header, data in list(objects.values()):
+        if data is None or b'/ObjStm' not in header:
+            continue
+        first = re.search(rb'/First\s+(\d+)', header)
+        if not first:
+            continue
+        first = int(first.group(1))
+        numbers = [int(n) for n in data[:first].split()]
+        pairs = list(zip(numbers[0::2], numbers[1::2]))
+        for index, (number, offset) in enumerate(pairs):
+            end = first + pairs[index + 1][1] if index + 1 < len(pairs) else len(data)
+            objects.setdefault(number, (data[first + offset:end], None))
+    return objects
+
+
+def resolve(objects, value):
+    # Dictionary bytes behind "N 0 R", or value itself
+    match = re.fullmatch(rb'\s*(\d+)\s+\d+\s+R\s*', value)
+    if match and int(match.group(1)) in objects:
+        return objects[int(match.group(1))][0]
+    return value
+
+
+def dictionary_value(body, key):
+    # Raw value of /key in a dictionary: a reference, a << >> dict or an [ ] array
+    match = re.search(rb'/' + key + rb'\s*(\d+\s+\d+\s+R|<<|\[)', body)
+    if not match:
+        return None
+    start = match.start(1)
+    if match.group(1) == b'<<':
+        depth, position = 0, start
+        while position < len(body):
+            if body.startswith(b'<<', position):
+                depth += 1
+                position += 2
+            elif body.startswith(b'>>', position):
+                depth -= 1
+                position += 2
+                if depth == 0:
+                    return body[start:position]
+            else:
+                position += 1
+        return body[start:]
+    if match.group(1) == b'[':
+        end = body.find(b']', start)
+        return body[start:end + 1]
+    return match.group(1)
+
+
+def parse_cmap(data):
+    # ToUnicode CMap -> ({code bytes: text}, code length in bytes)
+    mapping = {}
+
+    def code(hex_text):
+        return bytes.fromhex(hex_text.decode('ascii'))
+
+    def text(hex_text):
+        return code(hex_text).decode('utf-16-be', errors='ignore')
+
+    for block in re.findall(rb'beginbfchar(.*?)endbfchar', data, re.S):
+        for source, target in re.findall(rb'<([0-9A-Fa-f]+)>\s*<([0-9A-Fa-f]*)>', block):
+            mapping[code(source)] = text(target)
+    for block in re.findall(rb'beginbfrange(.*?)endbfrange', data, re.S):
+        for start, end, target in re.findall(rb'<([0-9A-Fa-f]+)>\s*<([0-9A-Fa-f]+)>\s*(<[0-9A-Fa-f]*>|\[.*?\])', block, re.S):
+            low, high, width = int(start, 16), int(end, 16), len(start) // 2
+            if target.startswith(b'['):
+                targets = re.findall(rb'<([0-9A-Fa-f]*)>', target)
+                for offset, value in enumerate(targets[:high - low + 1]):
+                    mapping[(low + offset).to_bytes(width, 'big')] = text(value)
+            else:
+                base = code(target[1:-1])
+                for offset in range(high - low + 1):
+                    value = (int.from_bytes(base, 'big') + offset).to_bytes(len(base), 'big')
+                    mapping[(low + offset).to_bytes(width, 'big')] = value.decode('utf-16-be', errors='ignore')
+    width = max((len(key) for key in mapping), default=1)
+    return mapping, width
+
+
+def font_maps(objects, resources):
+    # Font resource name (F1, ...) -> parse_cmap() result, None for simple fonts
+    fonts = dictionary_value(resources, b'Font') if resources else None
+    if fonts is None:
+        return {}
+    maps = {}
+    for name, number in FONT_ENTRY_PATTERN.findall(resolve(objects, fonts)):
+        font = objects.get(int(number), (b'', None))[0]
+        to_unicode = REFERENCE_PATTERN.search(font.split(b'/ToUnicode', 1)[1]) if b'/ToUnicode' in font else None
+        cmap = objects.get(int(to_unicode.group(1)), (b'', None))[1] if to_unicode else None
+        maps[name.decode('latin-1')] = parse_cmap(cmap) if cmap else None
+    return maps
+
+
+def literal_bytes(token):
+    # (…) string body with its escapes resolved
+    body, result, position = token[1:-1], bytearray(), 0
+    while position < len(body):
+        char = body[position:position + 1]
+        if char != b'\\':
+            result += char
+            position += 1
+            continue
+        following = body[position + 1:position + 2]
+        octal = re.match(rb'[0-7]{1,3}', body[position + 1:position + 4])
+        if octal:
+            result.append(int(octal.group(0), 8) & 0xFF)
+            position += 1 + len(octal.group(0))
+        else:
+            if following not in (b'\n', b'\r'):
+                result += LITERAL_ESCAPES.get(following, following)
+            position += 2
+    return bytes(result)
+
+
+def hex_bytes(token):
+    # <…> string body; an odd final digit is padded with 0
+    digits = re.sub(rb'\s', b'', token[1:-1]).decode('ascii')
+    return bytes.fromhex(digits + '0' * (len(digits) % 2))
+
+
+def string_text(token, cmap):
+    raw = literal_bytes(token) if token.startswith(b'(') else hex_bytes(token)
+    if cmap is None:
+        return raw.decode('latin-1')
+    mapping, width = cmap
+    return ''.join(mapping.get(raw[i:i + width], '') for i in range(0, len(raw), width))
+
+
+def content_text(content, maps):
+    # Text of one content stream, one line per text line
+    lines, line, operands = [], [], []
+    cmap = None
+    last_y = None
+
+    def new_line():
+        if line:
+            lines.append(''.join(line).strip())
+            line.clear()
+
+    for token in TOKEN_PATTERN.findall(content):
+        if token.startswith((b'(', b'<', b'/', b'[', b']')) or re.fullmatch(rb'[-+]?\d*\.?\d+', token):
+            operands.append(token)
+            continue
+        operator = token
+        if operator == b'Tf' and len(operands) >= 2:
+            cmap = maps.get(operands[-2][1:].decode('latin-1'))
+        elif operator in (b'Tj', b"'", b'"') and operands:
+            if operator != b'Tj':
+                new_line()
+            line.append(string_text(operands[-1], cmap))
+        elif operator == b'TJ':
+            depth_operands = operands[operands.index(b'[') + 1:] if b'[' in operands else operands
+            for item in depth_operands:
+                if item.startswith((b'(', b'<')):
+                    line.append(string_text(item, cmap))
+                elif re.fullmatch(rb'[-+]?\d*\.?\d+', item) and -float(item) > TJ_SPACE:
+                    line.append(' ')
+        elif operator in (b'Td', b'TD') and len(operands) >= 2:
+            if float(operands[-1]) != 0:
+                new_line()
+            else:
+                line.append(' ')
+        elif operator == b'Tm' and len(operands) >= 6:
+            y = float(operands[-1])
+            if last_y is not None and y != last_y:
+                new_line()
+            elif line:
+                line.append(' ')
+            last_y = y
+        elif operator in (b'T*', b'ET'):
+            new_line()
+        operands = []
+    new_line()
+    return lines
+
+
+def page_resources(objects, page):
+    # Resources are inherited from the page tree when the page has none
+    while page is not None:
+        resources = dictionary_value(page, b'Resources')
+        if resources:
+            return resolve(objects, resources)
+        parent = dictionary_value(page, b'Parent')
+        page = objects.get(int(parent.split()[0]), (None, None))[0] if parent else None
+    return None
+
+
+def page_objects(objects):
+    # /Type /Page dictionaries in page tree order
+    pages = {}
+    for number, (body, _) in objects.items():
+        if re.search(rb'/Type\s*/Page(?!s)\b', body):
+            pages[number] = body
+
+    roots = [body for body in (b for b, _ in objects.values()) if re.search(rb'/Type\s*/Pages\b', body)]
+    order = []
+
+    def walk(body):
+        kids = dictionary_value(body, b'Kids')
+        for number in REFERENCE_PATTERN.findall(kids or b''):
+            number = int(number)
+            if number in pages:
+                order.append(number)
+            elif number in objects:
+                walk(objects[number][0])
+
+    for root in roots:
+        if not re.search(rb'/Parent\s', root):
+            walk(root)
+    order += [number for number in sorted(pages) if number not in order]
+    return [(number, pages[number]) for number in order]
+
+
+def pdf_text(pdf):
+    # Text of a whole PDF (bytes), pages separated by form feeds
+    objects = parse_objects(pdf)
+    texts = []
+    for _, page in page_objects(objects):
+        maps = font_maps(objects, page_resources(objects, page))
+        contents = dictionary_value(page, b'Contents') or b''
+        lines = []
+        for number in REFERENCE_PATTERN.findall(contents):
+            data = objects.get(int(number), (b'', None))[1]
+            if data:
+                lines.extend(content_text(data, maps))
+        texts.append('\n'.join(line for line in lines if line))
+    return '\f'.join(texts)
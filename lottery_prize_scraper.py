@@ -1,52 +1,61 @@
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
-import pandas as pd
+from lottery_browser import create_driver, network_report, open_page
+from lottery_selection import GAME_TYPES, ScrapeSelection, add_selection_arguments, selection_from_args
+from lottery_sink import CsvSink, PRIZE_COLUMNS, PRIZE_KEY_COLUMNS, prize_pool
+from lottery_store import LotteryStore
+from lottery_waits import (By, StepTimer, WaitTimeout, wait_for_content, wait_for_document_ready, wait_located,
+                           content_hash)
 from datetime import datetime
-import time
+import argparse
+import logging
+
+log = logging.getLogger(__name__)
+
+PRIZE_GAME_ID_MAP = {
+    '胜负游戏': 'sfc',
+    '任选9场': 'rj',
+    '6场半全场': 'bqc',
+    '4场进球': 'jq'
+}
+
+# Elements of a game's prize block that become visible once its tab is selected
+PRIZE_CONTENT_SELECTOR = "#{game_id}_pool, #{game_id}_kj, #level_1_{game_id}, #openTime_kj_{game_id}"
 
 class LotteryPrizeScraper:
-    def __init__(self):
-        self.prize_columns = [
-            'Issue_Number', 'Date', 'Game_Type',
-            'First_Prize_Count', 'First_Prize_Amount',
-            'Second_Prize_Count', 'Second_Prize_Amount',
-            'Prize_Pool', 'Prize_Pool_Amount',
-            'Prize_Notice_URL', 'Sales_Notice_URL'
-        ]
-        
-        options = webdriver.ChromeOptions()
-        options.add_argument('--headless')
-        options.add_argument('--no-sandbox')
-        options.add_argument('--disable-dev-shm-usage')
-        options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+    def __init__(self, time_budget=None, driver=None, timer=None, store=None, archive=None, selection=None):
+        self.prize_columns = PRIZE_COLUMNS
         
-        service = Service(ChromeDriverManager().install())
-        self.driver = webdriver.Chrome(service=service, options=options)
+        # A driver passed in (e.g. by lottery_runner.py) is shared and is not
+        # quit by this scraper
+        self.owns_driver = driver is None
+        self.timer = timer or StepTimer(time_budget)
+        self.driver = driver or create_driver(self.timer, page='kjgg')
         self.base_url = "https://www.sporttery.cn/ctzc/kjgg/index.html"
+        
+        # ScrapeSelection of the game types, issues and columns to scrape
+        self.selection = selection or ScrapeSelection()
+        
+        # Optional LotteryStore that replaces the CSV output
+        self.store = store
+        
+        # Optional SnapshotArchive keeping the markup of every prize block visited
+        self.archive = archive
+        
+        # CsvSink of this run's prize file, opened by the first row
+        self.sink = None
+        self.prize_rows = 0
 
     def wait_for_element(self, by, value, timeout=10):
         try:
-            element = WebDriverWait(self.driver, timeout).until(
-                EC.presence_of_element_located((by, value))
-            )
+            element = wait_located(self.driver, by, value, self.timer.timeout(timeout, value))
+            self.timer.found(value)
             return element
-        except TimeoutException:
-            print(f"Timeout waiting for element: {value}")
+        except WaitTimeout:
+            log.warning("Timeout waiting for element: %s", value)
+            self.timer.missed(value)
             return None
 
     def extract_prize_info(self, lottery_type='胜负游戏'):
-        game_id_map = {
-            '胜负游戏': 'sfc',
-            '任选9场': 'rj',
-            '6场半全场': 'bqc',
-            '4场进球': 'jq'
-        }
-        
-        game_id = game_id_map.get(lottery_type)
+        game_id = PRIZE_GAME_ID_MAP.get(lottery_type)
         if not game_id:
             return None
 
@@ -57,6 +66,7 @@ class LotteryPrizeScraper:
                 'Prize_Notice_URL': self.driver.find_element(By.CSS_SELECTOR, f'#kj_{game_id}_news a').get_attribute('href'),
                 'Sales_Notice_URL': self.driver.find_element(By.CSS_SELECTOR, f'#kj_{game_id}_xl a').get_attribute('href')
             }
+            prize_data['Prize_Pool'] = prize_pool(prize_data['Prize_Pool_Amount'])
 
             # Different parsing logic based on game type
             if lottery_type == '胜负游戏':
@@ -90,17 +100,19 @@ class LotteryPrizeScraper:
             return prize_data
             
         except Exception as e:
-            print(f"Error extracting prize info for {lottery_type}: {str(e)}")
+            log.error("Error extracting prize info for %s: %s", lottery_type, e)
+            self.timer.count('exceptions', where='prize_extract', game=lottery_type)
             return None
 
     def scrape_prizes(self):
-        print("Starting prize scraper...")
-        self.driver.get(self.base_url)
-        print("Page loaded, waiting for content...")
-        time.sleep(5)
+        log.info("Starting prize scraper (%s)...", self.selection.describe())
+        with self.timer.step('page_load'):
+            open_page(self.driver, self.base_url)
+            log.info("Page loaded, waiting for content...")
+            wait_for_document_ready(self.driver, self.timer.timeout(20))
+            self.wait_for_element(By.CSS_SELECTOR, ".m-cz-tit span", timeout=20)
         
-        lottery_types = ['胜负游戏', '任选9场', '6场半全场', '4场进球']
-        all_prize_data = []
+        lottery_types = self.selection.select_games(GAME_TYPES)
         
         try:
             lottery_tabs = self.driver.find_elements(By.CSS_SELECTOR, ".m-cz-tit span")
@@ -108,32 +120,123 @@ class LotteryPrizeScraper:
             for tab in lottery_tabs:
                 lottery_type = tab.text.strip()
                 if lottery_type in lottery_types:
-                    print(f"Processing {lottery_type}...")
-                    tab.click()
-                    time.sleep(2)
+                    if self.timer.expired():
+                        self.timer.skip(lottery_type, self.timer.exhausted(), game=lottery_type)
+                        continue
+                    log.info("Processing %s...", lottery_type)
                     
-                    prize_data = self.extract_prize_info(lottery_type)
+                    with self.timer.scope(lottery_type):
+                        # Click the tab and wait until its prize block is shown
+                        with self.timer.step('tab_click', game=lottery_type):
+                            content_selector = PRIZE_CONTENT_SELECTOR.format(game_id=PRIZE_GAME_ID_MAP[lottery_type])
+                            previous = content_hash(self.driver, content_selector)
+                            tab.click()
+                        with self.timer.step('wait', game=lottery_type):
+                            if wait_for_content(self.driver, content_selector, previous, tab,
+                                                timeout=self.timer.timeout(10, content_selector)) is None:
+                                self.timer.missed(content_selector, game=lottery_type)
+                            else:
+                                self.timer.found(content_selector)
+                        
+                        if self.archive is not None:
+                            self.archive.capture(self.driver, 'kjgg', lottery_type, '')
+                        
+                        with self.timer.step('prize_extract', game=lottery_type):
+                            prize_data = self.extract_prize_info(lottery_type)
                     if prize_data:
-                        all_prize_data.append(prize_data)
+                        self.write_prize(prize_data)
+                    else:
+                        self.timer.skip(lottery_type, 'error', game=lottery_type)
             
-            if all_prize_data:
-                filename = f'lottery_prizes_{datetime.now().strftime("%Y%m%d")}.csv'
-                df = pd.DataFrame(all_prize_data, columns=self.prize_columns)
-                df.to_csv(filename, index=False, encoding='utf-8-sig')
-                print(f"Prize data saved to {filename}")
+            self.save_prizes()
                 
         except Exception as e:
-            print(f"Error occurred: {str(e)}")
+            log.error("Error occurred: %s", e)
+            self.timer.count('exceptions', where='scrape_prizes')
             self.driver.save_screenshot("prize_error_screenshot.png")
-            print("Error screenshot saved as prize_error_screenshot.png")
+            log.error("Error screenshot saved as prize_error_screenshot.png")
         
         finally:
-            print("Closing browser...")
-            self.driver.quit()
+            self.abort_prizes()
+            if self.owns_driver:
+                network_report(self.driver, self.timer)
+                self.timer.report()
+                log.info("Closing browser...")
+                self.driver.quit()
+
+    def write_prize(self, prize_data):
+        # Each game type's prize row is written as soon as it is extracted.
+        # The prize block shows the latest issue (or the one the results
+        # scraper selected last), which may be outside the selected issues.
+        game_type = prize_data.get('Game_Type')
+        if not self.selection.wants_period(prize_data.get('Issue_Number')):
+            log.info("Prize of %s issue %s is not selected, skipping", game_type, prize_data.get('Issue_Number'))
+            return
+        self.prize_rows += 1
+        if self.store is not None:
+            with self.timer.step('store_write', game=game_type):
+                self.store.upsert_prizes([prize_data])
+            return
+        with self.timer.step('file_write', game=game_type):
+            if self.sink is None:
+                columns = self.selection.output_columns(self.prize_columns, PRIZE_KEY_COLUMNS)
+                self.sink = CsvSink(f'lottery_prizes_{datetime.now().strftime("%Y%m%d")}.csv', columns)
+            self.sink.write([prize_data])
+            self.sink.flush()
+
+    def save_prizes(self):
+        if self.prize_rows and self.store is not None:
+            log.info("Prize data upserted into %s", self.store.path)
+        elif self.sink is not None:
+            with self.timer.step('file_write'):
+                filename = self.sink.commit()
+            self.sink = None
+            log.info("Prize data saved to %s", filename)
+        self.timer.count('rows', self.prize_rows)
+        self.prize_rows = 0
+
+    def abort_prizes(self):
+        # A run that stopped early keeps its rows in the .part file
+        if self.sink is not None:
+            self.sink.abort()
+            self.sink = None
 
     def run(self):
         self.scrape_prizes()
 
 if __name__ == "__main__":
-    scraper = LotteryPrizeScraper()
-    scraper.run()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backend', choices=['browser', 'http'], default='browser')
+    parser.add_argument('--base-url', help="Feed URL for the http backend, e.g. lottery_fixture_server.py")
+    parser.add_argument('--time-budget', type=float, help="Total seconds the browser run may take")
+    parser.add_argument('--tab-budget', type=float, help="Seconds each game type's tab may take")
+    parser.add_argument('--breaker-misses', type=int, default=3,
+                        help="Timeouts in a row after which a selector is no longer waited for")
+    parser.add_argument('--store', help="SQLite store to upsert into instead of writing CSV files")
+    parser.add_argument('--snapshots', help="Archive directory for the markup of every visited prize block")
+    add_selection_arguments(parser, sale_status=False)
+    parser.add_argument('--log-level', default='INFO')
+    parser.add_argument('--metrics-prom', help="Prometheus textfile to write step timings and counts to")
+    parser.add_argument('--metrics-jsonl', help="File to append every step span and count to as JSON lines")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(message)s')
+    metrics = None
+    if args.metrics_prom or args.metrics_jsonl:
+        from lottery_metrics import RunMetrics
+        metrics = RunMetrics('prizes', args.metrics_prom, args.metrics_jsonl)
+
+    store = LotteryStore(args.store) if args.store else None
+    selection = selection_from_args(args)
+    if args.backend == 'http':
+        from lottery_http import HttpLotteryPrizeScraper, API_BASE_URL
+        scraper = HttpLotteryPrizeScraper(args.base_url or API_BASE_URL, store=store, selection=selection)
+    else:
+        from lottery_snapshots import SnapshotArchive
+        archive = SnapshotArchive(args.snapshots) if args.snapshots else None
+        timer = StepTimer(args.time_budget, metrics, args.tab_budget, args.breaker_misses)
+        scraper = LotteryPrizeScraper(timer=timer, store=store, archive=archive, selection=selection)
+    scraper.run()
+
+    if metrics is not None:
+        metrics.close([scraper.driver] if hasattr(scraper, 'driver') else [])
\ No newline at end of file
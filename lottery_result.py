@@ -1,27 +1,63 @@
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import Select
-from selenium.common.exceptions import TimeoutException
-import pandas as pd
 from datetime import datetime
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
-import time
+from lottery_browser import create_driver, count_commands, network_report, open_page
+from lottery_cache import FingerprintCache, markup_fingerprint
+from lottery_selection import ScrapeSelection, add_selection_arguments, selection_from_args
+from lottery_sink import CsvSink, RESULT_KEY_COLUMNS, result_columns
+from lottery_store import LotteryStore
+from lottery_waits import (By, StepTimer, WaitTimeout, wait_for_content, wait_for_document_ready, wait_located,
+                           content_hash)
+import argparse
+import logging
+import os
+
+log = logging.getLogger(__name__)
+
+# Reads the whole #*_game table in one call. textContent is kept next to the
+# visible text because team cells of 6场半全场/4场进球 hide part of the name.
+TABLE_CELLS_SCRIPT = """
+var trs = arguments[0].getElementsByTagName('tr');
+var result = {rows: [], content: [], header: []};
+for (var r = 0; r < trs.length; r++) {
+    var tds = trs[r].getElementsByTagName('td');
+    var texts = [], contents = [];
+    for (var c = 0; c < tds.length; c++) {
+        texts.push((tds[c].innerText || '').trim());
+        contents.push(tds[c].textContent || '');
+    }
+    result.rows.push(texts);
+    result.content.push(contents);
+    if (r === 0) {
+        var ths = trs[r].getElementsByTagName('th');
+        for (var h = 0; h < ths.length; h++) {
+            result.header.push(ths[h].innerText || '');
+        }
+    }
+}
+return result;
+"""
 
 class LotteryResultsScraper:
-    def __init__(self):
-        options = webdriver.ChromeOptions()
-        options.add_argument('--headless')
-        options.add_argument('--no-sandbox')
-        options.add_argument('--disable-dev-shm-usage')
-        options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-        
-        service = Service(ChromeDriverManager().install())
-        self.driver = webdriver.Chrome(service=service, options=options)
+    def __init__(self, time_budget=None, driver=None, timer=None, cache=None, store=None, archive=None,
+                 selection=None):
+        # A driver passed in (e.g. by lottery_runner.py) is shared and is not
+        # quit by this scraper
+        self.owns_driver = driver is None
+        self.timer = timer or StepTimer(time_budget)
+        self.driver = count_commands(driver or create_driver(self.timer, page='kjgg'))
         self.base_url = "https://www.sporttery.cn/ctzc/kjgg/index.html"
         
+        # ScrapeSelection of the game types, issues and columns to scrape
+        self.selection = selection or ScrapeSelection()
+        
+        # Optional FingerprintCache; unchanged issue tables are not re-read
+        self.cache = cache
+        
+        # Optional LotteryStore that replaces the CSV output
+        self.store = store
+        
+        # Optional SnapshotArchive keeping the markup of every issue visited
+        self.archive = archive
+        
         self.select_id_map = {
             '胜负游戏': 'sfc_issue',
             '任选9场': 'rj_issue',
@@ -35,102 +71,290 @@ class LotteryResultsScraper:
             '6场半全场': 'bqc_game',
             '4场进球': 'jq_game'
         }
+        
+        self.date_id_map = {
+            '胜负游戏': 'openTime_kj_sfc',
+            '任选9场': 'openTime_kj_rj',
+            '6场半全场': 'openTime_kj_bqc',
+            '4场进球': 'openTime_kj_jq'
+        }
+        
+        # WebDriver cost of each extracted table
+        self.round_trip_report = []
 
     def wait_for_element(self, by, value, timeout=10):
         try:
-            element = WebDriverWait(self.driver, timeout).until(
-                EC.presence_of_element_located((by, value))
-            )
+            element = wait_located(self.driver, by, value, self.timer.timeout(timeout, value))
+            self.timer.found(value)
             return element
-        except TimeoutException:
-            print(f"Timeout waiting for element: {value}")
+        except WaitTimeout:
+            log.warning("Timeout waiting for element: %s", value)
+            self.timer.missed(value)
             return None
 
     def clean_team_name(self, text):
         return ''.join(text.split())
 
-    def process_match_data(self, lottery_type, rows, i):
+    def read_table_cells(self, table):
+        # One execute_script call returns every cell of the table, so the
+        # column mapping below runs in plain Python without further round trips
+        return self.driver.execute_script(TABLE_CELLS_SCRIPT, table)
+
+    def process_match_data(self, lottery_type, table, i):
         match_data = {}
+        rows = table['rows']
+        content = table['content']
         
         if lottery_type == '6场半全场':
             match_index = i
             
-            if len(rows) > 1:
-                home_cells = rows[1].find_elements(By.TAG_NAME, "td")
-                if match_index < len(home_cells):
-                    match_data['Home_Team'] = self.clean_team_name(home_cells[match_index].get_attribute("textContent"))
+            if len(rows) > 1 and match_index < len(content[1]):
+                match_data['Home_Team'] = self.clean_team_name(content[1][match_index])
             
-            if len(rows) > 3:
-                away_cells = rows[3].find_elements(By.TAG_NAME, "td")
-                if match_index < len(away_cells):
-                    match_data['Away_Team'] = self.clean_team_name(away_cells[match_index].get_attribute("textContent"))
+            if len(rows) > 3 and match_index < len(content[3]):
+                match_data['Away_Team'] = self.clean_team_name(content[3][match_index])
             
-            if len(rows) > 5:
-                score_cells = rows[5].find_elements(By.TAG_NAME, "td")
-                if match_index * 2 + 1 < len(score_cells):
-                    match_data['Half_Time_Score'] = score_cells[match_index * 2].text.strip()
-                    match_data['Full_Time_Score'] = score_cells[match_index * 2 + 1].text.strip()
+            if len(rows) > 5 and match_index * 2 + 1 < len(rows[5]):
+                match_data['Half_Time_Score'] = rows[5][match_index * 2]
+                match_data['Full_Time_Score'] = rows[5][match_index * 2 + 1]
             
-            if len(rows) > 6:
-                result_cells = rows[6].find_elements(By.TAG_NAME, "td")
-                if match_index * 2 + 1 < len(result_cells):
-                    match_data['Half_Time_Result'] = result_cells[match_index * 2].text.strip()
-                    match_data['Full_Time_Result'] = result_cells[match_index * 2 + 1].text.strip()
+            if len(rows) > 6 and match_index * 2 + 1 < len(rows[6]):
+                match_data['Half_Time_Result'] = rows[6][match_index * 2]
+                match_data['Full_Time_Result'] = rows[6][match_index * 2 + 1]
         
         elif lottery_type == '4场进球':
             match_index = i
             
-            if len(rows) > 1:
-                home_cells = rows[1].find_elements(By.TAG_NAME, "td")
-                if match_index < len(home_cells):
-                    match_data['Home_Team'] = self.clean_team_name(home_cells[match_index].get_attribute("textContent"))
+            if len(rows) > 1 and match_index < len(content[1]):
+                match_data['Home_Team'] = self.clean_team_name(content[1][match_index])
             
-            if len(rows) > 3:
-                away_cells = rows[3].find_elements(By.TAG_NAME, "td")
-                if match_index < len(away_cells):
-                    match_data['Away_Team'] = self.clean_team_name(away_cells[match_index].get_attribute("textContent"))
+            if len(rows) > 3 and match_index < len(content[3]):
+                match_data['Away_Team'] = self.clean_team_name(content[3][match_index])
             
-            if len(rows) > 5:
-                score_cells = rows[5].find_elements(By.TAG_NAME, "td")
-                if match_index < len(score_cells):
-                    match_data['Score'] = score_cells[match_index].text.strip()
+            if len(rows) > 5 and match_index < len(rows[5]):
+                match_data['Score'] = rows[5][match_index]
             
-            if len(rows) > 6:
-                result_cells = rows[6].find_elements(By.TAG_NAME, "td")
-                if match_index * 2 + 1 < len(result_cells):
-                    match_data['Home_Goals'] = result_cells[match_index * 2].text.strip()
-                    match_data['Away_Goals'] = result_cells[match_index * 2 + 1].text.strip()
+            if len(rows) > 6 and match_index * 2 + 1 < len(rows[6]):
+                match_data['Home_Goals'] = rows[6][match_index * 2]
+                match_data['Away_Goals'] = rows[6][match_index * 2 + 1]
         
         else:
-            if len(rows) > 1:
-                home_cells = rows[1].find_elements(By.TAG_NAME, "td")
-                if i < len(home_cells):
-                    match_data['Home_Team'] = self.clean_team_name(home_cells[i].text)
+            if len(rows) > 1 and i < len(rows[1]):
+                match_data['Home_Team'] = self.clean_team_name(rows[1][i])
             
-            if len(rows) > 3:
-                away_cells = rows[3].find_elements(By.TAG_NAME, "td")
-                if i < len(away_cells):
-                    match_data['Away_Team'] = self.clean_team_name(away_cells[i].text)
+            if len(rows) > 3 and i < len(rows[3]):
+                match_data['Away_Team'] = self.clean_team_name(rows[3][i])
             
-            if len(rows) > 4:
-                score_cells = rows[4].find_elements(By.TAG_NAME, "td")
-                if i < len(score_cells):
-                    match_data['Score'] = score_cells[i].text.strip()
+            if len(rows) > 4 and i < len(rows[4]):
+                match_data['Score'] = rows[4][i]
             
-            if len(rows) > 5:
-                result_cells = rows[5].find_elements(By.TAG_NAME, "td")
-                if i < len(result_cells):
-                    match_data['Result'] = result_cells[i].text.strip()
+            if len(rows) > 5 and i < len(rows[5]):
+                match_data['Result'] = rows[5][i]
         
         return match_data
 
-    def scrape_lottery_results(self, issue=None):
-        print("Starting results scraper...")
-        self.driver.get(self.base_url)
-        print("Page loaded, waiting for content...")
-        time.sleep(5)
+    def get_match_count(self, lottery_type, table):
+        if lottery_type == '6场半全场':
+            return 6
+        elif lottery_type == '4场进球':
+            return 4
+        return len(table['header'])
+
+    def element_round_trips(self, lottery_type, table, match_count):
+        # Number of WebDriver commands the per-element extraction needed for
+        # the same table: one find_elements per row lookup and one
+        # .text/get_attribute per cell read
+        rows = table['rows']
+        if lottery_type == '6场半全场':
+            layout = [(1, 1, 1), (3, 1, 1), (5, 2, 2), (6, 2, 2)]
+        elif lottery_type == '4场进球':
+            layout = [(1, 1, 1), (3, 1, 1), (5, 1, 1), (6, 2, 2)]
+        else:
+            layout = [(1, 1, 1), (3, 1, 1), (4, 1, 1), (5, 1, 1)]
         
-        current_date = datetime.now().strftime("%Y%m%d")
+        # find_elements for the rows, plus the header cells for 胜负游戏/任选9场
+        count = 1
+        if lottery_type not in ('6场半全场', '4场进球'):
+            count += 1 + len(table['header'])
+        
+        for i in range(match_count):
+            for row_index, width, reads in layout:
+                if len(rows) <= row_index:
+                    continue
+                count += 1
+                if i * width + width - 1 < len(rows[row_index]):
+                    count += reads
+        return count
+
+    def load_page(self):
+        with self.timer.step('page_load'):
+            open_page(self.driver, self.base_url)
+            log.info("Page loaded, waiting for content...")
+            wait_for_document_ready(self.driver, self.timer.timeout(20))
+            self.wait_for_element(By.CSS_SELECTOR, ".m-cz-tit span", timeout=20)
+
+    def select_tab(self, tab, lottery_type):
+        # Click the tab and wait until its results table is shown
+        with self.timer.step('tab_click', game=lottery_type):
+            content_selector = f"#{self.game_id_map.get(lottery_type, '')}"
+            previous = content_hash(self.driver, content_selector)
+            tab.click()
+        with self.timer.step('wait', game=lottery_type):
+            if wait_for_content(self.driver, content_selector, previous, tab,
+                                timeout=self.timer.timeout(10, content_selector)) is None:
+                self.timer.missed(content_selector, game=lottery_type)
+            else:
+                self.timer.found(content_selector)
+
+    def select_lottery_type(self, lottery_type):
+        for tab in self.driver.find_elements(By.CSS_SELECTOR, ".m-cz-tit span"):
+            if tab.text.strip() == lottery_type:
+                self.select_tab(tab, lottery_type)
+                return True
+        log.warning("Lottery type tab not found: %s", lottery_type)
+        return False
+
+    def list_issues(self, lottery_type):
+        # Issue numbers offered by the game's issue select, newest first
+        select_element = self.wait_for_element(By.ID, self.select_id_map[lottery_type])
+        if not select_element:
+            return []
+        return self.driver.execute_script(
+            "return Array.prototype.map.call(arguments[0].options, function(o) { return o.value; });",
+            select_element
+        )
+
+    def select_issue(self, lottery_type, issue):
+        # Pick an issue from the select and wait until its table is shown
+        from selenium.webdriver.support.ui import Select
+        from selenium.common.exceptions import NoSuchElementException
+        select_element = self.wait_for_element(By.ID, self.select_id_map[lottery_type])
+        if not select_element:
+            return False
+        
+        select = Select(select_element)
+        if select.first_selected_option.get_attribute("value") == str(issue):
+            return True
+        
+        with self.timer.step('issue_select', game=lottery_type, issue=issue):
+            content_selector = f"#{self.game_id_map[lottery_type]}"
+            previous = content_hash(self.driver, content_selector)
+            try:
+                select.select_by_value(str(issue))
+            except NoSuchElementException:
+                log.warning("Issue %s is not offered for %s", issue, lottery_type)
+                return False
+        with self.timer.step('wait', game=lottery_type, issue=issue):
+            if wait_for_content(self.driver, content_selector, previous,
+                                timeout=self.timer.timeout(10, content_selector)) is None:
+                self.timer.missed(content_selector, game=lottery_type)
+            else:
+                self.timer.found(content_selector)
+        return True
+
+    def selected_issues(self, lottery_type, issue=None):
+        # The issue asked for, the selected issues the game's select offers,
+        # or [None] for the issue the page shows
+        if issue or self.selection.periods is None:
+            return [issue]
+        issues = [value for value in self.list_issues(lottery_type) if self.selection.wants_period(value)]
+        if not issues:
+            log.info("None of the selected issues is offered for %s", lottery_type)
+        return issues
+
+    def extract_results(self, lottery_type, issue_number, date, cells):
+        # Rows of one issue table from its cells; also used by
+        # lottery_snapshots.py to replay archived tables
+        results = []
+        for i in range(self.get_match_count(lottery_type, cells)):
+            match_data = {
+                'Period': issue_number,
+                'Date': date,
+                'Match_Number': str(i + 1),
+            }
+            match_data.update(self.process_match_data(lottery_type, cells, i))
+            results.append(match_data)
+        return results
+
+    def results_filename(self, lottery_type, issue_number):
+        return f'lottery_results_{lottery_type}_{issue_number}.csv'
+
+    def scrape_tab_results(self, lottery_type, issue=None):
+        results = []
+        date = None
+        issue_number = None
+        
+        if issue and not self.select_issue(lottery_type, issue):
+            return results
+        
+        date_id = self.date_id_map.get(lottery_type)
+        if date_id:
+            date_element = self.wait_for_element(By.ID, date_id)
+            date = date_element.text.replace('开奖日期：', '') if date_element else None
+            log.debug("Got date for %s: %s", lottery_type, date)
+        
+        select_id = self.select_id_map.get(lottery_type)
+        if select_id:
+            select_element = self.wait_for_element(By.ID, select_id)
+            if select_element:
+                from selenium.webdriver.support.ui import Select
+                select = Select(select_element)
+                issue_number = select.first_selected_option.get_attribute("value")
+        
+        if self.archive is not None:
+            self.archive.capture(self.driver, 'kjgg', lottery_type, issue_number)
+        
+        game_id = self.game_id_map.get(lottery_type)
+        if game_id:
+            table = self.wait_for_element(By.ID, game_id)
+            
+            # Closed issues rarely change; skip extraction and the file write
+            # when the table markup matches the last run and the file exists
+            if table and self.cache is not None:
+                key = self.cache.key('kjgg', lottery_type, issue_number)
+                fingerprint = markup_fingerprint(self.driver, f"#{game_id}", f"#{date_id}")
+                cached = self.cache.lookup(key, fingerprint)
+                saved = self.store is not None or os.path.exists(self.results_filename(lottery_type, issue_number))
+                if cached is not None and saved:
+                    log.info("%s issue %s unchanged, skipping", lottery_type, issue_number)
+                    self.timer.count('cache_hits', game=lottery_type)
+                    return cached
+            
+            if table:
+                commands_before = self.driver.command_count
+                with self.timer.step('table_extract', game=lottery_type, issue=issue_number):
+                    cells = self.read_table_cells(table)
+                results = self.extract_results(lottery_type, issue_number, date, cells)
+                
+                self.round_trip_report.append({
+                    'table': game_id,
+                    'element_round_trips': self.element_round_trips(lottery_type, cells, len(results)),
+                    'bulk_round_trips': self.driver.command_count - commands_before
+                })
+                
+                if self.cache is not None:
+                    self.cache.store(key, fingerprint, results)
+        
+        if results and self.store is not None:
+            with self.timer.step('store_write', game=lottery_type):
+                self.store.upsert_results(lottery_type, results)
+            log.info("Upserted %s results into %s", lottery_type, self.store.path)
+        elif results:
+            # Written next to the final file and renamed, so a crash never
+            # leaves a truncated results file behind
+            with self.timer.step('file_write', game=lottery_type):
+                columns = self.selection.output_columns(result_columns(lottery_type), RESULT_KEY_COLUMNS)
+                with CsvSink(self.results_filename(lottery_type, issue_number), columns) as sink:
+                    sink.write(results)
+                filename = sink.path
+            log.info("Saved %s results to %s", lottery_type, filename)
+        self.timer.count('rows', len(results), game=lottery_type)
+        
+        return results
+
+    def scrape_lottery_results(self, issue=None):
+        log.info("Starting results scraper (%s)...", self.selection.describe())
+        self.load_page()
         
         try:
             lottery_tabs = self.driver.find_elements(By.CSS_SELECTOR, ".m-cz-tit span")
@@ -138,78 +362,88 @@ class LotteryResultsScraper:
             for tab in lottery_tabs:
                 try:
                     lottery_type = tab.text.strip()
-                    print(f"Processing lottery type: {lottery_type}")
-                    tab.click()
-                    time.sleep(2)
-                    
-                    results = []
-                    
-                    date_id_map = {
-                        '胜负游戏': 'openTime_kj_sfc',
-                        '任选9场': 'openTime_kj_rj',
-                        '6场半全场': 'openTime_kj_bqc',
-                        '4场进球': 'openTime_kj_jq'
-                    }
+                    if lottery_type not in self.game_id_map or not self.selection.wants_game(lottery_type):
+                        continue
+                    if self.timer.expired():
+                        self.timer.skip(lottery_type, self.timer.exhausted(), game=lottery_type)
+                        continue
+                    log.info("Processing lottery type: %s", lottery_type)
                     
-                    date_id = date_id_map.get(lottery_type)
-                    if date_id:
-                        date_element = self.wait_for_element(By.ID, date_id)
-                        date = date_element.text.replace('开奖日期：', '') if date_element else None
-                        print(f"Got date for {lottery_type}: {date}")
-                    
-                    select_id = self.select_id_map.get(lottery_type)
-                    if select_id:
-                        select_element = self.wait_for_element(By.ID, select_id)
-                        if select_element:
-                            select = Select(select_element)
-                            issue_number = select.first_selected_option.get_attribute("value")
-                    
-                    game_id = self.game_id_map.get(lottery_type)
-                    if game_id:
-                        table = self.wait_for_element(By.ID, game_id)
-                        if table:
-                            rows = table.find_elements(By.TAG_NAME, "tr")
-                            
-                            if lottery_type == '6场半全场':
-                                match_count = 6
-                            elif lottery_type == '4场进球':
-                                match_count = 4
-                            else:
-                                match_numbers = [th.text for th in rows[0].find_elements(By.TAG_NAME, "th")]
-                                match_count = len(match_numbers)
-                            
-                            for i in range(match_count):
-                                match_data = {
-                                    'Period': issue_number,
-                                    'Date': date,
-                                    'Match_Number': str(i + 1),
-                                }
-                                
-                                match_data.update(self.process_match_data(lottery_type, rows, i))
-                                results.append(match_data)
-                    
-                    if results:
-                        df = pd.DataFrame(results)
-                        filename = f'lottery_results_{lottery_type}_{issue_number}.csv'
-                        df.to_csv(filename, index=False, encoding='utf-8-sig')
-                        print(f"Saved {lottery_type} results to {filename}")
+                    with self.timer.scope(lottery_type):
+                        self.select_tab(tab, lottery_type)
+                        for selected in self.selected_issues(lottery_type, issue):
+                            self.scrape_tab_results(lottery_type, selected)
                                 
                 except Exception as e:
-                    print(f"Error processing lottery type {lottery_type}: {str(e)}")
+                    log.error("Error processing lottery type %s: %s", lottery_type, e)
+                    self.timer.count('exceptions', where='scrape_tab_results', game=lottery_type)
+                    self.timer.skip(lottery_type, 'error', game=lottery_type)
                     continue
             
         except Exception as e:
-            print(f"Error occurred: {str(e)}")
+            log.error("Error occurred: %s", e)
+            self.timer.count('exceptions', where='scrape_lottery_results')
             self.driver.save_screenshot("error_screenshot.png")
-            print("Error screenshot saved as error_screenshot.png")
+            log.error("Error screenshot saved as error_screenshot.png")
         
         finally:
-            print("Closing browser...")
-            self.driver.quit()
+            self.print_round_trip_report()
+            self.save_cache()
+            if self.owns_driver:
+                network_report(self.driver, self.timer)
+                self.timer.report()
+                log.info("Closing browser...")
+                self.driver.quit()
+
+    def save_cache(self):
+        if self.cache is not None:
+            self.cache.evict()
+            self.cache.save()
+
+    def print_round_trip_report(self):
+        for entry in self.round_trip_report:
+            log.info("Table %s: %s WebDriver round trips (per-element extraction: %s)",
+                     entry['table'], entry['bulk_round_trips'], entry['element_round_trips'])
 
     def run(self, issue=None):
         self.scrape_lottery_results(issue)
 
 if __name__ == "__main__":
-    scraper = LotteryResultsScraper()
-    scraper.run()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backend', choices=['browser', 'http'], default='browser')
+    parser.add_argument('--base-url', help="Feed URL for the http backend, e.g. lottery_fixture_server.py")
+    parser.add_argument('--time-budget', type=float, help="Total seconds the browser run may take")
+    parser.add_argument('--tab-budget', type=float, help="Seconds each game type's tab may take")
+    parser.add_argument('--breaker-misses', type=int, default=3,
+                        help="Timeouts in a row after which a selector is no longer waited for")
+    parser.add_argument('--issue', help="Issue number to scrape instead of the latest one")
+    parser.add_argument('--fingerprint-cache', help="Cache file used to skip issues whose table is unchanged")
+    parser.add_argument('--store', help="SQLite store to upsert into instead of writing CSV files")
+    parser.add_argument('--snapshots', help="Archive directory for the markup of every visited issue")
+    add_selection_arguments(parser, sale_status=False)
+    parser.add_argument('--log-level', default='INFO', help="DEBUG also logs the date read for every issue")
+    parser.add_argument('--metrics-prom', help="Prometheus textfile to write step timings and counts to")
+    parser.add_argument('--metrics-jsonl', help="File to append every step span and count to as JSON lines")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(message)s')
+    metrics = None
+    if args.metrics_prom or args.metrics_jsonl:
+        from lottery_metrics import RunMetrics
+        metrics = RunMetrics('results', args.metrics_prom, args.metrics_jsonl)
+
+    store = LotteryStore(args.store) if args.store else None
+    selection = selection_from_args(args)
+    if args.backend == 'http':
+        from lottery_http import HttpLotteryResultsScraper, API_BASE_URL
+        scraper = HttpLotteryResultsScraper(args.base_url or API_BASE_URL, store=store, selection=selection)
+    else:
+        from lottery_snapshots import SnapshotArchive
+        cache = FingerprintCache(args.fingerprint_cache) if args.fingerprint_cache else None
+        archive = SnapshotArchive(args.snapshots) if args.snapshots else None
+        timer = StepTimer(args.time_budget, metrics, args.tab_budget, args.breaker_misses)
+        scraper = LotteryResultsScraper(timer=timer, cache=cache, store=store, archive=archive, selection=selection)
+    scraper.run(args.issue)
+
+    if metrics is not None:
+        metrics.close([scraper.driver] if hasattr(scraper, 'driver') else [])
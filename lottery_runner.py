@@ -0,0 +1,129 @@
+import argparse
+import logging
+from lottery_browser import create_driver, network_report
+from lottery_cache import FingerprintCache
+from lottery_selection import ScrapeSelection, add_selection_arguments, selection_from_args
+from lottery_store import LotteryStore
+from lottery_waits import By, StepTimer
+from lottery_selling import LotteryScraper
+from lottery_result import LotteryResultsScraper
+from lottery_prize_scraper import LotteryPrizeScraper
+from lottery_snapshots import SnapshotArchive
+
+log = logging.getLogger(__name__)
+
+
+class LotteryRunner:
+    def __init__(self, time_budget=None, cache_path=None, store_path=None, archive_dir=None, metrics=None,
+                 tab_budget=None, breaker_misses=3, selection=None):
+        # One Chrome session, time budget, fingerprint cache, store,
+        # snapshot archive and selection for the whole run
+        self.timer = StepTimer(time_budget, metrics, tab_budget, breaker_misses)
+        self.driver = create_driver(self.timer, page='kjgg')
+        self.metrics = metrics
+        self.cache = FingerprintCache(cache_path) if cache_path else None
+        self.store = LotteryStore(store_path) if store_path else None
+        self.archive = SnapshotArchive(archive_dir) if archive_dir else None
+        self.selection = selection or ScrapeSelection()
+
+        # The results scraper's kjgg snapshots also hold the prize blocks
+        self.results_scraper = LotteryResultsScraper(driver=self.driver, timer=self.timer,
+                                                     cache=self.cache, store=self.store, archive=self.archive,
+                                                     selection=self.selection)
+        self.prize_scraper = LotteryPrizeScraper(driver=self.driver, timer=self.timer, store=self.store,
+                                                 selection=self.selection)
+        self.selling_scraper = LotteryScraper(driver=self.driver, timer=self.timer, cache=self.cache,
+                                              store=self.store, archive=self.archive, selection=self.selection)
+
+    def scrape_kjgg(self):
+        # Results and prizes come from the same kjgg page, so each tab is
+        # clicked once and both extractors read it
+        log.info("Starting results and prize scraper...")
+        self.results_scraper.load_page()
+
+        try:
+            lottery_tabs = self.driver.find_elements(By.CSS_SELECTOR, ".m-cz-tit span")
+
+            for tab in lottery_tabs:
+                try:
+                    lottery_type = tab.text.strip()
+                    if lottery_type not in self.results_scraper.game_id_map:
+                        continue
+                    if not self.selection.wants_game(lottery_type):
+                        continue
+                    if self.timer.expired():
+                        self.timer.skip(lottery_type, self.timer.exhausted(), game=lottery_type)
+                        continue
+                    log.info("Processing lottery type: %s", lottery_type)
+
+                    with self.timer.scope(lottery_type):
+                        self.results_scraper.select_tab(tab, lottery_type)
+                        for issue in self.results_scraper.selected_issues(lottery_type):
+                            self.results_scraper.scrape_tab_results(lottery_type, issue)
+
+                        with self.timer.step('prize_extract', game=lottery_type):
+                            prize_data = self.prize_scraper.extract_prize_info(lottery_type)
+                    if prize_data:
+                        self.prize_scraper.write_prize(prize_data)
+
+                except Exception as e:
+                    log.error("Error processing lottery type %s: %s", lottery_type, e)
+                    self.timer.count('exceptions', where='scrape_kjgg', game=lottery_type)
+                    self.timer.skip(lottery_type, 'error', game=lottery_type)
+                    continue
+
+            self.prize_scraper.save_prizes()
+
+        except Exception as e:
+            log.error("Error occurred: %s", e)
+            self.timer.count('exceptions', where='scrape_kjgg')
+            self.driver.save_screenshot("error_screenshot.png")
+            log.error("Error screenshot saved as error_screenshot.png")
+
+        finally:
+            self.prize_scraper.abort_prizes()
+            self.results_scraper.print_round_trip_report()
+            self.results_scraper.save_cache()
+
+    def run(self):
+        try:
+            self.scrape_kjgg()
+            if self.timer.expired():
+                self.timer.skip('selling scraper', self.timer.exhausted())
+            else:
+                self.selling_scraper.scrape_match_data()
+        finally:
+            network_report(self.driver, self.timer)
+            self.timer.report()
+            if self.metrics is not None:
+                self.metrics.close([self.driver])
+            log.info("Closing browser...")
+            self.driver.quit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape results, prizes and selling data in one browser session")
+    parser.add_argument('--time-budget', type=float, help="Total seconds the run may take")
+    parser.add_argument('--tab-budget', type=float, help="Seconds each game type's tab may take")
+    parser.add_argument('--breaker-misses', type=int, default=3,
+                        help="Timeouts in a row after which a selector is no longer waited for")
+    parser.add_argument('--fingerprint-cache', help="Cache file used to skip unchanged periods and issues")
+    parser.add_argument('--store', help="SQLite store to upsert into instead of writing CSV files")
+    parser.add_argument('--snapshots', help="Archive directory for the markup of every visited tab state")
+    add_selection_arguments(parser)
+    parser.add_argument('--log-level', default='INFO', help="DEBUG also logs every parsed row")
+    parser.add_argument('--metrics-prom', help="Prometheus textfile to write step timings and counts to")
+    parser.add_argument('--metrics-jsonl', help="File to append every step span and count to as JSON lines")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(message)s')
+    metrics = None
+    if args.metrics_prom or args.metrics_jsonl:
+        from lottery_metrics import RunMetrics
+        metrics = RunMetrics('runner', args.metrics_prom, args.metrics_jsonl)
+
+    runner = LotteryRunner(time_budget=args.time_budget, cache_path=args.fingerprint_cache,
+                           store_path=args.store, archive_dir=args.snapshots, metrics=metrics,
+                           tab_budget=args.tab_budget, breaker_misses=args.breaker_misses,
+                           selection=selection_from_args(args))
+    runner.run()
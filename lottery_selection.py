@@ -0,0 +1,95 @@
+import re
+
+from lottery_store import store_column
+
+GAME_TYPES = ['胜负游戏', '任选9场', '6场半全场', '4场进球']
+
+SALE_STATUSES = ['在售奖期', '即将开售']
+
+
+def period_number(value):
+    # "24169期", "24169" and 24169 -> 24169
+    match = re.search(r'\d+', str(value or ''))
+    return int(match.group(0)) if match else None
+
+
+def parse_periods(values):
+    # ["24160-24165", "24170,24172"] -> {24160, ..., 24165, 24170, 24172}
+    periods = set()
+    for value in values:
+        for part in value.split(','):
+            start, _, end = part.strip().partition('-')
+            if not start:
+                continue
+            first, last = period_number(start), period_number(end or start)
+            periods.update(range(min(first, last), max(first, last) + 1))
+    return periods
+
+
+class ScrapeSelection:
+    def __init__(self, game_types=None, sale_statuses=None, periods=None, columns=None):
+        # None selects everything. Game types, sale statuses and periods
+        # (selling periods or result issues) decide which tabs are clicked;
+        # columns only trim the CSV files and the cells parsed for them.
+        self.game_types = list(game_types) if game_types else None
+        self.sale_statuses = list(sale_statuses) if sale_statuses else None
+        self.periods = set(periods) if periods else None
+        self.columns = {store_column(column) for column in columns} if columns else None
+
+    def complete(self):
+        # Every tab of the page is visited, so periods missing from the run
+        # have really closed
+        return self.game_types is None and self.sale_statuses is None and self.periods is None
+
+    def wants_game(self, game_type):
+        return self.game_types is None or game_type in self.game_types
+
+    def wants_status(self, status_text):
+        return self.sale_statuses is None or status_text in self.sale_statuses
+
+    def wants_period(self, period):
+        return self.periods is None or period_number(period) in self.periods
+
+    def select_games(self, game_types=GAME_TYPES):
+        # The selected game types in page order
+        return [game_type for game_type in game_types if self.wants_game(game_type)]
+
+    def wants_columns(self, columns):
+        return self.columns is None or any(store_column(column) in self.columns for column in columns)
+
+    def output_columns(self, columns, keys=()):
+        # The selected columns in file order; keys are always kept so
+        # trimmed files still join and import
+        if self.columns is None:
+            return columns
+        return [column for column in columns if column in keys or store_column(column) in self.columns]
+
+    def describe(self):
+        parts = [', '.join(self.game_types) if self.game_types else 'all game types']
+        if self.sale_statuses:
+            parts.append(', '.join(self.sale_statuses))
+        if self.periods:
+            parts.append(f"{len(self.periods)} periods")
+        return '; '.join(parts)
+
+
+def add_selection_arguments(parser, sale_status=True, periods=True):
+    # The filter flags shared by the scrapers' command lines
+    parser.add_argument('--game-type', action='append', choices=GAME_TYPES, dest='game_types',
+                        help="Game type to scrape (repeatable, default all)")
+    if sale_status:
+        parser.add_argument('--sale-status', action='append', choices=SALE_STATUSES, dest='sale_statuses',
+                            help="Sale status tab to scrape (repeatable, default both)")
+    if periods:
+        parser.add_argument('--period', action='append', dest='periods',
+                            help="Periods/issues to scrape, e.g. 24169 or 24160-24169,24172 (repeatable, default all)")
+    parser.add_argument('--columns', help="Comma-separated CSV columns to write (key columns are always kept)")
+
+
+def selection_from_args(args):
+    return ScrapeSelection(
+        game_types=args.game_types,
+        sale_statuses=getattr(args, 'sale_statuses', None),
+        periods=parse_periods(getattr(args, 'periods', None) or []),
+        columns=[column.strip() for column in args.columns.split(',') if column.strip()] if args.columns else None
+    )
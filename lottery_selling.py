@@ -1,284 +1,550 @@
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException
-import pandas as pd
-import time
+import argparse
+import logging
+import os
 from datetime import datetime
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
+from lottery_browser import create_driver, network_report, open_page
+from lottery_cache import FingerprintCache, markup_fingerprint
+from lottery_selection import ScrapeSelection, add_selection_arguments, selection_from_args
+from lottery_sink import CsvSink, SELLING_BET_COLUMNS, SELLING_KEY_COLUMNS, selling_columns
+from lottery_store import LotteryStore
+from lottery_waits import (By, StepTimer, WaitTimeout, wait_for_content, wait_for_document_ready, wait_located,
+                           content_hash)
+
+log = logging.getLogger(__name__)
+
+MATCH_GAME_TYPES = ['胜负游戏', '任选9场', '6场半全场', '4场进球']
+
+# Content that changes when a game type, sale status or period tab is selected
+TAB_CONTENT_SELECTOR = ".m-czNums, .m-czTab"
 
 class LotteryScraper:
-    def __init__(self):
-        # Initialize Chrome options
-        options = webdriver.ChromeOptions()
-        options.add_argument('--headless')
-        options.add_argument('--no-sandbox')
-        options.add_argument('--disable-dev-shm-usage')
-        options.add_argument('--disable-gpu')
-        options.add_argument('--window-size=1920,1080')
-        options.add_argument('--start-maximized')
-        options.add_argument('--enable-javascript')
-        options.add_argument('--disable-blink-features=AutomationControlled')
-        options.add_experimental_option('excludeSwitches', ['enable-automation'])
-        options.add_experimental_option('useAutomationExtension', False)
-        options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-        
-        service = Service(ChromeDriverManager().install())
-        self.driver = webdriver.Chrome(service=service, options=options)
+    def __init__(self, time_budget=None, driver=None, timer=None, cache=None, store=None, archive=None,
+                 selection=None):
+        # A driver passed in (e.g. by lottery_runner.py) is shared and is not
+        # quit by this scraper
+        self.owns_driver = driver is None
+        self.timer = timer or StepTimer(time_budget)
+        self.driver = driver or create_driver(self.timer, page='jsq')
         self.base_url = "https://www.sporttery.cn/ctzc/jsq/index.html"
         
+        # ScrapeSelection of the game types, sale statuses, periods and
+        # columns to scrape; tabs outside it are never clicked
+        self.selection = selection or ScrapeSelection()
+        
+        # Optional FingerprintCache; unchanged periods reuse their cached rows
+        self.cache = cache
+        self.changed_types = set()
+        
+        # Optional LotteryStore that replaces the CSV output
+        self.store = store
+        
+        # Optional SnapshotArchive keeping the markup of every period visited
+        self.archive = archive
+        
+        # Open CsvSink and rows written so far, by game type
+        self.sinks = {}
+        self.rows_by_type = {}
+        self.last_period_changed = True
+        
     def wait_for_element(self, by, value, timeout=10):
         try:
-            element = WebDriverWait(self.driver, timeout).until(
-                EC.presence_of_element_located((by, value))
-            )
+            element = wait_located(self.driver, by, value, self.timer.timeout(timeout, value))
+            self.timer.found(value)
             return element
-        except TimeoutException:
-            print(f"Timeout waiting for element: {value}")
+        except WaitTimeout:
+            log.warning("Timeout waiting for element: %s", value)
+            self.timer.missed(value)
             return None
 
     def wait_for_period_info(self, timeout=10):
         try:
-            WebDriverWait(self.driver, timeout).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, ".m-czNums li.on span"))
-            )
+            wait_located(self.driver, By.CSS_SELECTOR, ".m-czNums li.on span",
+                         self.timer.timeout(timeout, ".m-czNums li.on span"))
+            self.timer.found(".m-czNums li.on span")
             return True
-        except TimeoutException:
-            print("Timeout waiting for period information")
+        except WaitTimeout:
+            log.warning("Timeout waiting for period information")
+            self.timer.missed(".m-czNums li.on span")
             return False
 
-    def scrape_match_data(self):
-        print("Starting scraper...")
-        self.driver.get(self.base_url)
-        print("Page loaded, waiting for content...")
+    def load_page(self):
+        with self.timer.step('page_load'):
+            open_page(self.driver, self.base_url)
+            log.info("Page loaded, waiting for content...")
+            
+            is_ready = wait_for_document_ready(self.driver, self.timer.timeout(20))
+            log.debug("Page ready state: %s", is_ready)
+            
+            # Wait for specific element that indicates the page is fully loaded
+            try:
+                wait_located(self.driver, By.CSS_SELECTOR, ".m-sfcL", self.timer.timeout(20, ".m-sfcL"))
+                self.timer.found(".m-sfcL")
+                return True
+            except WaitTimeout:
+                log.warning("Timeout waiting for page to load completely")
+                self.timer.missed(".m-sfcL")
+                return False
+
+    def find_tabs(self, selector):
+        try:
+            tabs = wait_located(self.driver, By.CSS_SELECTOR, selector, self.timer.timeout(10, selector), 'all')
+        except WaitTimeout:
+            self.timer.missed(selector)
+            raise
+        self.timer.found(selector)
+        return tabs
+
+    def click_tab(self, tab, step, content_selector=TAB_CONTENT_SELECTOR, scroll=False, **labels):
+        # Click the tab and wait until the content it controls is shown
+        with self.timer.step(step, **labels):
+            previous = content_hash(self.driver, content_selector)
+            if scroll:
+                self.driver.execute_script("arguments[0].scrollIntoView(true);", tab)
+            self.driver.execute_script("arguments[0].click();", tab)
+            with self.timer.step('wait', **labels):
+                shown = wait_for_content(self.driver, content_selector, previous, tab,
+                                         timeout=self.timer.timeout(10, content_selector))
+            if shown is None:
+                self.timer.missed(content_selector, **labels)
+            else:
+                self.timer.found(content_selector)
+
+    def period_text(self, period_tab):
+        return period_tab.find_element(By.TAG_NAME, "span").text.strip() + "期"
+
+    def select_game_type(self, game_type):
+        for tab in self.find_tabs(".m-czTitle-l li"):
+            if tab.text.strip() == game_type:
+                self.click_tab(tab, 'game_tab', scroll=True, game=game_type)
+                return True
+        log.warning("Game type tab not found: %s", game_type)
+        return False
+
+    def select_sale_status(self, status_text):
+        for status_tab in self.find_tabs(".m-zstab li"):
+            if status_tab.text.strip() == status_text:
+                self.click_tab(status_tab, 'status_tab', status=status_text)
+                return True
+        log.warning("Sale status tab not found: %s", status_text)
+        return False
+
+    def select_period(self, period_info):
+        for period_tab in self.find_tabs(".m-czNums li"):
+            if self.period_text(period_tab) == period_info:
+                self.click_tab(period_tab, 'period_tab', content_selector=".m-czTab", period=period_info)
+                return True
+        log.warning("Period tab not found: %s", period_info)
+        return False
+
+    def list_work_items(self, game_types=MATCH_GAME_TYPES):
+        # Every selected (game type, sale status, period) page state, in page order
+        work_items = []
+        for game_type in game_types:
+            try:
+                if not self.select_game_type(game_type):
+                    continue
+                status_texts = [status_tab.text.strip() for status_tab in self.find_tabs(".m-zstab li")]
+                for status_text in status_texts:
+                    if not self.selection.wants_status(status_text) or not self.select_sale_status(status_text):
+                        continue
+                    for period_tab in self.find_tabs(".m-czNums li"):
+                        period_info = self.period_text(period_tab)
+                        if self.selection.wants_period(period_info):
+                            work_items.append((game_type, status_text, period_info))
+            except Exception as e:
+                log.warning("Error listing periods for %s: %s", game_type, e)
+                self.timer.count('exceptions', where='list_work_items', game=game_type)
+                continue
+        return work_items
+
+    def parse_row(self, game_type_text, status_text, period_info, deadline_time, sale_time, row):
+        # One table row as a match dict, None for rows that are not matches
+        cells = row.find_elements(By.TAG_NAME, "td")
+        if len(cells) < 5:
+            return None
+
+        # Basic match data with deadline time
+        match_data = {
+            'period': period_info,
+            'sale_status': status_text,
+            'deadline_time': deadline_time,
+            'sale_time': sale_time,
+            'match_num': cells[0].text.strip(),
+            'league': cells[1].find_element(By.TAG_NAME, "span").text.strip(),
+            'start_time': cells[2].text.strip()
+        }
+
+        # Get team names
+        team_div = cells[3].find_element(By.CLASS_NAME, "team")
+        teams_text = team_div.text.strip()
+        if "VS" in teams_text:
+            home, away = teams_text.split("VS")
+            match_data['home_team'] = home.strip()
+            match_data['away_team'] = away.strip()
+
+        # Odds cells are only read when their columns are written
+        if not self.wants_odds(game_type_text):
+            return match_data
+
+        # Handle different game types
+        if game_type_text in ['胜负游戏', '任选9场']:
+            try:
+                odds = cells[4].find_elements(By.CSS_SELECTOR, ".tdDiv span em")
+                if len(odds) >= 3:
+                    match_data.update({
+                        'bet_win': odds[0].text.strip(),
+                        'bet_draw': odds[1].text.strip(),
+                        'bet_lose': odds[2].text.strip()
+                    })
+            except Exception as e:
+                log.warning("Error getting odds: %s", e)
+                self.timer.count('exceptions', where='odds', game=game_type_text)
+
+        elif game_type_text == '6场半全场':
+            try:
+                betting_divs = cells[5].find_elements(By.CSS_SELECTOR, ".tdDiv")
+                if len(betting_divs) == 2:
+                    half_time = betting_divs[0].find_elements(By.CSS_SELECTOR, "span em")
+                    full_time = betting_divs[1].find_elements(By.CSS_SELECTOR, "span em")
+
+                    if len(half_time) >= 3:
+                        match_data.update({
+                            'half_win': half_time[0].text.strip(),
+                            'half_draw': half_time[1].text.strip(),
+                            'half_lose': half_time[2].text.strip()
+                        })
+
+                    if len(full_time) >= 3:
+                        match_data.update({
+                            'full_win': full_time[0].text.strip(),
+                            'full_draw': full_time[1].text.strip(),
+                            'full_lose': full_time[2].text.strip()
+                        })
+            except Exception as e:
+                log.warning("Error getting half/full time odds: %s", e)
+                self.timer.count('exceptions', where='odds', game=game_type_text)
+
+        elif game_type_text == '4场进球':
+            try:
+                betting_divs = cells[5].find_elements(By.CSS_SELECTOR, ".tdDiv")
+                if len(betting_divs) == 2:
+                    home_goals = betting_divs[0].find_elements(By.CSS_SELECTOR, "span em")
+                    away_goals = betting_divs[1].find_elements(By.CSS_SELECTOR, "span em")
+
+                    for i, val in enumerate(['0', '1', '2', '3+']):
+                        if i < len(home_goals):
+                            match_data[f'home_goals_{val}'] = home_goals[i].text.strip()
+                        if i < len(away_goals):
+                            match_data[f'away_goals_{val}'] = away_goals[i].text.strip()
+            except Exception as e:
+                log.warning("Error getting goals odds: %s", e)
+                self.timer.count('exceptions', where='odds', game=game_type_text)
+
+        return match_data
+
+    def wants_odds(self, game_type):
+        # The store keeps whole rows, so odds are always read for it
+        return self.store is not None or self.selection.wants_columns(SELLING_BET_COLUMNS.get(game_type, []))
+
+    def extract_period(self, game_type_text, status_text, period_info):
+        # Rows of the period table that is currently shown
+        matches = []
         
-        # Wait for JavaScript to load
-        time.sleep(10)  # Increased wait time
+        # Get deadline/sale time
+        try:
+            time_element = wait_located(self.driver, By.CSS_SELECTOR, ".m-czTime-r.f-fr",
+                                        self.timer.timeout(5, ".m-czTime-r.f-fr"))
+            self.timer.found(".m-czTime-r.f-fr")
+            time_text = time_element.text.strip()
+            
+            # Update time info based on sale status
+            if status_text == "即将开售":
+                sale_time = time_text.replace('开售时间：', '')
+                deadline_time = ''
+            else:  # 在售奖期
+                deadline_time = time_text.replace('投注截止时间：', '')
+                sale_time = ''
+                
+        except WaitTimeout:
+            log.warning("Timeout waiting for time info")
+            self.timer.missed(".m-czTime-r.f-fr", game=game_type_text)
+            deadline_time = ''
+            sale_time = ''
+        except Exception as e:
+            log.warning("Error getting time info: %s", e)
+            self.timer.count('exceptions', where='time_info', game=game_type_text)
+            deadline_time = ''
+            sale_time = ''
         
-        # Execute JavaScript to check if page is ready
-        is_ready = self.driver.execute_script("return document.readyState") == "complete"
-        print(f"Page ready state: {is_ready}")
+        # Process matches table
+        labels = {'game': game_type_text, 'status': status_text, 'period': period_info}
+        with self.timer.step('table_extract', **labels):
+            try:
+                table = wait_located(self.driver, By.CSS_SELECTOR, ".m-czTab", self.timer.timeout(10, ".m-czTab"),
+                                     'visibility')
+            except WaitTimeout:
+                self.timer.missed(".m-czTab", **labels)
+                raise
+            self.timer.found(".m-czTab")
+            
+            rows = table.find_elements(By.CSS_SELECTOR, "tbody tr:not([style*='display: none'])")
+            log.info("Found %d match rows for period %s (%s)", len(rows), period_info, status_text)
+            
+            for row in rows:
+                try:
+                    with self.timer.step('row_parse', **labels):
+                        match_data = self.parse_row(game_type_text, status_text, period_info,
+                                                    deadline_time, sale_time, row)
+                    if match_data is None:
+                        continue
+                    matches.append(match_data)
+                    log.debug("Processed match: Period %s - %s vs %s", period_info,
+                              match_data.get('home_team', ''), match_data.get('away_team', ''))
+
+                except Exception as e:
+                    log.warning("Error processing match row: %s", e)
+                    self.timer.count('exceptions', where='row_parse', game=game_type_text)
+                    continue
         
-        # Wait for specific element that indicates the page is fully loaded
-        try:
-            WebDriverWait(self.driver, 20).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, ".m-sfcL"))
-            )
-        except TimeoutException:
-            print("Timeout waiting for page to load completely")
+        return matches
+
+    def scrape_period(self, game_type_text, status_text, period_info):
+        if self.archive is not None:
+            self.archive.capture(self.driver, 'jsq', game_type_text, status_text, period_info)
+        
+        self.last_period_changed = True
+        if self.cache is None:
+            return self.extract_period(game_type_text, status_text, period_info)
+        
+        key = self.cache.key('jsq', game_type_text, status_text, period_info)
+        fingerprint = markup_fingerprint(self.driver, ".m-czTab", ".m-czTime-r.f-fr")
+        matches = self.cache.lookup(key, fingerprint)
+        if matches is not None:
+            log.info("Period %s (%s) unchanged, reusing %d cached rows", period_info, status_text, len(matches))
+            self.last_period_changed = False
+            return matches
+        
+        matches = self.extract_period(game_type_text, status_text, period_info)
+        # Rows without their odds would be reused by later full runs
+        if self.wants_odds(game_type_text):
+            self.cache.store(key, fingerprint, matches)
+        self.changed_types.add(game_type_text)
+        return matches
+
+    def save_cache(self):
+        if self.cache is not None:
+            # Periods missing from a complete sweep have closed; drop them.
+            # A sweep with skipped or unselected work says nothing about what
+            # is missing.
+            complete = self.selection.complete() and not (self.timer.expired() or self.timer.skipped)
+            self.cache.evict('jsq' if complete else None)
+            self.cache.save()
+
+    def selling_filename(self, game_type):
+        return f'lottery_selling_{game_type}_{datetime.now().strftime("%Y%m%d")}.csv'
+
+    def write_period(self, game_type, matches, changed=True):
+        # Rows of one period go out as soon as its table is parsed: upserted
+        # into the store, or appended to the game type's CSV file
+        self.rows_by_type[game_type] = self.rows_by_type.get(game_type, 0) + len(matches)
+        if self.store is not None:
+            if changed and matches:
+                with self.timer.step('store_write', game=game_type):
+                    self.store.upsert_selling(game_type, matches, datetime.now().strftime("%Y%m%d"))
             return
+        with self.timer.step('file_write', game=game_type):
+            if game_type not in self.sinks:
+                columns = self.selection.output_columns(selling_columns(game_type), SELLING_KEY_COLUMNS)
+                self.sinks[game_type] = CsvSink(self.selling_filename(game_type), columns)
+            self.sinks[game_type].write(matches)
+            self.sinks[game_type].flush()
+
+    def finish_game_type(self, game_type):
+        # Renames the game type's file into place once all its periods are written
+        rows = self.rows_by_type.pop(game_type, 0)
+        sink = self.sinks.pop(game_type, None)
+        self.timer.count('rows', rows, game=game_type)
+        if not rows:
+            if sink is not None:
+                sink.discard()
+            log.info("No matches found for %s", game_type)
+        elif self.store is not None:
+            log.info("Upserted %d matches for %s into %s", rows, game_type, self.store.path)
+        elif self.cache is not None and game_type not in self.changed_types and os.path.exists(sink.path):
+            sink.discard()
+            log.info("No changes for %s, keeping saved data", game_type)
+        else:
+            with self.timer.step('file_write', game=game_type):
+                sink.commit()
+            log.info("Data saved to %s (%d matches)", sink.path, rows)
+
+    def abort_sinks(self):
+        # Files of game types that did not finish stay as valid .part files
+        for sink in self.sinks.values():
+            sink.abort()
+        self.sinks = {}
+        self.rows_by_type = {}
+
+    def save_matches(self, matches_by_type):
+        # Whole game types at once, for scrapers that collect rows first
+        # (lottery_parallel.py merges its workers' rows in page order)
+        try:
+            for game_type, matches in matches_by_type.items():
+                changed = self.cache is None or game_type in self.changed_types
+                self.write_period(game_type, matches, changed)
+                self.finish_game_type(game_type)
+        finally:
+            self.abort_sinks()
+
+    def scrape_game_type(self, tab, game_type_text):
+        # The selected sale statuses and periods, within the game type's
+        # scope budget; what does not fit is recorded as skipped
+        self.click_tab(tab, 'game_tab', scroll=True, game=game_type_text)
         
-        current_date = datetime.now().strftime("%Y%m%d")
-        matches_by_type = {
-            '胜负游戏': [],
-            '任选9场': [],
-            '6场半全场': [],
-            '4场进球': []
-        }
+        # Find and process both sale status tabs
+        sale_status_tabs = self.find_tabs(".m-zstab li")
+        
+        for status_tab in sale_status_tabs:
+            try:
+                status_text = status_tab.text.strip()
+                if not self.selection.wants_status(status_text):
+                    continue
+                if self.timer.expired():
+                    self.timer.skip(f"{game_type_text} {status_text}", self.timer.exhausted(), game=game_type_text)
+                    continue
+                log.info("Processing %s", status_text)
+                self.click_tab(status_tab, 'status_tab', game=game_type_text, status=status_text)
+                
+                # Get all period tabs for this status
+                period_tabs = self.find_tabs(".m-czNums li")
+                
+                # Process each period
+                for period_tab in period_tabs:
+                    try:
+                        period_info = self.period_text(period_tab)
+                        if not self.selection.wants_period(period_info):
+                            continue
+                        if self.timer.expired():
+                            self.timer.skip(f"{game_type_text} {status_text} {period_info}",
+                                            self.timer.exhausted(), game=game_type_text)
+                            continue
+                        log.info("Processing period: %s", period_info)
+                        
+                        self.click_tab(period_tab, 'period_tab', content_selector=".m-czTab",
+                                       game=game_type_text, status=status_text, period=period_info)
+                        matches = self.scrape_period(game_type_text, status_text, period_info)
+                        self.write_period(game_type_text, matches, self.last_period_changed)
+                        
+                    except Exception as e:
+                        log.warning("Error processing period tab: %s", e)
+                        self.timer.count('exceptions', where='period_tab', game=game_type_text)
+                        self.timer.skip(f"{game_type_text} {status_text} {period_info}", 'error',
+                                        game=game_type_text)
+                        continue
+                    
+            except Exception as e:
+                log.warning("Error processing sale status tab %s: %s", status_text, e)
+                self.timer.count('exceptions', where='status_tab', game=game_type_text)
+                self.timer.skip(f"{game_type_text} {status_text}", 'error', game=game_type_text)
+                continue
+
+    def scrape_match_data(self):
+        log.info("Starting scraper (%s)...", self.selection.describe())
+        if not self.load_page():
+            if self.owns_driver:
+                network_report(self.driver, self.timer)
+                self.timer.report()
+            return
         
         try:
             # Wait for game type tabs
-            tabs = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_all_elements_located((By.CSS_SELECTOR, ".m-czTitle-l li"))
-            )
-            print(f"Found {len(tabs)} tabs")
+            tabs = self.find_tabs(".m-czTitle-l li")
+            log.info("Found %d tabs", len(tabs))
             
             for tab in tabs:
                 try:
                     game_type_text = tab.text.strip()
-                    if not game_type_text in matches_by_type:
+                    if game_type_text not in MATCH_GAME_TYPES or not self.selection.wants_game(game_type_text):
+                        continue
+                    if self.timer.expired():
+                        self.timer.skip(game_type_text, self.timer.exhausted(), game=game_type_text)
                         continue
                     
-                    print(f"\nProcessing game type: {game_type_text}")
-                    
-                    # Click game type tab
-                    self.driver.execute_script("arguments[0].scrollIntoView(true);", tab)
-                    time.sleep(2)
-                    self.driver.execute_script("arguments[0].click();", tab)
-                    time.sleep(3)
-                    
-                    # Find and process both sale status tabs
-                    sale_status_tabs = WebDriverWait(self.driver, 10).until(
-                        EC.presence_of_all_elements_located((By.CSS_SELECTOR, ".m-zstab li"))
-                    )
-                    
-                    for status_tab in sale_status_tabs:
-                        try:
-                            status_text = status_tab.text.strip()
-                            print(f"Processing {status_text}")
-                            
-                            # Click sale status tab
-                            self.driver.execute_script("arguments[0].click();", status_tab)
-                            time.sleep(3)
-                            
-                            # Get all period tabs for this status
-                            period_tabs = WebDriverWait(self.driver, 10).until(
-                                EC.presence_of_all_elements_located((By.CSS_SELECTOR, ".m-czNums li"))
-                            )
-                            
-                            # Process each period
-                            for period_tab in period_tabs:
-                                try:
-                                    period_span = period_tab.find_element(By.TAG_NAME, "span")
-                                    period_info = period_span.text.strip() + "期"
-                                    print(f"Processing period: {period_info}")
-                                    
-                                    # Click period tab and wait
-                                    self.driver.execute_script("arguments[0].click();", period_tab)
-                                    time.sleep(3)
-                                    
-                                    # Get deadline/sale time
-                                    try:
-                                        time_element = WebDriverWait(self.driver, 5).until(
-                                            EC.presence_of_element_located((By.CSS_SELECTOR, ".m-czTime-r.f-fr"))
-                                        )
-                                        time_text = time_element.text.strip()
-                                        
-                                        # Update time info based on sale status
-                                        if status_text == "即将开售":
-                                            sale_time = time_text.replace('开售时间：', '')
-                                            deadline_time = ''
-                                        else:  # 在售奖期
-                                            deadline_time = time_text.replace('投注截止时间：', '')
-                                            sale_time = ''
-                                            
-                                    except Exception as e:
-                                        print(f"Error getting time info: {str(e)}")
-                                        deadline_time = ''
-                                        sale_time = ''
-                                    
-                                    # Process matches table
-                                    try:
-                                        table = WebDriverWait(self.driver, 10).until(
-                                            EC.visibility_of_element_located((By.CSS_SELECTOR, ".m-czTab"))
-                                        )
-                                        
-                                        rows = table.find_elements(By.CSS_SELECTOR, "tbody tr:not([style*='display: none'])")
-                                        print(f"Found {len(rows)} match rows for period {period_info} ({status_text})")
-                                        
-                                        for row in rows:
-                                            try:
-                                                cells = row.find_elements(By.TAG_NAME, "td")
-                                                if len(cells) < 5:
-                                                    continue
-                                                
-                                                # Basic match data with deadline time
-                                                match_data = {
-                                                    'period': period_info,
-                                                    'sale_status': status_text,
-                                                    'deadline_time': deadline_time,
-                                                    'sale_time': sale_time,
-                                                    'match_num': cells[0].text.strip(),
-                                                    'league': cells[1].find_element(By.TAG_NAME, "span").text.strip(),
-                                                    'start_time': cells[2].text.strip()
-                                                }
-                                                
-                                                # Get team names
-                                                team_div = cells[3].find_element(By.CLASS_NAME, "team")
-                                                teams_text = team_div.text.strip()
-                                                if "VS" in teams_text:
-                                                    home, away = teams_text.split("VS")
-                                                    match_data['home_team'] = home.strip()
-                                                    match_data['away_team'] = away.strip()
-                                                
-                                                # Handle different game types
-                                                if game_type_text in ['胜负游戏', '任选9场']:
-                                                    try:
-                                                        odds = cells[4].find_elements(By.CSS_SELECTOR, ".tdDiv span em")
-                                                        if len(odds) >= 3:
-                                                            match_data.update({
-                                                                'bet_win': odds[0].text.strip(),
-                                                                'bet_draw': odds[1].text.strip(),
-                                                                'bet_lose': odds[2].text.strip()
-                                                            })
-                                                    except Exception as e:
-                                                        print(f"Error getting odds: {str(e)}")
-                                                
-                                                elif game_type_text == '6场半全场':
-                                                    try:
-                                                        betting_divs = cells[5].find_elements(By.CSS_SELECTOR, ".tdDiv")
-                                                        if len(betting_divs) == 2:
-                                                            half_time = betting_divs[0].find_elements(By.CSS_SELECTOR, "span em")
-                                                            full_time = betting_divs[1].find_elements(By.CSS_SELECTOR, "span em")
-                                                            
-                                                            if len(half_time) >= 3:
-                                                                match_data.update({
-                                                                    'half_win': half_time[0].text.strip(),
-                                                                    'half_draw': half_time[1].text.strip(),
-                                                                    'half_lose': half_time[2].text.strip()
-                                                                })
-                                                            
-                                                            if len(full_time) >= 3:
-                                                                match_data.update({
-                                                                    'full_win': full_time[0].text.strip(),
-                                                                    'full_draw': full_time[1].text.strip(),
-                                                                    'full_lose': full_time[2].text.strip()
-                                                                })
-                                                    except Exception as e:
-                                                        print(f"Error getting half/full time odds: {str(e)}")
-                                                
-                                                elif game_type_text == '4场进球':
-                                                    try:
-                                                        betting_divs = cells[5].find_elements(By.CSS_SELECTOR, ".tdDiv")
-                                                        if len(betting_divs) == 2:
-                                                            home_goals = betting_divs[0].find_elements(By.CSS_SELECTOR, "span em")
-                                                            away_goals = betting_divs[1].find_elements(By.CSS_SELECTOR, "span em")
-                                                            
-                                                            for i, val in enumerate(['0', '1', '2', '3+']):
-                                                                if i < len(home_goals):
-                                                                    match_data[f'home_goals_{val}'] = home_goals[i].text.strip()
-                                                                if i < len(away_goals):
-                                                                    match_data[f'away_goals_{val}'] = away_goals[i].text.strip()
-                                                    except Exception as e:
-                                                        print(f"Error getting goals odds: {str(e)}")
-                                                
-                                                matches_by_type[game_type_text].append(match_data)
-                                                print(f"Processed match: Period {period_info} - {match_data.get('home_team', '')} vs {match_data.get('away_team', '')}")
-                                                
-                                            except Exception as e:
-                                                print(f"Error processing match row: {str(e)}")
-                                                continue
-                                            
-                                    except Exception as e:
-                                        print(f"Error processing table for period {period_info}: {str(e)}")
-                                        continue
-                                    
-                                except Exception as e:
-                                    print(f"Error processing period tab: {str(e)}")
-                                    continue
-                                
-                        except Exception as e:
-                            print(f"Error processing sale status tab {status_text}: {str(e)}")
-                            continue
+                    log.info("Processing game type: %s", game_type_text)
+                    with self.timer.scope(game_type_text):
+                        self.scrape_game_type(tab, game_type_text)
                         
                 except Exception as e:
-                    print(f"Error processing game type {game_type_text}: {str(e)}")
-                    continue
+                    log.warning("Error processing game type %s: %s", game_type_text, e)
+                    self.timer.count('exceptions', where='game_tab', game=game_type_text)
+                    self.timer.skip(game_type_text, 'error', game=game_type_text)
+                
+                # Each game type's file is complete once its periods are done
+                self.finish_game_type(game_type_text)
             
-            # Save results
-            for game_type, matches in matches_by_type.items():
-                if matches:
-                    print(f"\nSaving {len(matches)} matches for {game_type}...")
-                    df = pd.DataFrame(matches)
-                    filename = f'lottery_selling_{game_type}_{current_date}.csv'
-                    df.to_csv(filename, index=False, encoding='utf-8-sig')
-                    print(f"Data saved to {filename}")
-                else:
-                    print(f"\nNo matches found for {game_type}")
+            self.save_cache()
                     
         except Exception as e:
-            print(f"Error occurred: {str(e)}")
-            print(self.driver.page_source[:1000])
+            log.error("Error occurred: %s", e)
+            self.timer.count('exceptions', where='scrape_match_data')
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug(self.driver.page_source[:1000])
             
         finally:
-            print("\nClosing browser...")
-            self.driver.quit()
+            self.abort_sinks()
+            if self.owns_driver:
+                network_report(self.driver, self.timer)
+                self.timer.report()
+                log.info("Closing browser...")
+                self.driver.quit()
 
     def run(self):
         self.scrape_match_data()
 
 if __name__ == "__main__":
-    scraper = LotteryScraper()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backend', choices=['browser', 'http'], default='browser')
+    parser.add_argument('--base-url', help="Feed URL for the http backend, e.g. lottery_fixture_server.py")
+    parser.add_argument('--time-budget', type=float, help="Total seconds the browser run may take")
+    parser.add_argument('--tab-budget', type=float,
+                        help="Seconds each game type's tab (each period with --workers) may take")
+    parser.add_argument('--breaker-misses', type=int, default=3,
+                        help="Timeouts in a row after which a selector is no longer waited for")
+    parser.add_argument('--workers', type=int, default=1, help="Browser sessions scraping periods in parallel")
+    parser.add_argument('--fingerprint-cache', help="Cache file used to skip periods whose table is unchanged")
+    parser.add_argument('--store', help="SQLite store to upsert into instead of writing CSV files")
+    parser.add_argument('--snapshots', help="Archive directory for the markup of every visited period")
+    add_selection_arguments(parser)
+    parser.add_argument('--log-level', default='INFO', help="DEBUG also logs every parsed row")
+    parser.add_argument('--metrics-prom', help="Prometheus textfile to write step timings and counts to")
+    parser.add_argument('--metrics-jsonl', help="File to append every step span and count to as JSON lines")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(message)s')
+    metrics = None
+    if args.metrics_prom or args.metrics_jsonl:
+        from lottery_metrics import RunMetrics
+        metrics = RunMetrics('selling', args.metrics_prom, args.metrics_jsonl)
+
+    store = LotteryStore(args.store) if args.store else None
+    selection = selection_from_args(args)
+    if args.backend == 'http':
+        from lottery_http import HttpLotteryScraper, API_BASE_URL
+        scraper = HttpLotteryScraper(args.base_url or API_BASE_URL, store=store, selection=selection)
+    elif args.workers > 1:
+        from lottery_parallel import ParallelLotteryScraper
+        scraper = ParallelLotteryScraper(workers=args.workers, time_budget=args.time_budget,
+                                         cache_path=args.fingerprint_cache, store_path=args.store,
+                                         archive_dir=args.snapshots, metrics=metrics,
+                                         tab_budget=args.tab_budget, breaker_misses=args.breaker_misses,
+                                         selection=selection)
+    else:
+        from lottery_snapshots import SnapshotArchive
+        cache = FingerprintCache(args.fingerprint_cache) if args.fingerprint_cache else None
+        archive = SnapshotArchive(args.snapshots) if args.snapshots else None
+        timer = StepTimer(args.time_budget, metrics, args.tab_budget, args.breaker_misses)
+        scraper = LotteryScraper(timer=timer, cache=cache, store=store, archive=archive, selection=selection)
     scraper.run()
+
+    if metrics is not None:
+        metrics.close([worker.driver for worker in getattr(scraper, 'scrapers', [scraper]) if hasattr(worker, 'driver')])
@@ -0,0 +1,317 @@
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from math import comb
+
+import numpy as np
+
+from lottery_selection import period_number
+from lottery_store import read_csv_rows
+from lottery_tickets import GAME_SLOTS, PRIZE_TIERS, RX9_MATCHES, encode_results, option_bits, parse_amount
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = 'simulations'
+
+# Share of sales paid out as prizes, each tier's share of that, and the cap on
+# one bet's prize. The first prize also gets the rolled-over pool.
+PRIZE_FUND_RATE = 0.64
+TIER_SHARES = {
+    '胜负游戏': [0.7, 0.3],
+    '任选9场': [1.0],
+    '6场半全场': [1.0],
+    '4场进球': [1.0]
+}
+PRIZE_CAP = 5000000
+BET_PRICE = 2
+
+# Outcome slots per match on the selling page
+SLOTS_PER_MATCH = {'胜负游戏': 1, '任选9场': 1, '6场半全场': 2, '4场进球': 2}
+
+# Single-option bitmask -> option index (3/1/0, or 0/1/2/3+ goals)
+MASK_INDEX = {1: 0, 2: 1, 4: 2, 8: 3}
+
+
+def outcome_frequencies(game_type, issues, prior_weight=10):
+    # (slots, options) outcome probabilities from past issues' results rows.
+    # Each slot's own counts are smoothed toward the game-wide frequencies
+    # with prior_weight pseudo-draws, so slots with little history stay close
+    # to the average and no option gets probability 0.
+    options = len(option_bits(game_type))
+    counts = np.zeros((GAME_SLOTS[game_type], options))
+    for rows in issues:
+        try:
+            masks = encode_results(game_type, rows)
+        except ValueError as e:
+            log.warning("Skipping %s issue %s: %s", game_type,
+                        rows[0].get('Period', rows[0].get('issue')) if rows else '?', e)
+            continue
+        for slot, mask in enumerate(masks):
+            # Cancelled matches count for every option and say nothing
+            if int(mask) in MASK_INDEX:
+                counts[slot, MASK_INDEX[int(mask)]] += 1
+
+    overall = counts.sum(axis=0) + 1
+    overall /= overall.sum()
+    return (counts + prior_weight * overall) / (counts.sum(axis=1, keepdims=True) + prior_weight)
+
+
+def sample_outcomes(rng, probs, size):
+    # (size, slots) option indexes, each slot drawn from its own distribution
+    cumulative = np.cumsum(probs, axis=1)[:, :-1]
+    draws = rng.random((size, probs.shape[0]))
+    return (draws[:, :, np.newaxis] > cumulative[np.newaxis]).sum(axis=2)
+
+
+def win_probabilities(game_type, hit):
+    # hit: (batch, slots) probability that a bet picks each drawn outcome.
+    # Returns (batch, tiers): the chance that one bet wins each tier.
+    if game_type == '任选9场':
+        # A bet plays 9 of the 14 matches; the winning 9-match subsets are
+        # the 9th elementary symmetric polynomial of the hit probabilities
+        subsets = [np.ones(hit.shape[0])] + [np.zeros(hit.shape[0]) for _ in range(RX9_MATCHES)]
+        for j in range(hit.shape[1]):
+            for k in range(RX9_MATCHES, 0, -1):
+                subsets[k] += hit[:, j] * subsets[k - 1]
+        return (subsets[RX9_MATCHES] / comb(hit.shape[1], RX9_MATCHES))[:, np.newaxis]
+
+    all_hit = hit.prod(axis=1)
+    if game_type == '胜负游戏':
+        # Second prize: exactly one slot missed
+        one_missed = all_hit * ((1 - hit) / hit).sum(axis=1)
+        return np.stack([all_hit, one_missed], axis=1)
+    return all_hit[:, np.newaxis]
+
+
+def simulate(game_type, probs, bets, pool=0.0, samples=1000000, seed=None, batch_size=200000, picks=None):
+    # Draws `samples` outcome vectors in batches and, for each, the number of
+    # winning bets per tier and the prize per winning bet. Bettors pick each
+    # option with the probabilities in picks (by default the outcome
+    # probabilities themselves), so a winning bet count is Poisson with mean
+    # bets * chance of one bet winning.
+    rng = np.random.default_rng(seed)
+    picks = probs if picks is None else picks
+    shares = np.array(TIER_SHARES[game_type])
+    funds = bets * BET_PRICE * PRIZE_FUND_RATE * shares
+    funds[0] += pool
+    slots = np.arange(probs.shape[0])
+
+    winners = np.zeros((samples, len(shares)), dtype=np.int64)
+    payouts = np.full((samples, len(shares)), np.nan)
+    for start in range(0, samples, batch_size):
+        size = min(batch_size, samples - start)
+        outcomes = sample_outcomes(rng, probs, size)
+        chances = win_probabilities(game_type, picks[slots, outcomes])
+        counts = rng.poisson(bets * chances)
+        winners[start:start + size] = counts
+        with np.errstate(divide='ignore', invalid='ignore'):
+            payouts[start:start + size] = np.where(counts > 0, np.minimum(funds / counts, PRIZE_CAP), np.nan)
+    return {'tiers': PRIZE_TIERS[game_type], 'winners': winners, 'payouts': payouts}
+
+
+def summarize(simulation):
+    # Per tier: winner count and prize per winner (where anyone won) percentiles
+    summary = {}
+    for index, tier in enumerate(simulation['tiers']):
+        winners = simulation['winners'][:, index]
+        payouts = simulation['payouts'][:, index]
+        payouts = payouts[~np.isnan(payouts)]
+        summary[tier] = {
+            'winners_mean': float(winners.mean()),
+            'winners_p5': float(np.percentile(winners, 5)),
+            'winners_p50': float(np.percentile(winners, 50)),
+            'winners_p95': float(np.percentile(winners, 95)),
+            'no_winner_rate': float((winners == 0).mean()),
+            'payout_mean': float(payouts.mean()) if len(payouts) else None,
+            'payout_p5': float(np.percentile(payouts, 5)) if len(payouts) else None,
+            'payout_p50': float(np.percentile(payouts, 50)) if len(payouts) else None,
+            'payout_p95': float(np.percentile(payouts, 95)) if len(payouts) else None,
+            'capped_rate': float((payouts >= PRIZE_CAP).mean()) if len(payouts) else None
+        }
+    return summary
+
+
+class SimulationCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        # One JSON file per game type and issue, holding the summaries of the
+        # parameter sets simulated for it
+        self.cache_dir = cache_dir
+
+    def path(self, game_type, issue):
+        return os.path.join(self.cache_dir, f"{game_type}_{issue}.json")
+
+    def key(self, probs, **params):
+        data = json.dumps({'probs': np.round(probs, 6).tolist(), **params}, sort_keys=True)
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+    def read(self, game_type, issue):
+        path = self.path(game_type, issue)
+        if not os.path.exists(path):
+            return {}
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def get(self, game_type, issue, key):
+        return self.read(game_type, issue).get(key)
+
+    def put(self, game_type, issue, key, summary):
+        entries = self.read(game_type, issue)
+        entries[key] = summary
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self.path(game_type, issue)}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path(game_type, issue))
+
+
+def open_issue(game_type, paths):
+    # (issue, match rows) of the open period in the newest selling file, the
+    # one whose sale closes first
+    files = sorted(path for path in paths if re.search(rf'lottery_selling_{game_type}_\d{{8}}\.csv$', path))
+    if not files:
+        return None, []
+    periods = {}
+    for row in read_csv_rows(files[-1]):
+        if row.get('sale_status') in (None, '在售奖期'):
+            periods.setdefault(period_number(row.get('period')), []).append(row)
+    if not periods:
+        return None, []
+    issue = min(periods)
+    return issue, periods[issue]
+
+
+def history_issues(game_type, paths, store=None):
+    # Results rows of every past issue, by issue
+    issues = {}
+    if store is not None:
+        for row in store.query("SELECT * FROM results WHERE game = ? ORDER BY issue, CAST(match_number AS INTEGER)",
+                               (game_type,)):
+            issues.setdefault(row['issue'], []).append(row)
+    for path in paths:
+        match = re.search(rf'lottery_results_{game_type}_(\d+)\.csv$', path)
+        if match:
+            issues.setdefault(match.group(1), read_csv_rows(path))
+    return [issues[issue] for issue in sorted(issues)]
+
+
+def latest_prize_row(game_type, paths):
+    rows = [row for path in paths if re.search(r'lottery_prizes_\d{8}\.csv$', path)
+            for row in read_csv_rows(path) if row.get('Game_Type') == game_type]
+    return max(rows, key=lambda row: period_number(row.get('Issue_Number')) or 0, default=None)
+
+
+def implied_sales(game_type, prize_row):
+    # Sales of an issue from its prize counts and amounts: a tier's winners
+    # times their prize is its share of the prize fund. Capped prizes and the
+    # first prize of an issue with a rolled-over pool say less, so the last
+    # uncapped tier is preferred.
+    estimates = []
+    for tier, share in zip(PRIZE_TIERS[game_type], TIER_SHARES[game_type]):
+        count, amount = parse_amount(prize_row.get(f'{tier}_Count')), parse_amount(prize_row.get(f'{tier}_Amount'))
+        if count and amount and amount < PRIZE_CAP:
+            estimates.append(count * amount / (share * PRIZE_FUND_RATE))
+    return estimates[-1] if estimates else None
+
+
+def notice_sales(game_type, issue, paths):
+    # Total of the regional sales in lottery_notices.py's output
+    total = 0.0
+    for path in paths:
+        if re.search(r'lottery_notice_sales_\d{8}\.csv$', path):
+            for row in read_csv_rows(path):
+                if row.get('Game_Type') == game_type and period_number(row.get('Issue_Number')) == issue:
+                    total += parse_amount(row.get('Sales_Amount')) or 0.0
+    return total or None
+
+
+def print_summary(game_type, issue, bets, summary):
+    print(f"\n{game_type} issue {issue}: {bets:,.0f} bets")
+    for tier, stats in summary.items():
+        print(f"  {tier}: winners mean {stats['winners_mean']:.1f} "
+              f"(p5 {stats['winners_p5']:.0f}, p50 {stats['winners_p50']:.0f}, p95 {stats['winners_p95']:.0f}), "
+              f"no winner {stats['no_winner_rate']:.1%}")
+        if stats['payout_mean'] is not None:
+            print(f"    prize per winner mean {stats['payout_mean']:,.0f} "
+                  f"(p5 {stats['payout_p5']:,.0f}, p50 {stats['payout_p50']:,.0f}, p95 {stats['payout_p95']:,.0f}), "
+                  f"capped {stats['capped_rate']:.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estimate winner counts and prizes of open issues by simulation")
+    parser.add_argument('game_types', nargs='*', help="Game types to simulate (default all)")
+    parser.add_argument('--samples', type=int, default=1000000, help="Outcome vectors drawn per game type")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=200000)
+    parser.add_argument('--sales', type=float,
+                        help="Expected sales in yuan (default the notice sales or prizes of the last issue)")
+    parser.add_argument('--pool', type=float, help="Rolled-over pool added to the first prize (default the last issue's)")
+    parser.add_argument('--prior-weight', type=float, default=10,
+                        help="Pseudo-draws pulling each slot's frequencies toward the game-wide ones")
+    parser.add_argument('--store', help="SQLite store to read past results from as well")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--no-cache', action='store_true', help="Simulate even when the cache has the answer")
+    parser.add_argument('--output', help="JSON file to write the summaries to")
+    parser.add_argument('--log-level', default='INFO')
+    args = parser.parse_args()
+    for game_type in args.game_types:
+        if game_type not in GAME_SLOTS:
+            parser.error(f"unknown game type {game_type!r}, choose from {', '.join(GAME_SLOTS)}")
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(message)s')
+
+    paths = sorted(glob.glob('lottery_*.csv'))
+    store = None
+    if args.store:
+        from lottery_store import LotteryStore
+        store = LotteryStore(args.store)
+    cache = SimulationCache(args.cache_dir)
+    summaries = {}
+
+    for game_type in args.game_types or list(GAME_SLOTS):
+        issue, matches = open_issue(game_type, paths)
+        if issue is None:
+            log.warning("%s: no open issue in the selling files, skipping", game_type)
+            continue
+        if len(matches) * SLOTS_PER_MATCH[game_type] != GAME_SLOTS[game_type]:
+            log.warning("%s issue %s: %d matches on the selling page, skipping", game_type, issue, len(matches))
+            continue
+
+        prize_row = latest_prize_row(game_type, paths)
+        sales = args.sales or notice_sales(game_type, prize_row and period_number(prize_row.get('Issue_Number')), paths)
+        sales = sales or (implied_sales(game_type, prize_row) if prize_row else None)
+        if not sales:
+            log.warning("%s issue %s: no sales figure, pass --sales", game_type, issue)
+            continue
+        pool = args.pool
+        if pool is None:
+            pool = (parse_amount(prize_row.get('Prize_Pool_Amount')) if prize_row else None) or 0.0
+        bets = sales / BET_PRICE
+
+        history = history_issues(game_type, paths, store)
+        probs = outcome_frequencies(game_type, history, args.prior_weight)
+        key = cache.key(probs, bets=bets, pool=pool, samples=args.samples, seed=args.seed)
+        summary = None if args.no_cache else cache.get(game_type, issue, key)
+        if summary is None:
+            started = time.perf_counter()
+            simulation = simulate(game_type, probs, bets, pool, args.samples, args.seed, args.batch_size)
+            summary = summarize(simulation)
+            cache.put(game_type, issue, key, summary)
+            elapsed = time.perf_counter() - started
+            log.info("Simulated %d outcomes of %s from %d past issues in %.2fs (%.0f/s)", args.samples, game_type,
+                     len(history), elapsed, args.samples / max(elapsed, 1e-9))
+        else:
+            log.info("%s issue %s: cached in %s", game_type, issue, cache.path(game_type, issue))
+        print_summary(game_type, issue, bets, summary)
+        summaries[game_type] = {'issue': issue, 'bets': bets, 'pool': pool, 'tiers': summary}
+
+    if store is not None:
+        store.close()
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(summaries, f, ensure_ascii=False, indent=1)
+        log.info("Saved summaries to %s", args.output)
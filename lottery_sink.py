@@ -0,0 +1,132 @@
+import csv
+import logging
+import os
+import re
+
+log = logging.getLogger(__name__)
+
+# CSV headers in the order the DataFrame writers produced them, so streamed
+# files match the earlier output
+SELLING_BASE_COLUMNS = [
+    'period', 'sale_status', 'deadline_time', 'sale_time', 'match_num', 'league', 'start_time',
+    'home_team', 'away_team'
+]
+
+SELLING_BET_COLUMNS = {
+    '胜负游戏': ['bet_win', 'bet_draw', 'bet_lose'],
+    '任选9场': ['bet_win', 'bet_draw', 'bet_lose'],
+    '6场半全场': ['half_win', 'half_draw', 'half_lose', 'full_win', 'full_draw', 'full_lose'],
+    '4场进球': [f'{side}_goals_{val}' for val in ('0', '1', '2', '3+') for side in ('home', 'away')]
+}
+
+RESULT_BASE_COLUMNS = ['Period', 'Date', 'Match_Number', 'Home_Team', 'Away_Team']
+
+RESULT_GAME_COLUMNS = {
+    '6场半全场': ['Half_Time_Score', 'Full_Time_Score', 'Half_Time_Result', 'Full_Time_Result'],
+    '4场进球': ['Score', 'Home_Goals', 'Away_Goals']
+}
+
+PRIZE_COLUMNS = [
+    'Issue_Number', 'Date', 'Game_Type',
+    'First_Prize_Count', 'First_Prize_Amount',
+    'Second_Prize_Count', 'Second_Prize_Amount',
+    'Prize_Pool', 'Prize_Pool_Amount',
+    'Prize_Notice_URL', 'Sales_Notice_URL'
+]
+
+# Columns kept whatever --columns selects, so trimmed files still join and import
+SELLING_KEY_COLUMNS = ('period', 'match_num')
+RESULT_KEY_COLUMNS = ('Period', 'Match_Number')
+PRIZE_KEY_COLUMNS = ('Issue_Number', 'Game_Type')
+
+
+def prize_pool(amount_text):
+    # "3,140,787.97" -> "3140787.97": Prize_Pool holds the rolled-over pool as a
+    # plain number, Prize_Pool_Amount the text as the page shows it
+    text = ''.join(str(amount_text or '').replace(',', '').split())
+    return text if re.fullmatch(r'\d+(\.\d+)?', text) else None
+
+
+def selling_columns(game_type):
+    return SELLING_BASE_COLUMNS + SELLING_BET_COLUMNS.get(game_type, [])
+
+
+def result_columns(lottery_type):
+    return RESULT_BASE_COLUMNS + RESULT_GAME_COLUMNS.get(lottery_type, ['Score', 'Result'])
+
+
+class CsvSink:
+    def __init__(self, path, columns, buffer_rows=200):
+        # Rows go to path.part as they are written; commit() renames it to
+        # path. Rows are buffered and appended buffer_rows at a time, or on
+        # flush(), so after a crash path.part holds the header and every
+        # flushed row and is a valid CSV file on its own.
+        self.path = path
+        self.part_path = f"{path}.part"
+        self.columns = columns
+        self.buffer_rows = buffer_rows
+        self.buffer = []
+        self.rows = 0
+        self.file = None
+        self.writer = None
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self.file = open(self.part_path, 'w', encoding='utf-8-sig', newline='')
+        self.writer = csv.DictWriter(self.file, fieldnames=self.columns, extrasaction='ignore', lineterminator='\n')
+        self.writer.writeheader()
+
+    def write(self, rows):
+        self.buffer.extend(rows)
+        self.rows += len(rows)
+        if len(self.buffer) >= self.buffer_rows:
+            self.flush()
+
+    def flush(self):
+        if self.file is None:
+            self.open()
+        if self.buffer:
+            self.writer.writerows(self.buffer)
+            self.buffer = []
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        # Buffered rows are written even if nothing was flushed yet, which
+        # opens path.part
+        if self.file is not None or self.buffer:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+    def commit(self):
+        # Replaces path with the complete file in one step
+        self.flush()
+        self.close()
+        os.replace(self.part_path, self.path)
+        return self.path
+
+    def abort(self):
+        # Keeps the flushed rows in path.part; path itself is left as it was
+        try:
+            self.close()
+        except OSError as e:
+            log.warning("Could not flush %s: %s", self.part_path, e)
+        if self.rows:
+            log.warning("Partial output kept in %s (%d rows)", self.part_path, self.rows)
+
+    def discard(self):
+        self.buffer = []
+        self.close()
+        if os.path.exists(self.part_path):
+            os.remove(self.part_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+        return False
@@ -0,0 +1,382 @@
+import argparse
+import bisect
+import glob
+import json
+import logging
+import os
+import re
+import time
+from datetime import datetime
+
+from lottery_merge import store_row
+from lottery_normalize import TEAM_ALIASES, canonical_team, file_kind, load_aliases
+from lottery_sink import CsvSink
+from lottery_store import read_csv_rows
+
+log = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = 'team_stats.json'
+DEFAULT_WINDOW = 10
+
+# Final score of a results row, by game type: 6场半全场 has half and full time
+SCORE_FIELDS = ('full_time_score', 'score')
+
+TEAM_STAT_COLUMNS = ['played', 'wins', 'draws', 'losses', 'goals_for', 'goals_against', 'points', 'form']
+LEAGUE_STAT_COLUMNS = ['matches', 'home_win_rate', 'draw_rate', 'away_win_rate', 'goals_per_match']
+
+FIXTURE_BASE_COLUMNS = ['game', 'period', 'match_num', 'sale_status', 'league', 'start_time', 'home_team', 'away_team']
+
+FIXTURE_COLUMNS = (
+    FIXTURE_BASE_COLUMNS +
+    [f'home_{column}' for column in TEAM_STAT_COLUMNS] + [f'away_{column}' for column in TEAM_STAT_COLUMNS] +
+    [f'league_{column}' for column in LEAGUE_STAT_COLUMNS]
+)
+
+
+def parse_score(text):
+    # "2:1" -> (2, 1); blanks and unplayed matches ("-", "*") -> None
+    match = re.search(r'(\d+)\s*[:：]\s*(\d+)', str(text or ''))
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+
+class FormBuffer:
+    # The last `window` matches of a team or league, oldest first, and their
+    # totals. Entries are (date, match key, goals, goals) tuples; a new issue
+    # appends and drops the oldest, a backfilled older match is put in its
+    # place. The summary is rebuilt from at most window entries on every
+    # change, so reads are a dict lookup.
+    def __init__(self, window, entries=()):
+        self.window = window
+        self.entries = sorted(tuple(entry) for entry in entries)[-window:]
+        self.summary = self.summarize()
+
+    def add(self, entry):
+        self.remove(entry[1])
+        if len(self.entries) >= self.window and entry < self.entries[0]:
+            return
+        bisect.insort(self.entries, entry)
+        del self.entries[:-self.window]
+        self.summary = self.summarize()
+
+    def remove(self, key, history=None):
+        # A corrected result replaces the earlier one. history() returns the
+        # entries of every known match; a full buffer that loses an entry takes
+        # back the newest ones it had dropped, so it is not left short.
+        before = len(self.entries)
+        self.entries = [entry for entry in self.entries if entry[1] != key]
+        if len(self.entries) == before:
+            return
+        if before >= self.window and history is not None:
+            kept = {entry[1] for entry in self.entries}
+            dropped = sorted(tuple(entry) for entry in history() if entry[1] != key and entry[1] not in kept)
+            self.entries = sorted(self.entries + dropped[len(self.entries) - self.window:])
+        self.summary = self.summarize()
+
+    def summarize(self):
+        raise NotImplementedError
+
+
+class TeamForm(FormBuffer):
+    # Entries hold the team's own goals first
+    def summarize(self):
+        wins = sum(1 for _, _, goals_for, goals_against in self.entries if goals_for > goals_against)
+        draws = sum(1 for _, _, goals_for, goals_against in self.entries if goals_for == goals_against)
+        losses = len(self.entries) - wins - draws
+        return {
+            'played': len(self.entries),
+            'wins': wins,
+            'draws': draws,
+            'losses': losses,
+            'goals_for': sum(entry[2] for entry in self.entries),
+            'goals_against': sum(entry[3] for entry in self.entries),
+            'points': wins * 3 + draws,
+            # Oldest first, e.g. "WWDLW"
+            'form': ''.join('W' if entry[2] > entry[3] else 'D' if entry[2] == entry[3] else 'L'
+                            for entry in self.entries)
+        }
+
+
+class LeagueForm(FormBuffer):
+    # Entries hold home goals first
+    def summarize(self):
+        matches = len(self.entries)
+        if not matches:
+            return {'matches': 0}
+        home_wins = sum(1 for entry in self.entries if entry[2] > entry[3])
+        draws = sum(1 for entry in self.entries if entry[2] == entry[3])
+        return {
+            'matches': matches,
+            'home_win_rate': round(home_wins / matches, 3),
+            'draw_rate': round(draws / matches, 3),
+            'away_win_rate': round((matches - home_wins - draws) / matches, 3),
+            'goals_per_match': round(sum(entry[2] + entry[3] for entry in self.entries) / matches, 2)
+        }
+
+
+class TeamStatsIndex:
+    def __init__(self, window=DEFAULT_WINDOW, aliases=TEAM_ALIASES):
+        # Rolling form of the last `window` matches per team and per league,
+        # updated as results come in. The same match is drawn in several
+        # games (胜负游戏 and 任选9场 share theirs), so matches are counted
+        # once by (date, home, away). Results carry no league; it comes from
+        # the selling rows of the same fixture.
+        self.window = window
+        self.aliases = aliases
+        self.teams = {}
+        self.leagues = {}
+        # match key -> [date, home, away, home goals, away goals, league]
+        self.matches = {}
+        # (home, away) -> league, and matches still waiting for theirs
+        self.fixture_leagues = {}
+        self.unplaced = {}
+        # Ingested file name -> [size, mtime], to skip files seen before
+        self.files = {}
+        # Store path -> newest selling scraped_date and results date ingested
+        self.stores = {}
+
+    def match_key(self, date, home, away):
+        return f"{date}|{home}|{away}"
+
+    def add_selling(self, rows):
+        # Learns the league of each fixture; results ingested earlier without
+        # one are added to their league now
+        for row in rows:
+            row = store_row(row)
+            home = canonical_team(row.get('home_team'), self.aliases)
+            away = canonical_team(row.get('away_team'), self.aliases)
+            league = (row.get('league') or '').strip()
+            if not home or not away or not league:
+                continue
+            self.fixture_leagues[(home, away)] = league
+            for key in self.unplaced.pop((home, away), []):
+                match = self.matches[key]
+                match[5] = league
+                self.league_form(league).add((match[0], key, match[3], match[4]))
+
+    def add_results(self, rows):
+        # Returns the number of matches that were new or changed
+        changed = 0
+        for row in rows:
+            row = store_row(row)
+            scores = [parse_score(row.get(field)) for field in SCORE_FIELDS]
+            score = next((score for score in scores if score is not None), None)
+            home = canonical_team(row.get('home_team'), self.aliases)
+            away = canonical_team(row.get('away_team'), self.aliases)
+            date = row.get('date') or ''
+            if score is None or not home or not away:
+                continue
+            key = self.match_key(date, home, away)
+            previous = self.matches.get(key)
+            if previous is not None and tuple(previous[3:5]) == score:
+                continue
+
+            league = self.fixture_leagues.get((home, away)) or (previous[5] if previous else None)
+            self.matches[key] = [date, home, away, score[0], score[1], league]
+            if previous and previous[5] and previous[5] != league and previous[5] in self.leagues:
+                self.leagues[previous[5]].remove(key, lambda: self.league_entries(previous[5]))
+            self.team_form(home).add((date, key, score[0], score[1]))
+            self.team_form(away).add((date, key, score[1], score[0]))
+            if league:
+                self.league_form(league).add((date, key, score[0], score[1]))
+            elif key not in self.unplaced.setdefault((home, away), []):
+                self.unplaced[(home, away)].append(key)
+            changed += 1
+        return changed
+
+    def team_form(self, team):
+        if team not in self.teams:
+            self.teams[team] = TeamForm(self.window)
+        return self.teams[team]
+
+    def league_form(self, league):
+        if league not in self.leagues:
+            self.leagues[league] = LeagueForm(self.window)
+        return self.leagues[league]
+
+    def team_entries(self, team):
+        # FormBuffer entries of every known match of the team
+        for key, (date, home, away, home_goals, away_goals, _) in self.matches.items():
+            if home == team:
+                yield date, key, home_goals, away_goals
+            elif away == team:
+                yield date, key, away_goals, home_goals
+
+    def league_entries(self, league):
+        for key, (date, _, _, home_goals, away_goals, match_league) in self.matches.items():
+            if match_league == league:
+                yield date, key, home_goals, away_goals
+
+    def team(self, name):
+        form = self.teams.get(canonical_team(name, self.aliases))
+        return form.summary if form is not None else None
+
+    def league(self, name):
+        form = self.leagues.get((name or '').strip())
+        return form.summary if form is not None else None
+
+    def fixture_row(self, game, row):
+        # A selling row with both teams' form and its league's
+        row = store_row(row)
+        joined = {'game': game}
+        joined.update((column, row.get(column)) for column in FIXTURE_BASE_COLUMNS[1:])
+        for side in ('home', 'away'):
+            stats = self.team(row.get(f'{side}_team')) or {}
+            joined.update((f'{side}_{column}', stats.get(column)) for column in TEAM_STAT_COLUMNS)
+        stats = self.league(row.get('league')) or {}
+        joined.update((f'league_{column}', stats.get(column)) for column in LEAGUE_STAT_COLUMNS)
+        return joined
+
+    def ingest_files(self, paths):
+        # Selling files first, so results find their fixture's league.
+        # Files whose size and mtime are unchanged since the last run are
+        # skipped.
+        counts = {'files': 0, 'matches': 0}
+        kinds = [(file_kind(path)[0], path) for path in paths]
+        for kind, path in sorted(kinds, key=lambda item: item[0] != 'selling'):
+            if kind not in ('selling', 'results'):
+                continue
+            stat = os.stat(path)
+            signature = [stat.st_size, stat.st_mtime_ns]
+            name = os.path.basename(path)
+            if self.files.get(name) == signature:
+                continue
+            if kind == 'selling':
+                self.add_selling(read_csv_rows(path))
+            else:
+                counts['matches'] += self.add_results(read_csv_rows(path))
+            self.files[name] = signature
+            counts['files'] += 1
+        return counts
+
+    def ingest_store(self, store):
+        # Only rows from the newest scraped_date and results date ingested
+        # from this store onwards; that day is read again since its rows may
+        # have been upserted since. Unchanged results are skipped by
+        # add_results().
+        cursor = self.stores.setdefault(store.path, {'selling': None, 'results': None})
+        if cursor['selling']:
+            selling = store.query("SELECT home_team, away_team, league, scraped_date FROM selling "
+                                  "WHERE scraped_date >= ?", (cursor['selling'],))
+        else:
+            selling = store.query("SELECT home_team, away_team, league, scraped_date FROM selling")
+        self.add_selling(selling)
+        if cursor['results']:
+            results = store.query("SELECT * FROM results WHERE date >= ? ORDER BY date", (cursor['results'],))
+        else:
+            results = store.query("SELECT * FROM results ORDER BY date")
+        matches = self.add_results(results)
+
+        cursor['selling'] = max((row['scraped_date'] for row in selling if row['scraped_date']),
+                                default=cursor['selling'])
+        cursor['results'] = max((row['date'] for row in results if row['date']), default=cursor['results'])
+        return {'files': 0, 'matches': matches}
+
+    def save(self, path):
+        data = {
+            'window': self.window,
+            'files': self.files,
+            'stores': self.stores,
+            'matches': self.matches,
+            'fixture_leagues': [[home, away, league] for (home, away), league in self.fixture_leagues.items()],
+            'unplaced': [[home, away, keys] for (home, away), keys in self.unplaced.items()],
+            'teams': {team: form.entries for team, form in self.teams.items()},
+            'leagues': {league: form.entries for league, form in self.leagues.items()}
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, window=None, aliases=TEAM_ALIASES):
+        # A saved index, or an empty one when there is none or it was built
+        # with another window
+        if not os.path.exists(path):
+            return cls(window or DEFAULT_WINDOW, aliases)
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if window is not None and window != data['window']:
+            log.info("%s was built with a window of %d matches, rebuilding with %d", path, data['window'], window)
+            return cls(window, aliases)
+        index = cls(data['window'], aliases)
+        index.files = data['files']
+        index.stores = data.get('stores', {})
+        index.matches = data['matches']
+        index.fixture_leagues = {(home, away): league for home, away, league in data['fixture_leagues']}
+        index.unplaced = {(home, away): keys for home, away, keys in data['unplaced']}
+        index.teams = {team: TeamForm(index.window, entries) for team, entries in data['teams'].items()}
+        index.leagues = {league: LeagueForm(index.window, entries) for league, entries in data['leagues'].items()}
+        return index
+
+
+def latest_selling_files(paths):
+    # The newest selling file of each game type: the fixtures still on sale
+    latest = {}
+    for path in paths:
+        kind, game_type = file_kind(path)
+        if kind == 'selling' and path > latest.get(game_type, ''):
+            latest[game_type] = path
+    return latest
+
+
+def print_summary(name, stats, columns):
+    if stats is None:
+        print(f"{name}: no matches")
+        return
+    print(f"{name}: " + ', '.join(f"{column} {stats.get(column)}" for column in columns))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep rolling team and league form up to date and join it to fixtures")
+    parser.add_argument('files', nargs='*',
+                        help="Selling and results CSV files to ingest (default all in the current directory)")
+    parser.add_argument('--store', help="SQLite store to ingest instead of CSV files")
+    parser.add_argument('--index', default=DEFAULT_INDEX_PATH, help="Index file kept between runs")
+    parser.add_argument('--window', type=int, help=f"Matches per team and league (default {DEFAULT_WINDOW})")
+    parser.add_argument('--rebuild', action='store_true', help="Ignore the saved index and ingest everything again")
+    parser.add_argument('--aliases', action='append', help="Extra team alias CSV file with alias,team rows (repeatable)")
+    parser.add_argument('--team', action='append', default=[], help="Print a team's form (repeatable)")
+    parser.add_argument('--league', action='append', default=[], help="Print a league's form (repeatable)")
+    parser.add_argument('--output', help="CSV file for the fixtures of the newest selling files with both teams' form "
+                                         "(default fixture_form_<date>.csv)")
+    parser.add_argument('--log-level', default='INFO')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(message)s')
+    aliases = load_aliases(args.aliases)
+    started = time.monotonic()
+
+    if args.rebuild:
+        index = TeamStatsIndex(args.window or DEFAULT_WINDOW, aliases)
+    else:
+        index = TeamStatsIndex.load(args.index, args.window, aliases)
+
+    paths = args.files or sorted(glob.glob('lottery_selling_*.csv') + glob.glob('lottery_results_*.csv'))
+    if args.store:
+        from lottery_store import LotteryStore
+        store = LotteryStore(args.store)
+        try:
+            counts = index.ingest_store(store)
+            fixtures = {game: store.query("SELECT * FROM selling WHERE game = ? AND period = "
+                                          "(SELECT MAX(period) FROM selling WHERE game = ?)", (game, game))
+                        for game in [row['game'] for row in store.query("SELECT DISTINCT game FROM selling")]}
+        finally:
+            store.close()
+    else:
+        counts = index.ingest_files(paths)
+        fixtures = {game: read_csv_rows(path) for game, path in latest_selling_files(paths).items()}
+    index.save(args.index)
+    log.info("Ingested %d files, %d new or changed matches; %d teams, %d leagues in %.3fs",
+             counts['files'], counts['matches'], len(index.teams), len(index.leagues), time.monotonic() - started)
+
+    for team in args.team:
+        print_summary(team, index.team(team), TEAM_STAT_COLUMNS)
+    for league in args.league:
+        print_summary(league, index.league(league), LEAGUE_STAT_COLUMNS)
+
+    if fixtures:
+        output = args.output or f'fixture_form_{datetime.now().strftime("%Y%m%d")}.csv'
+        with CsvSink(output, FIXTURE_COLUMNS) as sink:
+            for game, rows in fixtures.items():
+                sink.write([index.fixture_row(game, row) for row in rows])
+        log.info("Saved %d fixtures with form to %s", sink.rows, os.path.abspath(output))
@@ -0,0 +1,196 @@
+import argparse
+import csv
+import glob
+import os
+import re
+import sqlite3
+import threading
+
+DEFAULT_STORE_PATH = 'lottery.db'
+
+SELLING_COLUMNS = [
+    'game', 'period', 'match_num', 'sale_status', 'deadline_time', 'sale_time',
+    'league', 'start_time', 'home_team', 'away_team',
+    'bet_win', 'bet_draw', 'bet_lose',
+    'half_win', 'half_draw', 'half_lose', 'full_win', 'full_draw', 'full_lose',
+    'home_goals_0', 'home_goals_1', 'home_goals_2', 'home_goals_3plus',
+    'away_goals_0', 'away_goals_1', 'away_goals_2', 'away_goals_3plus',
+    'scraped_date'
+]
+
+RESULT_COLUMNS = [
+    'game', 'issue', 'match_number', 'date', 'home_team', 'away_team',
+    'score', 'result', 'half_time_score', 'full_time_score',
+    'half_time_result', 'full_time_result', 'home_goals', 'away_goals'
+]
+
+PRIZE_COLUMNS = [
+    'game', 'issue', 'date',
+    'first_prize_count', 'first_prize_amount', 'second_prize_count', 'second_prize_amount',
+    'prize_pool', 'prize_pool_amount', 'prize_notice_url', 'sales_notice_url'
+]
+
+TABLE_KEYS = {
+    'selling': ('game', 'period', 'match_num'),
+    'results': ('game', 'issue', 'match_number'),
+    'prizes': ('game', 'issue')
+}
+
+TABLE_COLUMNS = {
+    'selling': SELLING_COLUMNS,
+    'results': RESULT_COLUMNS,
+    'prizes': PRIZE_COLUMNS
+}
+
+INDEXES = [
+    ('selling', 'period'), ('selling', 'start_time'), ('selling', 'home_team'), ('selling', 'away_team'),
+    ('results', 'issue'), ('results', 'date'), ('results', 'home_team'), ('results', 'away_team'),
+    ('prizes', 'issue'), ('prizes', 'date')
+]
+
+# Result/prize CSV headers -> store columns
+CSV_COLUMN_MAP = {
+    'Period': 'issue',
+    'Issue_Number': 'issue',
+    'Match_Number': 'match_number',
+    'Game_Type': 'game'
+}
+
+
+def store_column(name):
+    # 'Home_Team' -> 'home_team', 'home_goals_3+' -> 'home_goals_3plus'
+    name = CSV_COLUMN_MAP.get(name, name)
+    return name.lower().replace('+', 'plus')
+
+
+class LotteryStore:
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        # Shared by worker threads (backfill, parallel selling); writes are
+        # serialised with the lock
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        self.create_schema()
+
+    def create_schema(self):
+        with self.lock, self.connection:
+            for table, columns in TABLE_COLUMNS.items():
+                keys = TABLE_KEYS[table]
+                column_defs = ', '.join(
+                    f"{column} TEXT NOT NULL" if column in keys else f"{column} TEXT" for column in columns
+                )
+                self.connection.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table} ({column_defs}, PRIMARY KEY ({', '.join(keys)}))"
+                )
+            for table, column in INDEXES:
+                self.connection.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{column} ON {table} ({column})")
+
+    def upsert(self, table, rows):
+        columns = TABLE_COLUMNS[table]
+        keys = TABLE_KEYS[table]
+        updates = ', '.join(f"{column} = excluded.{column}" for column in columns if column not in keys)
+        sql = (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+               f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {updates}")
+
+        values = [tuple(row.get(column) for column in columns) for row in rows]
+        with self.lock, self.connection:
+            self.connection.executemany(sql, values)
+        return len(values)
+
+    def upsert_selling(self, game_type, rows, scraped_date=None):
+        records = []
+        for row in rows:
+            record = {store_column(name): value for name, value in row.items()}
+            record.update({'game': game_type, 'scraped_date': scraped_date})
+            records.append(record)
+        return self.upsert('selling', records)
+
+    def upsert_results(self, game_type, rows):
+        records = []
+        for row in rows:
+            record = {store_column(name): value for name, value in row.items()}
+            record['game'] = game_type
+            records.append(record)
+        return self.upsert('results', records)
+
+    def upsert_prizes(self, rows):
+        return self.upsert('prizes', [{store_column(name): value for name, value in row.items()} for row in rows])
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return [dict(row) for row in self.connection.execute(sql, params).fetchall()]
+
+    def team_results(self, team, since_date=None):
+        # Both team columns are indexed, so SQLite answers the OR with two index lookups
+        sql = "SELECT * FROM results WHERE (home_team = ? OR away_team = ?)"
+        params = [team, team]
+        if since_date:
+            sql += " AND date >= ?"
+            params.append(since_date)
+        return self.query(sql + " ORDER BY date, issue, CAST(match_number AS INTEGER)", params)
+
+    def issue_results(self, game_type, issue):
+        return self.query(
+            "SELECT * FROM results WHERE game = ? AND issue = ? ORDER BY CAST(match_number AS INTEGER)",
+            (game_type, str(issue))
+        )
+
+    def close(self):
+        self.connection.close()
+
+
+def read_csv_rows(path):
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        return [{name: (value if value != '' else None) for name, value in row.items()} for row in csv.DictReader(f)]
+
+
+def import_csv_files(store, directory='.'):
+    # Loads the date-stamped CSV files written before the store existed
+    counts = {'selling': 0, 'results': 0, 'prizes': 0}
+
+    for path in sorted(glob.glob(os.path.join(directory, 'lottery_selling_*.csv'))):
+        match = re.match(r'lottery_selling_(.+)_(\d{8})\.csv$', os.path.basename(path))
+        if match:
+            rows = read_csv_rows(path)
+            # Early files have 'deadline' and bare period numbers
+            for row in rows:
+                if 'deadline' in row:
+                    row['deadline_time'] = row.pop('deadline')
+                if row.get('period') and not row['period'].endswith('期'):
+                    row['period'] += '期'
+            counts['selling'] += store.upsert_selling(match.group(1), rows, match.group(2))
+
+    for path in sorted(glob.glob(os.path.join(directory, 'lottery_results_*.csv'))):
+        match = re.match(r'lottery_results_(.+)_(\d+)\.csv$', os.path.basename(path))
+        if match:
+            counts['results'] += store.upsert_results(match.group(1), read_csv_rows(path))
+
+    for path in sorted(glob.glob(os.path.join(directory, 'lottery_prizes_*.csv'))):
+        counts['prizes'] += store.upsert_prizes(read_csv_rows(path))
+
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Indexed SQLite store for scraped lottery data")
+    parser.add_argument('--store', default=DEFAULT_STORE_PATH)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import', help="Load existing CSV files into the store")
+    import_parser.add_argument('directory', nargs='?', default='.')
+    team_parser = subparsers.add_parser('team', help="Print all results for a team")
+    team_parser.add_argument('team')
+    team_parser.add_argument('--since', help="Only results on or after this date (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    store = LotteryStore(args.store)
+    try:
+        if args.command == 'import':
+            counts = import_csv_files(store, args.directory)
+            print(f"Imported {counts['selling']} selling, {counts['results']} result and {counts['prizes']} prize rows")
+        elif args.command == 'team':
+            for row in store.team_results(args.team, args.since):
+                print(f"{row['date']} {row['game']} {row['issue']}#{row['match_number']}: "
+                      f"{row['home_team']} vs {row['away_team']} {row['score'] or row['full_time_score'] or ''}")
+    finally:
+        store.close()
@@ -0,0 +1,218 @@
+import argparse
+import csv
+import time
+import numpy as np
+
+# Each ticket slot is a bitmask of the options chosen for one outcome:
+#   胜负游戏 / 任选9场: 14 slots, one per match, options 3/1/0
+#   6场半全场: 12 slots, half time then full time result of each match, options 3/1/0
+#   4场进球: 8 slots, home then away goals of each match, options 0/1/2/3+
+# A slot of 0 means the match is not played on the ticket (任选9场 only).
+GAME_SLOTS = {
+    '胜负游戏': 14,
+    '任选9场': 14,
+    '6场半全场': 12,
+    '4场进球': 8
+}
+
+RESULT_BITS = {'3': 1, '1': 2, '0': 4}
+GOAL_BITS = {'0': 1, '1': 2, '2': 4, '3+': 8}
+
+# Prize tiers and the number of wrong slots (or, for 任选9场, matches) they allow
+PRIZE_TIERS = {
+    '胜负游戏': ['First_Prize', 'Second_Prize'],
+    '任选9场': ['First_Prize'],
+    '6场半全场': ['First_Prize'],
+    '4场进球': ['First_Prize']
+}
+
+RX9_MATCHES = 9
+
+POPCOUNT = np.array([bin(mask).count('1') for mask in range(256)], dtype=np.int64)
+
+
+def option_bits(game_type):
+    return GOAL_BITS if game_type == '4场进球' else RESULT_BITS
+
+
+def encode_option(game_type, value):
+    # A drawn outcome as a bitmask; cancelled matches ('*') match every option
+    value = (value or '').strip().replace('＋', '+')
+    bits = option_bits(game_type)
+    if value in bits:
+        return bits[value]
+    if value == '*':
+        return sum(bits.values())
+    raise ValueError(f"Unknown {game_type} outcome: {value!r}")
+
+
+def encode_results(game_type, rows):
+    # rows are lottery_results_* CSV rows (or store rows) ordered by match number
+    def field(row, name):
+        return row.get(name, row.get(name.lower()))
+
+    slots = []
+    for row in rows:
+        if game_type == '6场半全场':
+            slots.extend([field(row, 'Half_Time_Result'), field(row, 'Full_Time_Result')])
+        elif game_type == '4场进球':
+            slots.extend([field(row, 'Home_Goals'), field(row, 'Away_Goals')])
+        else:
+            slots.append(field(row, 'Result'))
+
+    if len(slots) != GAME_SLOTS[game_type]:
+        raise ValueError(f"{game_type} needs {GAME_SLOTS[game_type]} outcomes, got {len(slots)}")
+    return np.array([encode_option(game_type, value) for value in slots], dtype=np.uint8)
+
+
+def encode_tickets(game_type, tickets):
+    # Tickets as text, one slot per comma-separated field: "3,1,310,0,..." for
+    # 胜负游戏, "-" for an unplayed 任选9场 match, "0/1/3+" style for 4场进球
+    bits = option_bits(game_type)
+    slot_count = GAME_SLOTS[game_type]
+    cache = {}
+    encoded = np.zeros((len(tickets), slot_count), dtype=np.uint8)
+
+    for i, ticket in enumerate(tickets):
+        fields = ticket.strip().split(',')
+        if len(fields) != slot_count:
+            raise ValueError(f"Ticket {i + 1} has {len(fields)} slots, {game_type} needs {slot_count}")
+        for j, field in enumerate(fields):
+            field = field.strip()
+            mask = cache.get(field)
+            if mask is None:
+                if field in ('', '-'):
+                    mask = 0
+                else:
+                    # A repeated option ("33", "0/0") is still one option
+                    options = field.replace('＋', '+').split('/') if game_type == '4场进球' else field
+                    mask = 0
+                    for option in set(options):
+                        if option not in bits:
+                            raise ValueError(f"Ticket {i + 1} slot {j + 1}: unknown {game_type} option {option!r}")
+                        mask |= bits[option]
+                cache[field] = mask
+            encoded[i, j] = mask
+    return encoded
+
+
+def evaluate(game_type, tickets, result_masks):
+    # tickets: (N, slots) uint8 masks, result_masks: (slots,) uint8 masks.
+    # Returns the slots hit per ticket and the winning bets per prize tier.
+    # A multi-option (复式) ticket stands for every single bet it expands to, so
+    # per slot there are `correct` options that hit and `wrong` options that
+    # miss; the winning bets follow from polynomial products of those counts.
+    tickets = np.asarray(tickets, dtype=np.uint8)
+    # Slot-major layout keeps every per-slot column contiguous
+    chosen = POPCOUNT[tickets.T]
+    correct = POPCOUNT[(tickets & result_masks).T]
+    wrong = chosen - correct
+    hits = np.count_nonzero(correct, axis=0)
+
+    tiers = PRIZE_TIERS[game_type]
+    n = tickets.shape[0]
+
+    if game_type == '任选9场':
+        # Bets are the 9-match subsets of the played matches; winners are the
+        # subsets where every match hits: the 9th elementary symmetric
+        # polynomial of the per-match correct counts
+        subsets = [np.ones(n, dtype=np.int64)] + [np.zeros(n, dtype=np.int64) for _ in range(RX9_MATCHES)]
+        for j in range(correct.shape[0]):
+            for k in range(RX9_MATCHES, 0, -1):
+                subsets[k] += correct[j] * subsets[k - 1]
+        prize_counts = subsets[RX9_MATCHES][:, np.newaxis]
+    else:
+        # Coefficient k of prod(correct + wrong * x) counts bets with exactly k
+        # wrong slots; tier k allows k wrong slots
+        coefficients = [np.ones(n, dtype=np.int64)] + [np.zeros(n, dtype=np.int64) for _ in tiers[1:]]
+        for j in range(correct.shape[0]):
+            for k in range(len(coefficients) - 1, 0, -1):
+                coefficients[k] = coefficients[k] * correct[j] + coefficients[k - 1] * wrong[j]
+            coefficients[0] = coefficients[0] * correct[j]
+        prize_counts = np.stack(coefficients, axis=1)
+
+    return {'hits': hits, 'prize_counts': prize_counts, 'tiers': tiers}
+
+
+def parse_amount(value):
+    try:
+        return float(str(value).replace(',', ''))
+    except (TypeError, ValueError):
+        return None
+
+
+def settle(game_type, tickets, result_masks, prize_row=None, chunk_size=1000000):
+    # Scores tickets in chunks and totals winning bets per tier. prize_row is a
+    # lottery_prizes_* row; its per-bet amounts give each ticket's payout.
+    totals = np.zeros(len(PRIZE_TIERS[game_type]), dtype=np.int64)
+    payouts = np.zeros(len(tickets), dtype=np.float64)
+    hits = np.zeros(len(tickets), dtype=np.int64)
+
+    amounts = None
+    if prize_row:
+        amounts = np.array([parse_amount(prize_row.get(f'{tier}_Amount')) or 0.0
+                            for tier in PRIZE_TIERS[game_type]])
+
+    for start in range(0, len(tickets), chunk_size):
+        chunk = evaluate(game_type, tickets[start:start + chunk_size], result_masks)
+        totals += chunk['prize_counts'].sum(axis=0)
+        hits[start:start + chunk_size] = chunk['hits']
+        if amounts is not None:
+            payouts[start:start + chunk_size] = chunk['prize_counts'] @ amounts
+
+    return {'hits': hits, 'totals': totals, 'payouts': payouts, 'tiers': PRIZE_TIERS[game_type]}
+
+
+def random_tickets(game_type, count, seed=None, max_options=2):
+    # Random single and multi-option tickets, e.g. for throughput checks
+    rng = np.random.default_rng(seed)
+    bits = np.array(list(option_bits(game_type).values()), dtype=np.uint8)
+    tickets = np.zeros((count, GAME_SLOTS[game_type]), dtype=np.uint8)
+    for _ in range(max_options):
+        tickets |= bits[rng.integers(0, len(bits), size=tickets.shape)]
+    if game_type == '任选9场':
+        # Leave 5 matches unplayed on every ticket
+        skipped = np.argsort(rng.random(tickets.shape), axis=1)[:, :GAME_SLOTS[game_type] - RX9_MATCHES]
+        np.put_along_axis(tickets, skipped, 0, axis=1)
+    return tickets
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score tickets against an issue's results")
+    parser.add_argument('game_type', choices=list(GAME_SLOTS))
+    parser.add_argument('results', help="lottery_results_* CSV of the issue")
+    parser.add_argument('--tickets', help="Text file with one comma-separated ticket per line")
+    parser.add_argument('--random', type=int, help="Score this many random tickets instead")
+    parser.add_argument('--prizes', help="lottery_prizes_* CSV with the issue's prize amounts")
+    args = parser.parse_args()
+
+    result_rows = read_csv(args.results)
+    result_masks = encode_results(args.game_type, result_rows)
+
+    if args.tickets:
+        with open(args.tickets, encoding='utf-8') as f:
+            tickets = encode_tickets(args.game_type, [line for line in f if line.strip()])
+    else:
+        tickets = random_tickets(args.game_type, args.random or 1000000, seed=0)
+
+    prize_row = None
+    if args.prizes:
+        issue = result_rows[0].get('Period')
+        for row in read_csv(args.prizes):
+            if row['Game_Type'] == args.game_type and row['Issue_Number'] == issue:
+                prize_row = row
+
+    started = time.perf_counter()
+    settlement = settle(args.game_type, tickets, result_masks, prize_row)
+    elapsed = time.perf_counter() - started
+
+    print(f"Scored {len(tickets)} tickets in {elapsed:.3f}s ({len(tickets) / max(elapsed, 1e-9):,.0f} tickets/s)")
+    for tier, total in zip(settlement['tiers'], settlement['totals']):
+        print(f"  {tier}_Count: {total}")
+    if prize_row:
+        print(f"  Total payout: {settlement['payouts'].sum():,.2f}")
@@ -0,0 +1,266 @@
+from contextlib import contextmanager
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# Returns whether the tab is the active one among its siblings and a short hash
+# of the visible text under the selector, so waits can poll without pulling
+# the whole table over the wire.
+CONTENT_STATE_SCRIPT = """
+var tab = arguments[0], nodes = document.querySelectorAll(arguments[1]);
+var active = true;
+if (tab && tab.parentElement) {
+    var siblings = tab.parentElement.children, marked = null;
+    for (var s = 0; s < siblings.length; s++) {
+        if (/(^|\\s)(on|active|cur)(\\s|$)/.test(siblings[s].className)) { marked = siblings[s]; }
+    }
+    active = !marked || marked === tab;
+}
+var text = '';
+for (var i = 0; i < nodes.length; i++) {
+    if (nodes[i].offsetParent !== null) { text += nodes[i].innerText; }
+}
+var hash = 5381;
+for (var j = 0; j < text.length; j++) { hash = ((hash << 5) + hash + text.charCodeAt(j)) | 0; }
+return {active: active, size: text.trim().length, hash: text.length + ':' + hash};
+"""
+
+
+def content_state(driver, selector, tab=None):
+    return driver.execute_script(CONTENT_STATE_SCRIPT, tab, selector)
+
+
+def content_hash(driver, selector):
+    return content_state(driver, selector)['hash']
+
+
+class ContentReady:
+    # Ready once the clicked tab is active and the content under the selector
+    # differs from what was shown before the click. Tabs that legitimately show
+    # the same content (胜负游戏 and 任选9场 share matches) are accepted once it
+    # has stayed unchanged for `settle` seconds.
+    def __init__(self, selector, previous_hash=None, tab=None, settle=0.5):
+        self.selector = selector
+        self.previous_hash = previous_hash
+        self.tab = tab
+        self.settle = settle
+        self.unchanged_since = None
+
+    def __call__(self, driver):
+        state = content_state(driver, self.selector, self.tab)
+        if not state['active'] or not state['size']:
+            return False
+        if state['hash'] != self.previous_hash:
+            return state['hash']
+
+        now = time.monotonic()
+        if self.unchanged_since is None:
+            self.unchanged_since = now
+        return state['hash'] if now - self.unchanged_since >= self.settle else False
+
+
+class By:
+    # The locator strings of selenium.webdriver.common.by.By. Importing that
+    # module loads all of selenium.webdriver, so the scrapers use these and
+    # the HTTP backend and snapshot replay start without selenium.
+    ID = 'id'
+    XPATH = 'xpath'
+    LINK_TEXT = 'link text'
+    PARTIAL_LINK_TEXT = 'partial link text'
+    NAME = 'name'
+    TAG_NAME = 'tag name'
+    CLASS_NAME = 'class name'
+    CSS_SELECTOR = 'css selector'
+
+
+class WaitTimeout(Exception):
+    # Raised by wait_located() in place of selenium's TimeoutException
+    pass
+
+
+def wait_located(driver, by, value, timeout, condition='presence'):
+    # The element at by/value once present ('presence'), the first one once
+    # displayed ('visibility') or all of them once there is one ('all'), as
+    # WebDriverWait with the matching expected_conditions returns them.
+    # A timeout of 0 (an open breaker, snapshot replay) is a single check,
+    # which needs no WebDriverWait.
+    def located(driver):
+        elements = driver.find_elements(by, value)
+        if condition == 'all':
+            return elements
+        if condition == 'visibility' and elements and not elements[0].is_displayed():
+            return None
+        return elements[0] if elements else None
+
+    if timeout <= 0:
+        found = located(driver)
+        if not found:
+            raise WaitTimeout(value)
+        return found
+
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.common.exceptions import StaleElementReferenceException, TimeoutException
+    try:
+        return WebDriverWait(driver, timeout, ignored_exceptions=(StaleElementReferenceException,)).until(located)
+    except TimeoutException:
+        raise WaitTimeout(value)
+
+
+def wait_for_content(driver, selector, previous_hash=None, tab=None, timeout=10, settle=0.5):
+    # Selenium is imported on first use so StepTimer users (HTTP backend,
+    # backfill) start without it
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.common.exceptions import TimeoutException
+    try:
+        return WebDriverWait(driver, timeout, poll_frequency=0.1).until(
+            ContentReady(selector, previous_hash, tab, settle)
+        )
+    except TimeoutException:
+        log.warning("Timeout waiting for content: %s", selector)
+        return None
+
+
+def wait_for_document_ready(driver, timeout=20):
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.common.exceptions import TimeoutException
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.1).until(
+            lambda d: d.execute_script("return document.readyState") == "complete"
+        )
+        return True
+    except TimeoutException:
+        log.warning("Timeout waiting for document ready state")
+        return False
+
+
+class StepTimer:
+    def __init__(self, budget=None, metrics=None, tab_budget=None, breaker_misses=3):
+        # budget is the total number of seconds a run may take, None for no limit.
+        # metrics is an optional lottery_metrics.RunMetrics that also receives
+        # every step as a labelled span, and the counts.
+        # tab_budget is the default number of seconds a scope() (one game
+        # type's tab, one issue) may take. breaker_misses is the number of
+        # misses in a row after which waits for a selector stop waiting and
+        # only check once.
+        self.budget = budget
+        self.metrics = metrics
+        self.tab_budget = tab_budget
+        self.breaker_misses = breaker_misses
+        self.started = time.monotonic()
+        self.steps = {}
+        # Steps may be recorded from several worker threads
+        self.lock = threading.Lock()
+        # Each worker thread has its own stack of scope deadlines
+        self.local = threading.local()
+        self.misses = {}
+        self.open_selectors = set()
+        self.skipped = []
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def remaining(self):
+        # Seconds left of the run budget, or of the innermost scope when
+        # that ends first; None without either
+        deadlines = [deadline for _, deadline in getattr(self.local, 'scopes', []) if deadline is not None]
+        if self.budget is not None:
+            deadlines.append(self.started + self.budget)
+        if not deadlines:
+            return None
+        return max(0.0, min(deadlines) - time.monotonic())
+
+    def expired(self):
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def exhausted(self):
+        # Which budget ran out, 'run budget' or 'tab budget', None while time is left
+        if not self.expired():
+            return None
+        return 'run budget' if self.budget is not None and self.elapsed() >= self.budget else 'tab budget'
+
+    def timeout(self, default, selector=None):
+        # Per-step timeout capped by what is left of the run and scope
+        # budgets. A selector whose breaker is open gets 0: one check, no wait.
+        if selector is not None and selector in self.open_selectors:
+            return 0
+        remaining = self.remaining()
+        return default if remaining is None else min(default, remaining)
+
+    @contextmanager
+    def scope(self, name, budget=None):
+        # Time budget for one unit of work (a game type's tab, an issue),
+        # by default tab_budget; expired() and timeout() honour it inside
+        budget = self.tab_budget if budget is None else budget
+        scopes = self.local.__dict__.setdefault('scopes', [])
+        scopes.append((name, time.monotonic() + budget if budget is not None else None))
+        try:
+            yield
+        finally:
+            scopes.pop()
+
+    def found(self, selector):
+        # A wait that succeeded closes the selector's breaker again
+        with self.lock:
+            self.misses.pop(selector, None)
+            if selector in self.open_selectors:
+                self.open_selectors.discard(selector)
+                log.info("Selector %s found again, waiting for it normally", selector)
+
+    def missed(self, selector, **labels):
+        # A wait that timed out. After breaker_misses in a row the selector is
+        # most likely gone from the page, so later waits for it fail fast.
+        self.count('timeouts', selector=selector, **labels)
+        with self.lock:
+            self.misses[selector] = self.misses.get(selector, 0) + 1
+            opened = self.misses[selector] >= self.breaker_misses and selector not in self.open_selectors
+            if opened:
+                self.open_selectors.add(selector)
+        if opened:
+            log.warning("Selector %s missed %d times in a row, no longer waiting for it", selector,
+                        self.misses[selector])
+            self.count('breaker_open', selector=selector)
+
+    def skip(self, what, reason, **labels):
+        # Work left out of the run, for the summary in report()
+        with self.lock:
+            self.skipped.append((what, reason))
+        self.count('skipped', reason=reason, **labels)
+        log.info("Skipping %s (%s)", what, reason)
+
+    @contextmanager
+    def step(self, name, **labels):
+        # labels (game, status, period, ...) only go to the metrics sink
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            duration = time.monotonic() - started
+            with self.lock:
+                count, total, longest = self.steps.get(name, (0, 0.0, 0.0))
+                self.steps[name] = (count + 1, total + duration, max(longest, duration))
+            if self.metrics is not None:
+                self.metrics.span(name, duration, labels)
+
+    def count(self, name, value=1, **labels):
+        # Timeouts, swallowed exceptions, rows written
+        if self.metrics is not None:
+            self.metrics.count(name, value, labels)
+
+    def report(self):
+        log.info("Step timings (total %.2fs%s)", self.elapsed(),
+                 f", budget {self.budget:.0f}s" if self.budget is not None else "")
+        for name, (count, total, longest) in self.steps.items():
+            log.info("  %s: %dx, total %.2fs, avg %.2fs, max %.2fs", name, count, total, total / count, longest)
+        if self.skipped:
+            reasons = {}
+            for _, reason in self.skipped:
+                reasons[reason] = reasons.get(reason, 0) + 1
+            log.info("Skipped %d items (%s)", len(self.skipped),
+                     ', '.join(f"{reason} {count}" for reason, count in sorted(reasons.items())))
+            for what, reason in self.skipped:
+                log.info("  %s: %s", what, reason)
+        if self.open_selectors:
+            log.info("Selectors given up on: %s", ', '.join(sorted(self.open_selectors)))
@@ -0,0 +1,260 @@
+import argparse
+import heapq
+import json
+import logging
+import time
+from datetime import datetime
+from lottery_browser import network_report
+from lottery_cache import markup_fingerprint
+from lottery_selling import LotteryScraper, MATCH_GAME_TYPES
+from lottery_store import LotteryStore
+from lottery_waits import StepTimer
+
+log = logging.getLogger(__name__)
+
+DEFAULT_OUTPUT_PATH = 'selling_changes.jsonl'
+
+TIME_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y/%m/%d %H:%M:%S', '%Y/%m/%d %H:%M')
+
+
+def parse_time(text):
+    # deadline_time/sale_time as shown on the page, None when missing or unknown
+    text = (text or '').strip()
+    for time_format in TIME_FORMATS:
+        try:
+            return datetime.strptime(text, time_format).timestamp()
+        except ValueError:
+            continue
+    return None
+
+
+def poll_interval(status_text, deadline, sale_time, now, min_interval, max_interval):
+    # Seconds until a period is polled again. Open periods are polled more
+    # often as their deadline gets close (a tenth of the time left);
+    # 即将开售 periods back off until their sale time.
+    if status_text == '即将开售':
+        if sale_time is None:
+            return max_interval
+        return max(min_interval, min(max_interval, sale_time - now))
+    if deadline is None:
+        return max_interval
+    return max(min_interval, min(max_interval, (deadline - now) / 10))
+
+
+def row_changes(previous, rows):
+    # Rows that are new or differ from the last poll, plus the matches that
+    # left the period's list
+    current = {row.get('match_num'): row for row in rows}
+    changes = []
+    for match_num, row in current.items():
+        before = previous.get(match_num)
+        if before is None:
+            changes.append(dict(row, change='new'))
+        elif before != row:
+            changes.append(dict(row, change='odds'))
+    for match_num, row in previous.items():
+        if match_num not in current:
+            changes.append(dict(row, change='removed'))
+    return changes, current
+
+
+class LotteryWatcher:
+    def __init__(self, min_interval=30, max_interval=1800, relist_interval=900, output_path=DEFAULT_OUTPUT_PATH,
+                 store=None, game_types=MATCH_GAME_TYPES, timer=None):
+        # One browser session for the whole watch; only periods that are due
+        # are selected, instead of sweeping all game types every time
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.relist_interval = relist_interval
+        self.output_path = output_path
+        self.store = store
+        self.game_types = game_types
+        self.timer = timer or StepTimer()
+        self.scraper = LotteryScraper(timer=self.timer)
+
+        # (game type, sale status, period) -> {'rows', 'fingerprint', 'deadline', 'sale_time'}
+        self.periods = {}
+        self.schedule = []
+        self.listed = 0
+        self.page_loaded = 0
+        self.page_state = {}
+        self.stats = {'polls': 0, 'unchanged': 0, 'changes': 0}
+
+    def relist(self):
+        # Periods come and go as sales open and close; the ones no longer
+        # offered are dropped and new ones are polled right away
+        self.load_page()
+        items = set(self.scraper.list_work_items(self.game_types))
+        self.page_state = {}
+        for item in list(self.periods):
+            if item not in items:
+                log.info("Period %s closed, no longer watched", ' '.join(item))
+                del self.periods[item]
+        now = time.time()
+        for item in sorted(items - set(self.periods)):
+            log.info("Watching %s", ' '.join(item))
+            self.periods[item] = {'rows': {}, 'fingerprint': None, 'deadline': None, 'sale_time': None}
+            heapq.heappush(self.schedule, (now, item))
+        self.listed = time.monotonic()
+
+    def load_page(self):
+        # Reloading is what brings new odds in; the tabs are selected again after
+        self.page_state = {}
+        self.page_loaded = time.monotonic()
+        return self.scraper.load_page()
+
+    def select(self, item):
+        # Re-select game type and sale status only when they differ from what
+        # the page is already showing
+        game_type, status_text, period_info = item
+        if self.page_state.get('game_type') != game_type:
+            self.page_state = {}
+            if not self.scraper.select_game_type(game_type):
+                return False
+            self.page_state['game_type'] = game_type
+        if self.page_state.get('status_text') != status_text:
+            if not self.scraper.select_sale_status(status_text):
+                return False
+            self.page_state['status_text'] = status_text
+        return self.scraper.select_period(period_info)
+
+    def poll(self, item):
+        period = self.periods[item]
+        self.stats['polls'] += 1
+        if not self.select(item):
+            return []
+
+        # The markup fingerprint is one call; rows are only parsed when it moved
+        fingerprint = markup_fingerprint(self.scraper.driver, ".m-czTab", ".m-czTime-r.f-fr")
+        if fingerprint == period['fingerprint']:
+            self.stats['unchanged'] += 1
+            return []
+
+        rows = self.scraper.extract_period(*item)
+        changes, period['rows'] = row_changes(period['rows'], rows)
+        period['fingerprint'] = fingerprint
+        if rows:
+            period['deadline'] = parse_time(rows[0].get('deadline_time'))
+            period['sale_time'] = parse_time(rows[0].get('sale_time'))
+        return changes
+
+    def emit(self, item, changes):
+        game_type, status_text, period_info = item
+        self.stats['changes'] += len(changes)
+        log.info("%s %s %s: %d changed rows", game_type, status_text, period_info, len(changes))
+        self.timer.count('changed_rows', len(changes), game=game_type, status=status_text)
+
+        if self.output_path:
+            captured = datetime.now().isoformat(timespec='seconds')
+            with open(self.output_path, 'a', encoding='utf-8') as f:
+                for row in changes:
+                    f.write(json.dumps(dict(row, game=game_type, captured=captured), ensure_ascii=False) + '\n')
+
+        if self.store is not None:
+            current = [row for row in changes if row['change'] != 'removed']
+            rows = [{name: value for name, value in row.items() if name != 'change'} for row in current]
+            if rows:
+                with self.timer.step('store_write', game=game_type):
+                    self.store.upsert_selling(game_type, rows, datetime.now().strftime("%Y%m%d"))
+
+    def reschedule(self, item):
+        period = self.periods[item]
+        now = time.time()
+        status_text = item[1]
+        if status_text != '即将开售' and period['deadline'] is not None and period['deadline'] <= now:
+            log.info("Deadline of %s passed, no longer watched", ' '.join(item))
+            del self.periods[item]
+            return
+        if status_text == '即将开售' and period['sale_time'] is not None and period['sale_time'] <= now:
+            # The period moves to 在售奖期; list again to pick it up there
+            log.info("Sale of %s opened", ' '.join(item))
+            del self.periods[item]
+            self.listed = 0
+            return
+        interval = poll_interval(status_text, period['deadline'], period['sale_time'], now,
+                                 self.min_interval, self.max_interval)
+        heapq.heappush(self.schedule, (now + interval, item))
+        log.debug("Next poll of %s in %.0fs", ' '.join(item), interval)
+
+    def due_items(self):
+        now = time.time()
+        due = []
+        while self.schedule and self.schedule[0][0] <= now:
+            _, item = heapq.heappop(self.schedule)
+            if item in self.periods and item not in due:
+                due.append(item)
+        return due
+
+    def watch(self, duration=None):
+        log.info("Starting watch...")
+        started = time.monotonic()
+        try:
+            self.relist()
+            while duration is None or time.monotonic() - started < duration:
+                if time.monotonic() - self.listed >= self.relist_interval:
+                    try:
+                        self.relist()
+                    except Exception as e:
+                        log.warning("Error listing periods: %s", e)
+                        self.timer.count('exceptions', where='watch_relist')
+                        self.listed = time.monotonic()
+
+                # A page loaded within min_interval (e.g. by relist) is fresh enough
+                due = self.due_items()
+                if due and time.monotonic() - self.page_loaded >= self.min_interval:
+                    self.load_page()
+                for item in due:
+                    try:
+                        changes = self.poll(item)
+                        if changes:
+                            self.emit(item, changes)
+                    except Exception as e:
+                        log.warning("Error polling %s: %s", ' '.join(item), e)
+                        self.timer.count('exceptions', where='watch_poll', game=item[0])
+                        self.page_state = {}
+                    if item in self.periods:
+                        self.reschedule(item)
+                if due:
+                    # Also keeps Chrome's performance log from growing over a long watch
+                    network_report(self.scraper.driver, self.timer)
+
+                next_due = self.schedule[0][0] if self.schedule else time.time() + self.max_interval
+                next_relist = self.listed + self.relist_interval - time.monotonic()
+                wait = max(0, min(next_due - time.time(), next_relist))
+                if duration is not None:
+                    wait = min(wait, duration - (time.monotonic() - started))
+                time.sleep(max(0, wait))
+        except KeyboardInterrupt:
+            log.info("Watch stopped")
+        finally:
+            log.info("%d polls, %d unchanged, %d changed rows", self.stats['polls'], self.stats['unchanged'],
+                     self.stats['changes'])
+            self.timer.report()
+            self.scraper.driver.quit()
+
+    def run(self, duration=None):
+        self.watch(duration)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Poll open sale periods and emit the rows whose odds or matches changed")
+    parser.add_argument('--game-type', action='append', choices=MATCH_GAME_TYPES, dest='game_types',
+                        help="Game type to watch (repeatable, default all)")
+    parser.add_argument('--min-interval', type=float, default=30, help="Shortest seconds between polls of a period")
+    parser.add_argument('--max-interval', type=float, default=1800, help="Longest seconds between polls of a period")
+    parser.add_argument('--relist-interval', type=float, default=900, help="Seconds between checks for new periods")
+    parser.add_argument('--duration', type=float, help="Seconds to watch for, default until interrupted")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT_PATH, help="JSON lines file the changed rows are appended to")
+    parser.add_argument('--store', help="SQLite store to upsert the changed rows into")
+    parser.add_argument('--base-url', help="Selling page URL, e.g. lottery_fixture_server.py's /ctzc/jsq/index.html")
+    parser.add_argument('--log-level', default='INFO')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s %(message)s')
+    watcher = LotteryWatcher(min_interval=args.min_interval, max_interval=args.max_interval,
+                             relist_interval=args.relist_interval, output_path=args.output,
+                             store=LotteryStore(args.store) if args.store else None,
+                             game_types=args.game_types or MATCH_GAME_TYPES)
+    if args.base_url:
+        watcher.scraper.base_url = args.base_url
+    watcher.run(args.duration)
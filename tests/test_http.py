@@ -0,0 +1,61 @@
+import csv
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from lottery_fixture_server import start_fixture_server
+from lottery_http import HttpLotteryPrizeScraper, HttpLotteryResultsScraper, HttpLotteryScraper
+from lottery_selection import GAME_TYPES
+from lottery_sink import PRIZE_COLUMNS, result_columns, selling_columns
+
+
+@pytest.fixture
+def fixture_url():
+    server, url = start_fixture_server()
+    yield url
+    server.shutdown()
+    server.server_close()
+
+
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        return list(csv.reader(f))
+
+
+def output_files(directory, prefix):
+    return sorted(name for name in os.listdir(directory) if name.startswith(prefix) and name.endswith('.csv'))
+
+
+def test_http_backend_matches_browser_schemas(fixture_url, tmp_path, monkeypatch):
+    # The HTTP backend must write the same headers as the browser scrapers,
+    # which take theirs from lottery_sink
+    monkeypatch.chdir(tmp_path)
+    HttpLotteryScraper(fixture_url).run()
+    HttpLotteryResultsScraper(fixture_url).run()
+    HttpLotteryPrizeScraper(fixture_url).run()
+
+    selling_files = output_files(tmp_path, 'lottery_selling_')
+    assert len(selling_files) == len(GAME_TYPES)
+    for name in selling_files:
+        game_type = name[len('lottery_selling_'):].rsplit('_', 1)[0]
+        header, *rows = read_csv(tmp_path / name)
+        assert header == selling_columns(game_type)
+        assert rows
+
+    result_files = output_files(tmp_path, 'lottery_results_')
+    assert len(result_files) == len(GAME_TYPES)
+    for name in result_files:
+        lottery_type = name[len('lottery_results_'):].rsplit('_', 1)[0]
+        header, *rows = read_csv(tmp_path / name)
+        assert header == result_columns(lottery_type)
+        assert rows
+
+    (prize_file,) = output_files(tmp_path, 'lottery_prizes_')
+    header, *rows = read_csv(tmp_path / prize_file)
+    assert header == PRIZE_COLUMNS
+    assert sorted(row[header.index('Game_Type')] for row in rows) == sorted(GAME_TYPES)
+    assert not list(tmp_path.glob('*.part'))
@@ -0,0 +1,36 @@
+import os
+import sys
+
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from lottery_normalize import normalize_frame
+
+
+def test_normalize_selling_rows():
+    frame = pd.DataFrame([
+        {'period': '24169期', 'match_num': '1', 'league': '英超', 'home_team': '卢 顿', 'away_team': '阿森纳',
+         'start_time': '2024-10-30 03:00', 'bet_win': '2.45', 'bet_draw': '', 'bet_lose': '3.10'}
+    ])
+    normalized = normalize_frame(frame, game_type='胜负游戏')
+
+    assert list(normalized.columns[:3]) == ['game', 'issue', 'match_number']
+    assert normalized.loc[0, 'issue'] == 24169
+    assert str(normalized['match_number'].dtype) == 'Int8'
+    assert normalized.loc[0, 'home_team'] == '卢顿'
+    assert str(normalized['league'].dtype) == 'category'
+    assert normalized.loc[0, 'bet_win'] == pd.Series([2.45], dtype='float32')[0]
+    assert pd.isna(normalized.loc[0, 'bet_draw'])
+    assert normalized.loc[0, 'start_time'] == pd.Timestamp('2024-10-30 03:00')
+
+
+def test_normalize_prize_amounts():
+    frame = pd.DataFrame([{'Issue_Number': '24167', 'First_Prize_Count': '2', 'First_Prize_Amount': '5,000,000',
+                           'Prize_Pool_Amount': '3,140,787.97'}])
+    normalized = normalize_frame(frame)
+
+    assert normalized.loc[0, 'first_prize_count'] == 2
+    assert normalized.loc[0, 'first_prize_amount'] == 5000000.0
+    assert normalized.loc[0, 'prize_pool_amount'] == 3140787.97
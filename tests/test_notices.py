@@ -0,0 +1,77 @@
+import csv
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from lottery_fixture_server import start_fixture_server
+from lottery_notices import NoticeDownloader, parse_prize_notice, parse_sales_notice, write_notice_rows
+
+PRIZE_URL = 'https://pdf.sporttery.cn/100/24167/24167.pdf'
+SALES_URL = 'https://pdf.sporttery.cn/100/24167/24167XL.pdf'
+MISSING_URL = 'https://pdf.sporttery.cn/100/24168/24168.pdf'
+
+
+@pytest.fixture
+def fixture_url():
+    server, url = start_fixture_server()
+    yield url
+    server.shutdown()
+    server.server_close()
+
+
+def read_rows(path):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        return list(csv.DictReader(f))
+
+
+def test_parse_prize_notice():
+    text = ('开奖日期：2024-10-28\n本期销售额：28,512,346元\n'
+            '一等奖 2 5,000,000\n二等奖 1,064 87,996.5\n奖池滚存：3,140,787.97元\n')
+    rows = parse_prize_notice(text)
+    assert [(row['Prize_Level'], row['Winning_Count'], row['Prize_Amount']) for row in rows] == [
+        ('一等奖', '2', '5000000'), ('二等奖', '1064', '87996.5')]
+    assert rows[0]['Date'] == '2024-10-28'
+    assert rows[0]['Sales_Amount'] == '28512346'
+    assert rows[0]['Prize_Pool_Amount'] == '3140787.97'
+
+
+def test_parse_sales_notice_leaves_out_total():
+    text = '地区 销售额（元）\n北京 1,203,456\n上海 1,587,220元\n合计 2,790,676\n'
+    assert parse_sales_notice(text) == [
+        {'Region': '北京', 'Sales_Amount': '1203456'}, {'Region': '上海', 'Sales_Amount': '1587220'}]
+
+
+def test_download_revalidate_and_missing(fixture_url, tmp_path):
+    cache_dir = str(tmp_path / 'notices')
+    downloader = NoticeDownloader(cache_dir, workers=2, base_url=fixture_url, revalidate_after=0)
+    try:
+        paths = downloader.fetch_all([PRIZE_URL, SALES_URL, MISSING_URL])
+        assert downloader.counts == {'cached': 0, 'not_modified': 0, 'downloaded': 2, 'missing': 1, 'failed': 0}
+        assert paths[MISSING_URL] is None
+        assert paths[PRIZE_URL] == os.path.join(cache_dir, '100', '24167', '24167.pdf')
+        assert os.path.exists(paths[PRIZE_URL] + '.json')
+
+        # revalidate_after=0: the cached copies are revalidated and the server answers 304
+        assert downloader.fetch(PRIZE_URL) == ('not_modified', paths[PRIZE_URL])
+        downloader.revalidate_after = 3600
+        assert downloader.fetch(SALES_URL) == ('cached', paths[SALES_URL])
+    finally:
+        downloader.close()
+
+    output_dir = str(tmp_path / 'out')
+    prize_file, sales_file = write_notice_rows([PRIZE_URL, SALES_URL, MISSING_URL], paths, output_dir)
+
+    prizes = read_rows(prize_file)
+    assert [(row['Prize_Level'], row['Winning_Count'], row['Prize_Amount']) for row in prizes] == [
+        ('一等奖', '2', '5000000'), ('二等奖', '64', '87996')]
+    assert {row['Issue_Number'] for row in prizes} == {'24167'}
+    assert {row['Game_Type'] for row in prizes} == {'胜负游戏'}
+    assert prizes[0]['Sales_Amount'] == '28512346'
+
+    sales = read_rows(sales_file)
+    assert [row['Region'] for row in sales] == ['北京', '上海', '广东', '浙江', '江苏']
+    assert sales[0]['Sales_Amount'] == '1203456'
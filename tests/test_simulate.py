@@ -0,0 +1,53 @@
+import logging
+import os
+import sys
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from lottery_simulate import SimulationCache, outcome_frequencies, simulate, summarize
+
+
+def results_rows(outcomes):
+    return [{'Period': '24167', 'Match_Number': str(i + 1), 'Result': outcome} for i, outcome in enumerate(outcomes)]
+
+
+def test_outcome_frequencies_skips_incomplete_issues(caplog):
+    issues = [results_rows(['3'] * 14), results_rows(['1'] * 13)]
+    with caplog.at_level(logging.WARNING, logger='lottery_simulate'):
+        probs = outcome_frequencies('胜负游戏', issues)
+    assert probs.shape == (14, 3)
+    assert np.allclose(probs.sum(axis=1), 1)
+    assert probs[0, 0] > probs[0, 1]
+    assert [record.levelname for record in caplog.records] == ['WARNING']
+    assert caplog.records[0].getMessage().startswith('Skipping 胜负游戏 issue 24167: ')
+
+
+def test_simulate_is_reproducible_with_a_seed():
+    probs = outcome_frequencies('胜负游戏', [results_rows(['3', '1', '0', '3', '3', '1', '0'] * 2)])
+    first = simulate('胜负游戏', probs, bets=5000000, pool=1000000, samples=5000, seed=7, batch_size=2000)
+    second = simulate('胜负游戏', probs, bets=5000000, pool=1000000, samples=5000, seed=7, batch_size=2000)
+    other = simulate('胜负游戏', probs, bets=5000000, pool=1000000, samples=5000, seed=8, batch_size=2000)
+
+    assert np.array_equal(first['winners'], second['winners'])
+    assert np.array_equal(first['payouts'], second['payouts'], equal_nan=True)
+    assert not np.array_equal(first['winners'], other['winners'])
+    assert summarize(first) == summarize(second)
+
+
+def test_simulation_cache_hit(tmp_path):
+    cache = SimulationCache(str(tmp_path / 'simulations'))
+    probs = outcome_frequencies('4场进球', [])
+    key = cache.key(probs, bets=1000000, pool=0.0, samples=1000, seed=0)
+    assert cache.get('4场进球', '24214', key) is None
+
+    summary = summarize(simulate('4场进球', probs, 1000000, samples=1000, seed=0))
+    cache.put('4场进球', '24214', key, summary)
+
+    # The same inputs hit; any other parameter is a different entry
+    assert cache.key(probs, bets=1000000, pool=0.0, samples=1000, seed=0) == key
+    assert SimulationCache(cache.cache_dir).get('4场进球', '24214', key) == summary
+    assert cache.key(probs, bets=1000000, pool=0.0, samples=1000, seed=1) != key
+    assert cache.key(probs * 0.5, bets=1000000, pool=0.0, samples=1000, seed=0) != key
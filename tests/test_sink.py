@@ -0,0 +1,81 @@
+import csv
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from lottery_sink import CsvSink
+
+COLUMNS = ['Issue_Number', 'Game_Type']
+
+
+def rows(count, start=0):
+    return [{'Issue_Number': str(24000 + i), 'Game_Type': '胜负游戏'} for i in range(start, start + count)]
+
+
+def read_rows(path):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        assert reader.fieldnames == COLUMNS
+        return list(reader)
+
+
+def test_commit_replaces_path(tmp_path):
+    path = str(tmp_path / 'out' / 'prizes.csv')
+    sink = CsvSink(path, COLUMNS, buffer_rows=2)
+    sink.write(rows(3))
+    assert os.path.exists(sink.part_path) and not os.path.exists(path)
+    sink.write(rows(1, start=3))
+    assert sink.commit() == path
+
+    assert read_rows(path) == rows(4)
+    assert not os.path.exists(sink.part_path)
+
+
+def test_commit_without_rows_writes_header(tmp_path):
+    path = str(tmp_path / 'prizes.csv')
+    CsvSink(path, COLUMNS).commit()
+    assert read_rows(path) == []
+
+
+@pytest.mark.parametrize('count', [1, 5, 7])
+def test_abort_keeps_every_written_row(tmp_path, count):
+    # Fewer rows than buffer_rows were never flushed before abort()
+    path = tmp_path / 'prizes.csv'
+    path.write_text('previous\n', encoding='utf-8')
+    sink = CsvSink(str(path), COLUMNS, buffer_rows=5)
+    sink.write(rows(count))
+    sink.abort()
+
+    assert read_rows(sink.part_path) == rows(count)
+    assert path.read_text(encoding='utf-8') == 'previous\n'
+
+
+def test_discard_removes_part_file(tmp_path):
+    path = str(tmp_path / 'prizes.csv')
+    sink = CsvSink(path, COLUMNS, buffer_rows=2)
+    sink.write(rows(3))
+    sink.discard()
+    assert not os.path.exists(sink.part_path) and not os.path.exists(path)
+
+    unflushed = CsvSink(path, COLUMNS)
+    unflushed.write(rows(1))
+    unflushed.discard()
+    assert not os.path.exists(unflushed.part_path)
+
+
+def test_context_manager_commits_or_aborts(tmp_path):
+    path = str(tmp_path / 'prizes.csv')
+    with CsvSink(path, COLUMNS) as sink:
+        sink.write(rows(2))
+    assert read_rows(path) == rows(2)
+
+    with pytest.raises(RuntimeError):
+        with CsvSink(path, COLUMNS) as sink:
+            sink.write(rows(3, start=2))
+            raise RuntimeError('scrape failed')
+    assert read_rows(path) == rows(2)
+    assert read_rows(sink.part_path) == rows(3, start=2)
@@ -0,0 +1,69 @@
+import os
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from lottery_snapshots import SnapshotArchive, SnapshotReplay
+
+HOME_TEAMS = [f'主队{i}' for i in range(1, 15)]
+AWAY_TEAMS = [f'客队{i}' for i in range(1, 15)]
+
+
+def row(tag, values):
+    return '<tr>' + ''.join(f'<{tag}>{value}</{tag}>' for value in values) + '</tr>'
+
+
+def sfc_snapshot():
+    # The kjgg elements SNAPSHOT_SCRIPT keeps for one 胜负游戏 issue
+    table = (row('th', range(1, 15)) + row('td', HOME_TEAMS) + row('td', ['VS'] * 14) +
+             row('td', AWAY_TEAMS) + row('td', ['2:1'] * 14) + row('td', ['3'] * 14))
+    return (
+        f'<table id="sfc_game">{table}</table>'
+        '<span id="openTime_kj_sfc">开奖日期：2024-10-28</span>'
+        '<select id="sfc_issue"><option value="24166">24166</option>'
+        '<option value="24167" selected>24167</option></select>'
+        '<span id="sfc_pool">1,234,567</span>'
+        '<div id="kj_sfc_news"><a href="https://example.com/24167.pdf">公告</a></div>'
+        '<div id="kj_sfc_xl"><a href="https://example.com/24167XL.pdf">销量</a></div>'
+        '<div id="level_1_sfc"><span class="red">3</span>注 <span class="red">512,000</span>元</div>'
+        '<div id="level_2_sfc"><span class="red">40</span>注 <span class="red">9,800</span>元</div>'
+    )
+
+
+def test_replay_kjgg_snapshot(tmp_path):
+    archive = SnapshotArchive(str(tmp_path))
+    archive.save('kjgg', '胜负游戏', ['24167'], sfc_snapshot(), 'https://www.sporttery.cn/ctzc/kjgg/index.html')
+
+    replay = SnapshotReplay(archive)
+    selling, results, prizes = replay.run()
+
+    assert selling == {}
+    issue_results = results[('胜负游戏', '24167')]
+    assert len(issue_results) == 14
+    assert issue_results[0]['Home_Team'] == '主队1'
+    assert issue_results[13]['Away_Team'] == '客队14'
+    assert issue_results[0]['Date'] == '2024-10-28'
+
+    (prize_data,) = [prize for day_prizes in prizes.values() for prize in day_prizes]
+    assert prize_data['Issue_Number'] == '24167'
+    assert prize_data['First_Prize_Count'] == '3'
+    assert prize_data['Second_Prize_Amount'] == '9,800'
+    assert replay.stats == {'snapshots': 1, 'parsed': 1, 'rows': 15}
+
+
+def test_replay_does_not_import_selenium(tmp_path):
+    # Replay and the HTTP backend run without a browser, so a fresh
+    # interpreter must not load selenium.webdriver for them
+    archive = SnapshotArchive(str(tmp_path))
+    archive.save('kjgg', '胜负游戏', ['24167'], sfc_snapshot())
+    script = (
+        "import sys\n"
+        "import lottery_selling, lottery_result, lottery_prize_scraper, lottery_http\n"
+        "from lottery_snapshots import SnapshotArchive, SnapshotReplay\n"
+        f"SnapshotReplay(SnapshotArchive({str(tmp_path)!r})).run()\n"
+        "print(','.join(sorted(name for name in sys.modules if name.startswith('selenium.webdriver'))))\n"
+    )
+    output = subprocess.run([sys.executable, '-c', script], cwd=REPO_DIR, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == ''
@@ -0,0 +1,114 @@
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from lottery_stats import TeamForm, TeamStatsIndex
+from lottery_store import LotteryStore
+
+
+def result(date, home, away, score, issue='24167', number='1'):
+    return {'Period': issue, 'Date': date, 'Match_Number': number, 'Home_Team': home, 'Away_Team': away,
+            'Score': score}
+
+
+def selling(home, away, league):
+    return {'period': '24167期', 'match_num': '1', 'league': league, 'home_team': home, 'away_team': away}
+
+
+def test_form_buffer_add_and_evict():
+    form = TeamForm(3)
+    for day, goals in [(1, 2), (2, 0), (3, 1), (4, 3)]:
+        form.add((f'2024-10-0{day}', f'k{day}', goals, 1))
+    assert [entry[1] for entry in form.entries] == ['k2', 'k3', 'k4']
+    assert form.summary['form'] == 'LDW'
+
+    # A backfilled match older than the whole window is not kept
+    form.add(('2024-09-30', 'k0', 5, 0))
+    assert [entry[1] for entry in form.entries] == ['k2', 'k3', 'k4']
+
+    # A backfilled match inside the window drops the oldest
+    form.add(('2024-10-02', 'k2b', 1, 0))
+    assert [entry[1] for entry in form.entries] == ['k2b', 'k3', 'k4']
+
+
+def test_form_buffer_remove_refills_from_history():
+    history = [(f'2024-10-0{day}', f'k{day}', day, 0) for day in range(1, 6)]
+    form = TeamForm(3, history)
+    form.remove('k4', lambda: history)
+    assert [entry[1] for entry in form.entries] == ['k2', 'k3', 'k5']
+    assert form.summary['played'] == 3
+
+    # Without a history the buffer is only trimmed
+    form.remove('k5')
+    assert [entry[1] for entry in form.entries] == ['k2', 'k3']
+
+
+def test_corrected_score_replaces_earlier_one():
+    index = TeamStatsIndex(window=5)
+    index.add_selling([selling('水晶宫', '阿森纳', '英超')])
+    assert index.add_results([result('2024-10-26', '水晶宫', '阿森纳', '2:1')]) == 1
+    assert index.add_results([result('2024-10-26', '水晶宫', '阿森纳', '2:1')]) == 0
+    assert index.add_results([result('2024-10-26', '水晶宫', '阿森纳', '1:1')]) == 1
+
+    assert index.team('水晶宫')['form'] == 'D'
+    assert index.team('阿森纳')['goals_for'] == 1
+    assert index.league('英超')['matches'] == 1
+
+
+def test_league_change_refills_old_league():
+    index = TeamStatsIndex(window=2)
+    index.add_selling([selling(f'主{day}', f'客{day}', '英超') for day in range(1, 4)])
+    index.add_results([result(f'2024-10-0{day}', f'主{day}', f'客{day}', '1:0') for day in range(1, 4)])
+    assert index.league('英超')['matches'] == 2
+
+    # The newest fixture turns out to be a 英冠 match
+    index.add_selling([selling('主3', '客3', '英冠')])
+    index.add_results([result('2024-10-03', '主3', '客3', '2:0')])
+    assert [entry[1] for entry in index.leagues['英超'].entries] == [
+        index.match_key('2024-10-01', '主1', '客1'), index.match_key('2024-10-02', '主2', '客2')]
+    assert index.league('英冠')['matches'] == 1
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = TeamStatsIndex(window=3)
+    index.add_results([result('2024-10-26', '水晶宫', '阿森纳', '2:1')])
+    index.add_selling([selling('水晶宫', '阿森纳', '英超')])
+    index.files['lottery_results_胜负游戏_24167.csv'] = [100, 1]
+    path = str(tmp_path / 'team_stats.json')
+    index.save(path)
+
+    loaded = TeamStatsIndex.load(path)
+    assert loaded.window == 3
+    assert loaded.files == index.files
+    assert loaded.team('水晶宫') == index.team('水晶宫')
+    assert loaded.league('英超') == index.league('英超')
+    assert loaded.fixture_leagues == index.fixture_leagues
+    # Rebuilt with another window
+    assert TeamStatsIndex.load(path, window=5).teams == {}
+
+
+def test_ingest_store_reads_only_newer_rows(tmp_path):
+    store = LotteryStore(str(tmp_path / 'lottery.db'))
+    try:
+        store.upsert_selling('胜负游戏', [selling('水晶宫', '阿森纳', '英超')], '20241025')
+        store.upsert_results('胜负游戏', [result('2024-10-26', '水晶宫', '阿森纳', '2:1')])
+        index = TeamStatsIndex()
+        assert index.ingest_store(store) == {'files': 0, 'matches': 1}
+        assert index.stores[store.path] == {'selling': '20241025', 'results': '2024-10-26'}
+
+        queries = []
+        query = store.query
+        store.query = lambda sql, params=(): queries.append(params) or query(sql, params)
+        store.upsert_results('胜负游戏', [result('2024-11-02', '阿森纳', '利物浦', '0:0', '24168')])
+        assert index.ingest_store(store)['matches'] == 1
+        assert queries == [('20241025',), ('2024-10-26',)]
+        assert index.stores[store.path]['results'] == '2024-11-02'
+        assert index.team('阿森纳')['played'] == 2
+
+        path = str(tmp_path / 'team_stats.json')
+        index.save(path)
+        assert TeamStatsIndex.load(path).stores == index.stores
+    finally:
+        store.close()
@@ -0,0 +1,90 @@
+import itertools
+import os
+import sys
+
+import numpy as np
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from lottery_tickets import GAME_SLOTS, PRIZE_TIERS, RX9_MATCHES, encode_tickets, evaluate, option_bits
+
+
+def random_ticket(rng, game_type):
+    # Mostly single options with a few 复式 slots, and 9 to 11 played
+    # matches on a 任选9场 ticket
+    bits = list(option_bits(game_type).values())
+    ticket = np.zeros(GAME_SLOTS[game_type], dtype=np.uint8)
+    for j in range(len(ticket)):
+        count = 1 if rng.random() < 0.75 else int(rng.integers(2, len(bits) + 1))
+        for option in rng.choice(bits, size=count, replace=False):
+            ticket[j] |= option
+    if game_type == '任选9场':
+        played = int(rng.integers(RX9_MATCHES, RX9_MATCHES + 3))
+        ticket[rng.permutation(len(ticket))[played:]] = 0
+    return ticket
+
+
+def random_results(rng, game_type):
+    # One drawn option per slot, with the odd cancelled match that every option hits
+    bits = list(option_bits(game_type).values())
+    results = np.array(rng.choice(bits, size=GAME_SLOTS[game_type]), dtype=np.uint8)
+    results[rng.random(len(results)) < 0.1] = sum(bits)
+    return results
+
+
+def single_bets(ticket, slots):
+    # Every single bet the ticket expands to, over the given slots
+    options = [[bit for bit in (1, 2, 4, 8) if ticket[j] & bit] for j in slots]
+    return itertools.product(*options)
+
+
+def brute_force(game_type, ticket, results):
+    tiers = PRIZE_TIERS[game_type]
+    counts = [0] * len(tiers)
+    if game_type == '任选9场':
+        played = [j for j in range(len(ticket)) if ticket[j]]
+        for slots in itertools.combinations(played, RX9_MATCHES):
+            for bet in single_bets(ticket, slots):
+                if all(option & results[j] for option, j in zip(bet, slots)):
+                    counts[0] += 1
+    else:
+        slots = range(len(ticket))
+        for bet in single_bets(ticket, slots):
+            wrong = sum(1 for option, j in zip(bet, slots) if not option & results[j])
+            if wrong < len(tiers):
+                counts[wrong] += 1
+    hits = sum(1 for j in range(len(ticket)) if ticket[j] & results[j])
+    return hits, counts
+
+
+@pytest.mark.parametrize('game_type', list(GAME_SLOTS))
+def test_evaluate_matches_brute_force(game_type):
+    rng = np.random.default_rng(9)
+    for _ in range(20):
+        results = random_results(rng, game_type)
+        tickets = np.array([random_ticket(rng, game_type) for _ in range(10)])
+        # A ticket that copies the results wins the top tier
+        tickets[0] = np.where(tickets[0], results, 0)
+        evaluation = evaluate(game_type, tickets, results)
+        for i, ticket in enumerate(tickets):
+            hits, counts = brute_force(game_type, ticket, results)
+            assert evaluation['hits'][i] == hits
+            assert list(evaluation['prize_counts'][i]) == counts
+
+
+def test_encode_tickets_options():
+    masks = encode_tickets('胜负游戏', ['3,1,0,31,310,33,3, 1 ,1,1,1,1,1,1'])
+    assert list(masks[0][:8]) == [1, 2, 4, 3, 7, 1, 1, 2]
+    masks = encode_tickets('4场进球', ['0,1,2,3+,0/0,0/3＋,1/2/1, 2 '])
+    assert list(masks[0]) == [1, 2, 4, 8, 1, 9, 6, 4]
+    masks = encode_tickets('任选9场', ['3,-,,1,0,3,3,3,3,3,3,-,-,-'])
+    assert list(masks[0][:4]) == [1, 0, 0, 2]
+
+
+def test_encode_tickets_unknown_option():
+    with pytest.raises(ValueError):
+        encode_tickets('胜负游戏', ['3,1,0,2,3,3,3,3,3,3,3,3,3,3'])
+    with pytest.raises(ValueError):
+        encode_tickets('4场进球', ['0,1,2,4,0,0,0,0'])
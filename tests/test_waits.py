@@ -0,0 +1,27 @@
+import logging
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from lottery_waits import StepTimer
+
+
+def test_report_logs_timings_and_skips(caplog, capsys):
+    timer = StepTimer(budget=60)
+    with timer.step('open_page'):
+        pass
+    timer.skip('胜负游戏 24167', 'tab budget')
+    timer.open_selectors.add('#sfc_game')
+
+    with caplog.at_level(logging.INFO, logger='lottery_waits'):
+        timer.report()
+
+    messages = [record.getMessage() for record in caplog.records]
+    assert messages[0].startswith('Step timings (total ') and messages[0].endswith(', budget 60s)')
+    assert messages[1].startswith('  open_page: 1x, total ')
+    assert 'Skipped 1 items (tab budget 1)' in messages
+    assert '  胜负游戏 24167: tab budget' in messages
+    assert messages[-1] == 'Selectors given up on: #sfc_game'
+    assert capsys.readouterr().out == ''